@@ -1,6 +1,192 @@
-from fastapi import FastAPI
+from __future__ import annotations
+import asyncio, logging, os, sys, time
+_T0 = time.perf_counter()
+from typing import Literal, Optional
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+_T1 = time.perf_counter()
+
+# lipe_core lives at the repo root; the Procfile starts us from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lipe_core.models import (ForecastReq, ForecastBatchReq, ForecastBatchResp, Symbol, Timeframe,
+                              StrategySpec, StrategyResp, SweepReq, SweepResp, ShareCreateReq,
+                              PortfolioSpec, PortfolioResp)
+from lipe_core.predict import (arun_forecast_cached, arun_forecast_batch, aiter_forecast_batch, abacktest_frame,
+                               aportfolio_frame, FORECAST_CACHE)
+from lipe_core.data import series_stats, aclose_exchanges
+from lipe_core.share import share_create, share_get
+from lipe_core.stream import HUB
+from lipe_core import accuracy
+from lipe_core import metrics
+from lipe_core import precompute
+from lipe_core import ratelimit
+from lipe_core import sweep
+from lipe_core import warmup
+from lipe_core import wire
+
+# lipe_core logs (worker boot lines) to stderr unless the server routes them (gunicorn_conf.py does)
+_log = logging.getLogger("lipe_core")
+if not _log.handlers:
+    _log.addHandler(logging.StreamHandler())
+    _log.setLevel(logging.INFO)
+
+# import-time breakdown (ccxt is not among them: data imports it on first exchange use or in warm-up)
+warmup.BOOT.phase("import.fastapi", _T0, _T1)
+warmup.BOOT.phase("import.lipe_core", _T1)
+
+NDJSON = "application/x-ndjson"
+# opt-in response shape for forecast / equity-curve payloads (see lipe_core.wire.Fmt)
+Shape = Literal["rows", "columnar"]
+TsFmt = Literal["iso", "ms"]
+MaxPoints = Query(None, ge=4, le=100_000, description="LTTB-downsample series_tail / equity_curve to this many points")
+
+async def _encoded(request: Request, make, key=None, headers=None) -> Response:
+    with metrics.stage("wire.encode"):
+        data, h = await asyncio.to_thread(wire.encode_cached, key, make, request.headers.get("accept", ""),
+                                          request.headers.get("accept-encoding", ""))
+    return Response(data, headers={**h, **(headers or {})})
+
 app = FastAPI()
+app.add_middleware(metrics.LatencyMiddleware)
+metrics.REGISTRY.gauges.append(lambda: {f"lipe_forecast_cache_{k}": v for k, v in FORECAST_CACHE.snapshot().items()})
+metrics.REGISTRY.gauges.append(lambda: {f"lipe_series_{k}": v for k, v in series_stats().items()})
+metrics.REGISTRY.gauges.append(lambda: {f"lipe_exchange_{k}": v for k, v in ratelimit.stats().items()})
+metrics.REGISTRY.gauges.append(lambda: {f"lipe_boot_{k.replace('.', '_')}_seconds": v
+                                        for k, v in warmup.BOOT.phases.items()})
+
+@app.on_event("startup")
+def _metrics_start():
+    metrics.REGISTRY.start()   # heartbeat for uptime_30d even before the first request
+    accuracy.start()           # scores logged forecasts as their target bars close
+    precompute.start()         # one worker per host (flock leader) warms the watchlist at bar close
+    warmup.ready()             # history + forecast cache warm (done pre-fork under preload) before serving
+
+@app.on_event("shutdown")
+async def _exchanges_close():
+    precompute.SCHEDULER.stop()
+    await aclose_exchanges()
+# browsers subscribe to /v1/stream/* directly (EventSource), so CORS must cover them
+_origins = os.getenv("HIS_ALLOWED_ORIGINS", os.getenv("ALLOW_ORIGINS", "*"))
+app.add_middleware(CORSMiddleware, allow_origins=[o.strip() for o in _origins.split(",")],
+                   allow_methods=["*"], allow_headers=["*"], expose_headers=["ETag"])
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return metrics.prometheus()
+
+@app.get("/v1/public/slo.json")
+def public_slo():
+    return metrics.slo()
+
+@app.get("/v1/public/accuracy.json")
+def public_accuracy():
+    # reads the aggregate table only; scoring happens in the background (lipe_core.accuracy)
+    return accuracy.store().summary()
+
+@app.post("/v1/forecast")
+async def forecast(req: ForecastReq, request: Request, shape: Shape = "rows", ts: TsFmt = "iso",
+                   max_points: Optional[int] = MaxPoints):
+    # async end to end: the exchange call is awaited, scoring and encoding run on worker threads
+    fmt = wire.Fmt.parse(shape, ts, max_points)
+    frame, etag = await arun_forecast_cached(req, request.headers.get("if-none-match"), variant=fmt.tag)
+    if frame is None:
+        return Response(status_code=304, headers={"ETag": etag})
+    return await _encoded(request, lambda: {"event": wire.forecast_body(frame, fmt)}, key=etag, headers={"ETag": etag})
+
+@app.get("/v1/stream/forecast")
+async def forecast_stream(request: Request, arena: Literal["crypto"] = "crypto",
+                          symbol: Symbol = "BTCUSDT", horizon: int = Query(5, ge=1, le=30),
+                          timeframe: Timeframe = "1d", shape: Shape = "rows", ts: TsFmt = "iso",
+                          max_points: Optional[int] = MaxPoints):
+    # Server-sent events: `event: forecast` whenever the forecast ETag changes, `: ping` keep-alives
+    req = ForecastReq(arena=arena, symbol=symbol, horizon=horizon, timeframe=timeframe)
+    async def events():
+        async for item in HUB.subscribe(req, last_etag=request.headers.get("last-event-id"),
+                                        fmt=wire.Fmt.parse(shape, ts, max_points)):
+            if item is None:
+                yield ": ping\n\n"
+            else:
+                yield f"event: forecast\nid: {item[0]}\ndata: {item[1]}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/v1/stats/boot")
+def boot_stats():
+    return warmup.BOOT.snapshot()
+
+@app.get("/v1/stats/cache")
+def cache_stats():
+    return {"forecast": FORECAST_CACHE.snapshot(), "bodies": wire.BODY_CACHE.snapshot(),
+            "series": series_stats(), "exchange": ratelimit.stats(), "stream": HUB.stats(), "precompute": precompute.SCHEDULER.stats}
+
+@app.post("/v1/forecast/batch", response_model=ForecastBatchResp)
+async def forecast_batch(req: ForecastBatchReq, request: Request, shape: Shape = "rows", ts: TsFmt = "iso",
+                         max_points: Optional[int] = MaxPoints):
+    # Accept: application/x-ndjson → one ForecastBatchItem per line, in completion order
+    fmt = wire.Fmt.parse(shape, ts, max_points)
+    if NDJSON in request.headers.get("accept", ""):
+        lines = (wire.dumps(it) + b"\n" async for it in aiter_forecast_batch(req, fmt))
+        return StreamingResponse(lines, media_type=NDJSON)
+    res = await arun_forecast_batch(req, fmt)
+    return await _encoded(request, lambda: res)
+
+@app.post("/v1/strategy/eval", response_model=StrategyResp)
+async def strategy_eval(spec: StrategySpec, request: Request, shape: Shape = "rows", ts: TsFmt = "iso",
+                        max_points: Optional[int] = MaxPoints):
+    frame = await abacktest_frame(spec)
+    return await _encoded(request, lambda: wire.strategy_body(frame, wire.Fmt.parse(shape, ts, max_points)))
+
+@app.post("/v1/strategy/portfolio", response_model=PortfolioResp)
+async def strategy_portfolio(spec: PortfolioSpec, request: Request, shape: Shape = "rows", ts: TsFmt = "iso",
+                             max_points: Optional[int] = MaxPoints):
+    # one rule set over many symbols: portfolio curve + metrics, and each asset traded alone
+    frame = await aportfolio_frame(spec)
+    return await _encoded(request, lambda: wire.portfolio_body(frame, wire.Fmt.parse(shape, ts, max_points)))
+
+@app.post("/v1/strategy/sweep", response_model=SweepResp)
+def strategy_sweep(req: SweepReq, request: Request):
+    # Accept: application/x-ndjson → progress snapshots (closing the stream cancels the sweep);
+    # otherwise block until done. Jobs live in this worker: poll/cancel by id may 404 on a sibling.
+    try:
+        job = sweep.start_sweep(req)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    except sweep.SweepBusy as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "5"})
+    if NDJSON in request.headers.get("accept", ""):
+        lines = (s.model_dump_json() + "\n" for s in sweep.iter_progress(job))
+        return StreamingResponse(lines, media_type=NDJSON)
+    job.wait()
+    return job.snapshot()
+
+@app.get("/v1/strategy/sweep/{job_id}", response_model=SweepResp)
+def strategy_sweep_get(job_id: str):
+    job = sweep.get_sweep(job_id)
+    if not job:
+        raise HTTPException(404, "unknown sweep")
+    return job.snapshot()
+
+@app.delete("/v1/strategy/sweep/{job_id}", response_model=SweepResp)
+def strategy_sweep_cancel(job_id: str):
+    job = sweep.get_sweep(job_id)
+    if not job:
+        raise HTTPException(404, "unknown sweep")
+    job.cancel()
+    return job.snapshot()
+
+@app.post("/v1/share/create")
+def share_create_ep(body: ShareCreateReq):
+    return share_create(body)
+
+@app.get("/v1/share/{token}")
+def share_get_ep(token: str):
+    payload = share_get(token)
+    if payload is None:
+        raise HTTPException(404, "expired or unknown share token")
+    return payload
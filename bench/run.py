@@ -0,0 +1,212 @@
+"""
+Offline benchmarks for the lipe_core hot paths.
+
+    python -m bench.run                                  # default scales 1k,10k,100k → bench/results.json
+    python -m bench.run --scales 1000 --out /tmp/r.json
+    python -m bench.run --compare bench/baseline.json    # exit 1 if any case regressed
+    python -m bench.run --out bench/baseline.json        # refresh the stored baseline
+
+Everything runs against the synthetic generator in a throwaway bar/share store;
+ccxt is never called.
+"""
+from __future__ import annotations
+import argparse, json, os, platform, statistics, subprocess, sys, tempfile, time
+from typing import Any, Callable, Dict, List
+
+_TMP = tempfile.mkdtemp(prefix="lipe_bench_")
+os.environ["LIPE_BARS_DIR"] = os.path.join(_TMP, "bars")
+os.environ["LIPE_SHARE_DB"] = os.path.join(_TMP, "share.sqlite3")
+os.environ["LIPE_METRICS_DIR"] = os.path.join(_TMP, "metrics")
+os.environ["LIPE_ACC_LOG"] = os.path.join(_TMP, "forecasts.rec")
+os.environ["LIPE_ACC_DB"] = os.path.join(_TMP, "accuracy.sqlite3")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from lipe_core import data, engine, features, montecarlo, wire
+data.ccxt = data.ccxt_async = None   # offline: always the synthetic store
+
+from lipe_core.models import ForecastReq, ForecastResp, StrategySpec, StrategyResp, Rule, ShareCreateReq, PortfolioSpec
+from lipe_core.predict import run_forecast, run_forecast_many, backtest_strategy, portfolio_frame, HISTORY_BARS
+from lipe_core.share import ShareStore
+from lipe_core.downsample import downsample
+from lipe_core.bars import resample
+
+HORIZONS = (1, 5, 10, 30)
+
+# Each case takes a scale and returns (n_ops, fn); fn is timed as a whole.
+# The scale means the natural input size of the case (pairs, bars, points, ops).
+def case_score_batch(scale: int):
+    n_sym = max(1, scale // len(HORIZONS))
+    syms = data.synthetic_universe(n_sym, HISTORY_BARS)
+    closes = engine.stack([data.fetch_bars(s, HISTORY_BARS)["close"] for s in syms])
+    rows = np.repeat(np.arange(n_sym), len(HORIZONS))
+    hz = np.tile(HORIZONS, n_sym)
+    return len(rows), lambda: engine.score_batch(closes, rows, hz)
+
+def case_run_forecast(scale: int):
+    n = max(1, scale // 100)   # end-to-end requests; 1% of scale keeps 100k runs tractable
+    syms = data.synthetic_universe(min(n, 50), HISTORY_BARS)
+    reqs = [ForecastReq(arena="crypto", symbol=syms[i % len(syms)], horizon=HORIZONS[i % len(HORIZONS)]) for i in range(n)]
+    return n, lambda: [run_forecast(r) for r in reqs]
+
+def case_run_forecast_many(scale: int):
+    n = max(1, scale // 10)
+    syms = data.synthetic_universe(max(1, n // len(HORIZONS)), HISTORY_BARS)
+    reqs = [ForecastReq(arena="crypto", symbol=s, horizon=h) for s in syms for h in HORIZONS][:n]
+    return len(reqs), lambda: run_forecast_many(reqs)
+
+def case_backtest(scale: int):
+    sym = data.synthetic_universe(1, scale + engine.SIGNAL_WINDOW, prefix="BT")[0]
+    spec = StrategySpec(arena="crypto", symbol=sym, lookback_days=scale,
+                        enter=[Rule(field="edge", op=">=", value=0.0)],
+                        exit=[Rule(field="drawdown", op=">=", value=0.1)])
+    return scale, lambda: backtest_strategy(spec)
+
+def case_portfolio(scale: int):
+    # scale / 1000 symbols × 3 years of daily bars, fetched up front: only the matrix pass is timed
+    syms = data.synthetic_universe(max(2, scale // 1000), 3*365 + engine.SIGNAL_WINDOW, prefix="PF")
+    spec = PortfolioSpec(arena="crypto", symbols=syms, lookback_days=3*365, weighting="inverse_vol", rebalance="weekly",
+                         enter=[Rule(field="edge", op=">=", value=0.0)], exit=[Rule(field="drawdown", op=">=", value=0.1)])
+    series = {s: data.fetch_bars(s, 3*365 + engine.SIGNAL_WINDOW) for s in syms}
+    return len(syms), lambda: portfolio_frame(spec, series)
+
+def case_montecarlo(scale: int):
+    # scale = simulated paths for one 30-step, 5-percentile band (budget: 10k paths < 50 ms)
+    closes = data.fetch_bars(data.synthetic_universe(1, HISTORY_BARS, prefix="MC")[0], HISTORY_BARS)["close"]
+    return scale, lambda: montecarlo.bands(closes, 30, (5, 25, 50, 75, 95), "bootstrap", scale, seed=0)
+
+def case_serialize_forecast(scale: int):
+    pts = [{"ts": "2026-01-01T00:00:00+00:00", "yhat": 1.0 + i, "q10": 0.5 + i, "q90": 1.5 + i} for i in range(scale)]
+    tail = [{"ts": "2026-01-01T00:00:00+00:00", "close": 1.0} for _ in range(60)]
+    return scale, lambda: ForecastResp(meta={}, metrics={}, forecast={"points": pts}, series_tail=tail).model_dump_json()
+
+def case_serialize_strategy(scale: int):
+    curve = [{"ts": "2026-01-01T00:00:00+00:00", "equity": 1.0 + i*1e-4} for i in range(scale)]
+    return scale, lambda: StrategyResp(metrics={"ROI": 0.0}, equity_curve=curve).model_dump_json()
+
+def case_wire_strategy(scale: int):
+    # the /v1/strategy/eval?shape=columnar&ts=ms path: frame → orjson, no per-point objects
+    f = wire.EquityFrame(metrics={"ROI": 0.0}, ts=1_700_000_000_000 + data.DAY_MS*np.arange(scale, dtype=np.int64),
+                         equity=1.0 + 1e-4*np.arange(scale))
+    return scale, lambda: wire.dumps(wire.strategy_body(f, wire.Fmt(columnar=True, epoch_ms=True)))
+
+def case_downsample(scale: int):
+    rng = np.random.default_rng(0)
+    x = data.DAY_MS*np.arange(scale, dtype=np.int64)
+    y = 100 + np.cumsum(rng.normal(size=scale))
+    return scale, lambda: downsample(x, y, 500)
+
+def case_resample(scale: int):
+    # scale = hourly bars; one full 1h → 4h rebuild per op
+    src = data.open_bars("bench", f"RS{scale}", "1h")
+    src.append(data._synthetic_rows(f"RS{scale}", scale, step_ms=data.HOUR_MS))
+    cols = {c: np.array(v) for c, v in src.read().items()}
+    return scale, lambda: resample(cols, 4*data.HOUR_MS)
+
+def case_features_update(scale: int):
+    # scale = stored bars; 100 ops, each re-sends the open bar with a new close and reads signals back
+    bars = data.open_bars("bench", f"FI{scale}", "1d")
+    rows = data._synthetic_rows(f"FI{scale}", scale)
+    bars.append(rows)
+    features.read(bars)
+    def run():
+        for i in range(100):
+            last = rows[-1].copy()
+            last[4] *= 1 + 1e-4*(i % 7)
+            bars.append([last])
+            features.read(bars, HISTORY_BARS)
+    return 100, run
+
+def case_share(scale: int):
+    store = ShareStore(os.path.join(_TMP, f"share_{scale}_{time.monotonic_ns()}.sqlite3"), max_entries=scale, dedup_s=0)
+    bodies = [ShareCreateReq(arena="crypto", symbol=f"S{i}", horizon=1 + i % 30).model_dump() for i in range(scale)]
+    def run():
+        toks = [store.create(b, ttl_s=3600)["token"] for b in bodies]
+        for t in toks:
+            store.get(t)
+    return 2*scale, run
+
+CASES: Dict[str, Callable[[int], Any]] = {
+    "engine.score_batch": case_score_batch,
+    "predict.run_forecast": case_run_forecast,
+    "predict.run_forecast_many": case_run_forecast_many,
+    "predict.backtest_strategy": case_backtest,
+    "predict.portfolio_3y": case_portfolio,
+    "montecarlo.bands_30": case_montecarlo,
+    "serialize.forecast_resp": case_serialize_forecast,
+    "serialize.strategy_resp": case_serialize_strategy,
+    "wire.strategy_columnar": case_wire_strategy,
+    "wire.downsample_500": case_downsample,
+    "bars.resample_1h_4h": case_resample,
+    "features.open_bar_update": case_features_update,
+    "share.create_get": case_share,
+}
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+def run(scales: List[int], repeat: int, only: List[str]) -> Dict[str, Any]:
+    results = []
+    for name, make in CASES.items():
+        if only and not any(o in name for o in only):
+            continue
+        for scale in scales:
+            n_ops, fn = make(scale)
+            fn()   # warm caches / first-touch pages
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - t0)
+            med = statistics.median(times)
+            results.append({"case": name, "scale": scale, "n_ops": n_ops, "best_s": min(times),
+                            "median_s": med, "ops_per_s": n_ops / med if med else float("inf")})
+            print(f"{name:28s} {scale:>8d}  {med*1000:10.2f} ms  {n_ops/med if med else 0:14.0f} ops/s", flush=True)
+    return {"meta": {"git": _git_rev(), "python": platform.python_version(), "numpy": np.__version__,
+                     "machine": platform.machine(), "cpus": os.cpu_count(), "at": time.time(), "repeat": repeat},
+            "results": results}
+
+def compare(cur: Dict[str, Any], base: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Cases whose median got slower than `threshold` (0.15 = +15%) against the baseline."""
+    ref = {(r["case"], r["scale"]): r for r in base["results"]}
+    bad = []
+    print(f"\n{'case':28s} {'scale':>8s}  {'base ms':>10s}  {'now ms':>10s}  {'ratio':>6s}")
+    for r in cur["results"]:
+        b = ref.get((r["case"], r["scale"]))
+        if not b:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] else 1.0
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{r['case']:28s} {r['scale']:>8d}  {b['median_s']*1000:10.2f}  {r['median_s']*1000:10.2f}  {ratio:6.2f}{flag}")
+        if flag:
+            bad.append({**r, "baseline_median_s": b["median_s"], "ratio": ratio})
+    return bad
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="1000,10000,100000")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", default="", help="comma-separated substrings of case names")
+    ap.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "results.json"))
+    ap.add_argument("--compare", default="", help="baseline JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.15)
+    a = ap.parse_args(argv)
+
+    res = run([int(s) for s in a.scales.split(",") if s], a.repeat, [o for o in a.only.split(",") if o])
+    with open(a.out, "w") as f:
+        json.dump(res, f, indent=1)
+    print(f"\nwrote {a.out}")
+    if a.compare:
+        with open(a.compare) as f:
+            bad = compare(res, json.load(f), a.threshold)
+        if bad:
+            print(f"\n{len(bad)} regression(s) over +{a.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+// Crypto chart, drawn in the browser from the raw columnar forecast arrays.
+// First draw builds the figure; later refreshes replace the three traces' data through
+// `extendData` (maxPoints = new length), so the figure never crosses the wire again.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    chart: {
+        draw: function (data, pushed, fig) {
+            const nu = window.dash_clientside.no_update;
+            const trig = (window.dash_clientside.callback_context.triggered || []).map((t) => t.prop_id);
+            const push = trig.some((p) => p.startsWith("fc-push."));
+            const evt = ((push ? pushed : data) || {}).event || {};
+            const fc = evt.forecast || {};   // {"ts": [epoch ms], "yhat": [...], "q10": [...], "q90": [...]}
+            const met = evt.metrics || {};
+            if (!(fc.ts && fc.ts.length)) {
+                // a push without points leaves the chart alone; an empty run clears it
+                return push ? [nu, nu, nu, nu, nu, nu] : [{data: [], layout: {}}, nu, "", "", "", ""];
+            }
+            const ys = [fc.q90 || fc.yhat, fc.q10 || fc.yhat, fc.yhat];
+            const regime = met.regime || (evt.meta || {}).regime || "—";
+            const kpis = [
+                `Regime: ${regime}`,
+                `Entropy: ${met.entropy ?? "—"}`,
+                `Edge: ${met.edge ?? "—"}`,
+                `SFH: ${met.sfh_days ?? "—"} d`,
+            ];
+            if (fig && fig.data && fig.data.length === 3) {
+                const n = fc.ts.length;
+                return [nu, [{x: [fc.ts, fc.ts, fc.ts], y: ys}, [0, 1, 2], n], ...kpis];
+            }
+            const line = {width: 0.1};
+            const figure = {
+                data: [
+                    {type: "scatter", x: fc.ts, y: ys[0], name: "q90", mode: "lines", line: line, showlegend: false},
+                    {type: "scatter", x: fc.ts, y: ys[1], name: "q10", mode: "lines", fill: "tonexty",
+                     line: line, fillcolor: "rgba(124,92,255,0.20)", showlegend: false},
+                    {type: "scatter", x: fc.ts, y: ys[2], name: "Forecast", mode: "lines",
+                     line: {dash: "dash", width: 2}},
+                ],
+                layout: {margin: {l: 30, r: 10, t: 10, b: 30}, hovermode: "x unified",
+                         xaxis: {type: "date"}},
+            };
+            return [figure, nu, ...kpis];
+        }
+    }
+});
@@ -0,0 +1,28 @@
+// Live forecast updates: one EventSource per tab, pushed into the `fc-push` store.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    stream: {
+        subscribe: function (cfg, auto) {
+            const on = !!cfg && (auto || []).includes("on");
+            const url = on
+                ? `${cfg.api}/v1/stream/forecast?arena=${cfg.arena}&symbol=${encodeURIComponent(cfg.symbol)}&horizon=${cfg.horizon}&${cfg.query}`
+                : null;
+            const cur = window._lipeStream;
+            if (cur && cur.url === url) {
+                return window.dash_clientside.no_update;
+            }
+            if (cur) {
+                cur.es.close();
+                window._lipeStream = null;
+            }
+            if (!url) {
+                return "";
+            }
+            const es = new EventSource(url);
+            es.addEventListener("forecast", (e) => {
+                window.dash_clientside.set_props("fc-push", {data: JSON.parse(e.data)});
+            });
+            window._lipeStream = {url: url, es: es};
+            return "live";
+        }
+    }
+});
@@ -1,9 +1,71 @@
 from __future__ import annotations
-import os, requests
-from typing import Optional, Dict, Any
+import os, hashlib, json, threading, time, requests
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_BASE = os.getenv("API_BASE_URL", "http://localhost:8000").rstrip("/")
+PUBLIC_API_BASE = os.getenv("PUBLIC_API_BASE_URL", API_BASE).rstrip("/")  # as seen by the browser (SSE)
 TIMEOUT  = (3, 25)
+POOL_SIZE = int(os.getenv("API_POOL_SIZE", "16"))      # keep-alive connections per worker
+RETRIES   = int(os.getenv("API_RETRIES", "2"))
+BACKOFF   = float(os.getenv("API_BACKOFF", "0.3"))     # 0.3s, 0.6s, 1.2s ...
+MAX_POINTS = int(os.getenv("API_MAX_POINTS", "500"))  # charts are a few hundred px wide: LTTB server-side
+COLUMNAR  = {"shape": "columnar", "ts": "ms",          # forecast: parallel arrays, epoch-ms timestamps
+             "max_points": MAX_POINTS}
+
+# ---------- Transport ----------
+_SESSION: Optional[requests.Session] = None
+_SESSION_PID = 0
+_POOL: Optional[ThreadPoolExecutor] = None
+_LOCK = threading.Lock()
+
+def _http() -> requests.Session:
+    """One pooled keep-alive session per (forked) worker process."""
+    global _SESSION, _SESSION_PID, _POOL
+    if _SESSION is None or _SESSION_PID != os.getpid():
+        with _LOCK:
+            if _SESSION is None or _SESSION_PID != os.getpid():
+                # urllib3's default allowed_methods: only idempotent verbs are retried here; read-only POSTs
+                # (forecast, explain) opt in through _post_idempotent
+                retry = Retry(total=RETRIES, read=0, backoff_factor=BACKOFF,
+                              status_forcelist=(502, 503, 504), raise_on_status=False)
+                ad = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+                s = requests.Session()
+                s.mount("http://", ad)
+                s.mount("https://", ad)
+                _SESSION, _SESSION_PID = s, os.getpid()
+                _POOL = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="api")
+    return _SESSION
+
+def submit(call: Callable[[], Any]) -> "Future[Any]":
+    """Start one backend call on the shared pool; for calls that depend on an earlier result."""
+    _http()
+    return _POOL.submit(call)
+
+def gather(*calls: Callable[[], Any], return_exceptions: bool = False) -> List[Any]:
+    """Run independent backend calls concurrently; results in call order (latency = the slowest call)."""
+    futs = [submit(c) for c in calls]
+    out = []
+    for f in futs:
+        try:
+            out.append(f.result())
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            out.append(e)
+    return out
+
+def _post_idempotent(url: str, **kw) -> requests.Response:
+    """POST that only reads on the backend, so 502/503/504 are retried like a GET (connect errors already are)."""
+    for i in range(RETRIES + 1):
+        r = _http().post(url, **kw)
+        if r.status_code not in (502, 503, 504) or i == RETRIES:
+            return r
+        time.sleep(BACKOFF * 2**i)
+    return r
 
 def _h(tok: Optional[str] = None) -> Dict[str, str]:
     h = {"Accept": "application/json"}
@@ -13,53 +75,96 @@ def _h(tok: Optional[str] = None) -> Dict[str, str]:
 
 # ---------- Auth ----------
 def login(email: str, team: str) -> Dict[str, Any]:
-    r = requests.post(f"{API_BASE}/v1/auth/login",
-                      json={"email": email, "team": team},
-                      timeout=TIMEOUT)
+    r = _http().post(f"{API_BASE}/v1/auth/login",
+                     json={"email": email, "team": team},
+                     timeout=TIMEOUT)
     r.raise_for_status()
     return r.json()
 
 # ---------- Core ----------
+_ETAGS: "OrderedDict[Tuple[str, str, str, int], Tuple[str, Dict[str, Any]]]" = OrderedDict()
+
+def _identity(tok: Optional[str]) -> str:
+    """A digest of the bearer token, so cached bodies are never replayed to another caller."""
+    return hashlib.blake2b((tok or "").encode(), digest_size=16).hexdigest()
+
 def forecast(tok: Optional[str], arena: str, symbol: str, horizon: int) -> Dict[str, Any]:
-    r = requests.post(f"{API_BASE}/v1/forecast",
-                      headers=_h(tok),
-                      json={"arena": arena, "symbol": symbol, "horizon": horizon},
-                      timeout=TIMEOUT)
+    key = (_identity(tok), arena, symbol, horizon)
+    h = _h(tok)
+    prev = _ETAGS.get(key)
+    if prev:
+        h["If-None-Match"] = prev[0]
+    r = _post_idempotent(f"{API_BASE}/v1/forecast",
+                         headers=h,
+                         params=COLUMNAR,
+                         json={"arena": arena, "symbol": symbol, "horizon": horizon},
+                         timeout=TIMEOUT)
+    if r.status_code == 304 and prev:
+        return prev[1]
+    if r.status_code in (401, 402):
+        return {"_error": r.status_code, "_json": r.json()}
+    r.raise_for_status()
+    res = r.json()
+    if r.headers.get("ETag"):
+        with _LOCK:
+            _ETAGS[key] = (r.headers["ETag"], res)
+            while len(_ETAGS) > 256:
+                _ETAGS.popitem(last=False)
+    return res
+
+def forecast_batch(tok: Optional[str], arena: str, symbols: List[str], horizons: List[int]) -> Dict[str, Any]:
+    """One round trip for a whole watchlist → {"arena", "items": [{symbol, forecasts: {h: ForecastResp}, error}]}."""
+    r = _post_idempotent(f"{API_BASE}/v1/forecast/batch",
+                         headers=_h(tok),
+                         json={"arena": arena, "symbols": symbols, "horizons": horizons},
+                         timeout=TIMEOUT)
     if r.status_code in (401, 402):
         return {"_error": r.status_code, "_json": r.json()}
     r.raise_for_status()
     return r.json()
 
+def forecast_batch_stream(tok: Optional[str], arena: str, symbols: List[str], horizons: List[int]) -> Iterator[Dict[str, Any]]:
+    """Like forecast_batch, but yields each symbol's item as soon as the backend finishes it."""
+    h = {**_h(tok), "Accept": "application/x-ndjson"}
+    with _http().post(f"{API_BASE}/v1/forecast/batch",
+                     headers=h,
+                     json={"arena": arena, "symbols": symbols, "horizons": horizons},
+                     timeout=TIMEOUT, stream=True) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if line:
+                yield json.loads(line)
+
 def explain(tok: Optional[str], arena: str, symbol: str, horizon: int) -> Dict[str, Any]:
-    r = requests.post(f"{API_BASE}/v1/explain/forecast",
-                      headers=_h(tok),
-                      json={"arena": arena, "symbol": symbol, "horizon": horizon},
-                      timeout=TIMEOUT)
+    r = _post_idempotent(f"{API_BASE}/v1/explain/forecast",
+                         headers=_h(tok),
+                         json={"arena": arena, "symbol": symbol, "horizon": horizon},
+                         timeout=TIMEOUT)
     return r.json() if r.ok else {}
 
 def share_create(tok: Optional[str], arena: str, symbol: str, horizon: int, ttl_hours: int = 24) -> Dict[str, Any]:
-    r = requests.post(f"{API_BASE}/v1/share/create",
-                      headers=_h(tok),
-                      json={"arena": arena, "symbol": symbol, "horizon": horizon, "ttl_hours": ttl_hours},
-                      timeout=TIMEOUT)
+    r = _http().post(f"{API_BASE}/v1/share/create",
+                     headers=_h(tok),
+                     json={"arena": arena, "symbol": symbol, "horizon": horizon, "ttl_hours": ttl_hours},
+                     timeout=TIMEOUT)
     return r.json() if r.ok else {}
 
 # ---------- Public ----------
 def public_slo() -> Dict[str, Any]:
-    r = requests.get(f"{API_BASE}/v1/public/slo.json", timeout=TIMEOUT)
+    r = _http().get(f"{API_BASE}/v1/public/slo.json", timeout=TIMEOUT)
     return r.json() if r.ok else {}
 
 def public_accuracy() -> Dict[str, Any]:
-    r = requests.get(f"{API_BASE}/v1/public/accuracy.json", timeout=TIMEOUT)
+    r = _http().get(f"{API_BASE}/v1/public/accuracy.json", timeout=TIMEOUT)
     return r.json() if r.ok else {}
 
 def public_plans() -> Dict[str, Any]:
-    r = requests.get(f"{API_BASE}/v1/public/plans.json", timeout=TIMEOUT)
+    r = _http().get(f"{API_BASE}/v1/public/plans.json", timeout=TIMEOUT)
     return r.json() if r.ok else {}
 
 def billing_checkout(tok: Optional[str], arena: str) -> Dict[str, Any]:
-    r = requests.post(f"{API_BASE}/v1/billing/checkout",
-                      headers=_h(tok),
-                      json={"arena": arena},
-                      timeout=TIMEOUT)
+    r = _http().post(f"{API_BASE}/v1/billing/checkout",
+                     headers=_h(tok),
+                     json={"arena": arena},
+                     timeout=TIMEOUT)
     return r.json() if r.ok else {}
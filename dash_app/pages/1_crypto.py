@@ -1,9 +1,9 @@
 from __future__ import annotations
-from dash import register_page, html, dcc, Input, Output, State, no_update, callback
+from urllib.parse import urlencode
+from dash import (register_page, html, dcc, Input, Output, State, callback,
+                  clientside_callback, ClientsideFunction)
 import dash_bootstrap_components as dbc
-import plotly.graph_objs as go
-import pandas as pd
-from dash_app.lib.api import forecast, explain, share_create, billing_checkout
+from dash_app.lib.api import forecast, explain, share_create, billing_checkout, submit, PUBLIC_API_BASE, COLUMNAR
 
 register_page(__name__, path="/crypto", name="Crypto")
 
@@ -18,11 +18,16 @@ def layout():
                 dbc.Col(dbc.Button("Run Forecast", id="go", color="primary"), md=3)
             ], align="center"),
             dbc.Row([
-                dbc.Col(dcc.Checklist(options=[{"label":" Auto-refresh (15s)", "value":"on"}],
-                                      value=[], id="auto"), md=4)
+                dbc.Col(dcc.Checklist(options=[{"label":" Live updates", "value":"on"}],
+                                      value=[], id="auto"), md=4),
+                dbc.Col(html.Span(id="stream-state", className="small text-muted"), md=2),
             ])
         ]), className="mb-3"),
-        dcc.Interval(id="poll", interval=15_000, n_intervals=0),
+        # raw columnar forecast arrays, drawn by assets/chart.js: from a run (fc-data) or
+        # pushed by assets/stream.js from the backend SSE stream (fc-push)
+        dcc.Store(id="fc-data"),
+        dcc.Store(id="fc-push"),
+        dcc.Store(id="stream-cfg"),
         dbc.Row([
             dbc.Col(dcc.Graph(id="fig"), md=8),
             dbc.Col(dbc.Card(dbc.CardBody([
@@ -39,70 +44,82 @@ def layout():
     ], fluid=True)
 
 # ---------- callbacks ----------
+def _slim(res):
+    """Just what assets/chart.js draws: the columnar forecast arrays plus the KPI fields."""
+    evt = res.get("event", {})
+    return {"event": {"forecast": evt.get("forecast") or {}, "metrics": evt.get("metrics") or {},
+                      "meta": {"regime": (evt.get("meta") or {}).get("regime")}}}
+
 @callback(
-    Output("fig", "figure"),
-    Output("kpi-regime", "children"),
-    Output("kpi-entropy", "children"),
-    Output("kpi-edge", "children"),
-    Output("kpi-sfh", "children"),
+    Output("fc-data", "data"),
     Output("chips", "children"),
     Output("paywall", "children"),
     Output("share", "children"),
+    Output("stream-cfg", "data"),
     Input("go", "n_clicks"),
-    Input("poll", "n_intervals"),
-    State("auto", "value"),
     State("sym", "value"),
     State("hz", "value"),
     State("jwt", "data"),
     prevent_initial_call=True
 )
-def run(n, _tick, auto, sym, hz, tok):
-    # only poll when checkbox on
-    if (not n and "on" not in (auto or [])) and _tick > 0:
-        return no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update
-
+def run(n, sym, hz, tok):
+    # explain runs alongside the forecast; the share link starts as soon as the forecast is usable,
+    # so it overlaps explain instead of adding a serial hop
+    xf = submit(lambda: explain(tok, "crypto", sym, int(hz)))
     res = forecast(tok, "crypto", sym, int(hz))
     if "_error" in res and res["_error"] == 402:
         url = res["_json"].get("checkout_url") or billing_checkout(tok, "Crypto").get("url")
-        return (go.Figure(), "", "", "", "", "",
+        return (None, "",
                 dbc.Alert(dbc.Button("Subscribe to Crypto", href=url, target="_blank", color="warning"),
                           color="dark"),
-                "")
+                "", None)
 
     if "_error" in res:
-        return go.Figure(), "", "", "", "", "", dbc.Alert("Auth required", color="danger"), ""
-
-    evt  = res.get("event", {})
-    fc   = (evt.get("forecast") or {}).get("points") or []
-    met  = evt.get("metrics") or {}
-    if not fc:
-        return go.Figure(), "", "", "", "", "", "", ""
+        return None, "", dbc.Alert("Auth required", color="danger"), "", None
 
-    xs   = [pd.to_datetime(p["ts"]) for p in fc]
-    yhat = [float(p["yhat"]) for p in fc]
-    q10  = [float(p.get("q10", p["yhat"])) for p in fc]
-    q90  = [float(p.get("q90", p["yhat"])) for p in fc]
-
-    fig = go.Figure()
-    fig.add_scatter(x=xs, y=q90, name="q90", mode="lines", line=dict(width=0.1), showlegend=False)
-    fig.add_scatter(x=xs, y=q10, name="q10", mode="lines", fill="tonexty",
-                    line=dict(width=0.1), fillcolor="rgba(124,92,255,0.20)", showlegend=False)
-    fig.add_scatter(x=xs, y=yhat, name="Forecast", mode="lines", line=dict(dash="dash", width=2))
-    fig.update_layout(margin=dict(l=30,r=10,t=10,b=30), hovermode="x unified")
+    if not (res.get("event", {}).get("forecast") or {}).get("ts"):
+        return None, "", "", "", None
 
+    sf = submit(lambda: share_create(tok, "crypto", sym, int(hz), ttl_hours=24))
+    try:
+        xp = xf.result()
+    except Exception:
+        xp = {}
     chips = []
-    xp = explain(tok, "crypto", sym, int(hz)) or {}
+    xp = xp if isinstance(xp, dict) else {}
     tags = (xp.get("tags") or []) + (xp.get("archetype_tags") or [])
     for t in tags[:8]:
         chips.append(dbc.Badge(t, className="me-1 mb-1", color="secondary"))
 
     # share link
-    sh = share_create(tok, "crypto", sym, int(hz), ttl_hours=24) or {}
+    try:
+        sh = sf.result()
+    except Exception:
+        sh = {}
     share = dbc.Button("Share 24h link", href=sh.get("url"), target="_blank", color="secondary") if sh.get("url") else ""
 
-    return (fig,
-            f"Regime: {met.get('regime', '—')}",
-            f"Entropy: {met.get('entropy', '—')}",
-            f"Edge: {met.get('edge', '—')}",
-            f"SFH: {met.get('sfh_days', '—')} d",
-            chips, "", share)
+    # subscribe this tab to pushes for what it now shows (only while "Live updates" is ticked)
+    cfg = {"api": PUBLIC_API_BASE, "arena": "crypto", "symbol": sym, "horizon": int(hz), "query": urlencode(COLUMNAR)}
+    return _slim(res), chips, "", share, cfg
+
+# figure + KPIs are drawn in the browser from fc-data (a run) or fc-push (the SSE stream): no server round trip
+clientside_callback(
+    ClientsideFunction(namespace="chart", function_name="draw"),
+    Output("fig", "figure"),
+    Output("fig", "extendData"),
+    Output("kpi-regime", "children"),
+    Output("kpi-entropy", "children"),
+    Output("kpi-edge", "children"),
+    Output("kpi-sfh", "children"),
+    Input("fc-data", "data"),
+    Input("fc-push", "data"),
+    State("fig", "figure"),
+    prevent_initial_call=True
+)
+
+clientside_callback(
+    ClientsideFunction(namespace="stream", function_name="subscribe"),
+    Output("stream-state", "children"),
+    Input("stream-cfg", "data"),
+    Input("auto", "value"),
+)
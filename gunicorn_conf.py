@@ -1,4 +1,4 @@
-import os
+import logging, os
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
 workers = int(os.getenv("WEB_CONCURRENCY", "2"))
 worker_class = "uvicorn.workers.UvicornWorker"
@@ -6,3 +6,24 @@ timeout = 90
 keepalive = 5
 accesslog = "-"
 errorlog = "-"
+
+# Import the app once in the master and warm it there (lipe_core.warmup); workers fork from it and
+# share the imported modules and warm caches copy-on-write. LIPE_PRELOAD=0: each worker imports
+# and warms itself in its startup hook.
+preload_app = os.getenv("LIPE_PRELOAD", "1") == "1"
+
+def when_ready(server):
+    # lipe_core's loggers write through gunicorn's error log; forked workers inherit the handlers
+    lipe = logging.getLogger("lipe_core")
+    lipe.handlers[:] = server.log.error_log.handlers
+    lipe.setLevel(logging.INFO)
+    lipe.propagate = False
+    if preload_app:
+        from lipe_core import warmup
+        warmup.preload()
+        server.log.info("lipe boot (master): %s", warmup.BOOT.snapshot())
+
+def post_fork(server, worker):
+    if preload_app:
+        from lipe_core import warmup
+        warmup.post_fork()
@@ -1,13 +1,140 @@
 # lib/api.py
 from __future__ import annotations
-import os, math, time, datetime as dt
-from typing import Any, Dict, Optional, List
+import os, json, hashlib, math, time, threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, List, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 _API_BASE = os.getenv("HIS_API_BASE", "").rstrip("/")
 _TENANT_ID = os.getenv("HIS_TENANT_ID", "demo-tenant")
 _USER_EMAIL = os.getenv("HIS_USER_EMAIL", "demo@user.dev")
 TIMEOUT = (3, 25)
+MAX_POINTS = int(os.getenv("HIS_MAX_POINTS", "500"))   # series / equity curves are LTTB-downsampled server-side
+COLUMNAR = {"shape": "columnar", "ts": "ms", "max_points": MAX_POINTS}   # parallel arrays + epoch-ms timestamps
+POOL_SIZE = int(os.getenv("HIS_POOL_SIZE", "8"))
+CACHE_TTL_S = float(os.getenv("HIS_CACHE_TTL_S", "60"))       # one backend call per key per TTL
+CACHE_STALE_S = float(os.getenv("HIS_CACHE_STALE_S", "600"))   # past the TTL, serve the old value this long while refreshing
+CACHE_MAX = int(os.getenv("HIS_CACHE_MAX", "512"))
+PING_TTL_S = 15.0
+RETRIES = 2
+BACKOFF = 0.3
+
+# ---------- Transport ----------
+_SESSION: Optional[requests.Session] = None
+_SESSION_PID = 0
+_POOL: Optional[ThreadPoolExecutor] = None
+_LOCK = threading.Lock()
+
+def _http() -> requests.Session:
+    """One pooled keep-alive session (and refresh pool) per process; Streamlit reruns reuse it."""
+    global _SESSION, _SESSION_PID, _POOL
+    if _SESSION is None or _SESSION_PID != os.getpid():
+        with _LOCK:
+            if _SESSION is None or _SESSION_PID != os.getpid():
+                # urllib3's default allowed_methods: POSTs are not retried here; read-only ones opt in
+                # through _post_idempotent
+                retry = Retry(total=RETRIES, read=0, backoff_factor=BACKOFF,
+                              status_forcelist=(502, 503, 504), raise_on_status=False)
+                ad = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+                s = requests.Session()
+                s.mount("http://", ad)
+                s.mount("https://", ad)
+                _SESSION, _SESSION_PID = s, os.getpid()
+                _POOL = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="his-refresh")
+    return _SESSION
+
+def _post_idempotent(url: str, **kw) -> requests.Response:
+    """POST that only reads on the backend, so 502/503/504 are retried like a GET (connect errors already are)."""
+    for i in range(RETRIES + 1):
+        r = _http().post(url, **kw)
+        if r.status_code not in (502, 503, 504) or i == RETRIES:
+            return r
+        time.sleep(BACKOFF * 2**i)
+    return r
+
+# ---------- Cache ----------
+class _TTLCache:
+    """
+    LRU of (fetched_at, value) with stale-while-revalidate: fresh entries (< ttl) are served
+    as is; stale ones (< ttl + stale) are served while one background refresh replaces them;
+    older or missing ones block. Concurrent misses on a key share one call; errors are not cached.
+    """
+    def __init__(self, max_entries: int = CACHE_MAX):
+        self.max_entries = max_entries
+        self._d: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "coalesced": 0, "refresh_errors": 0}
+
+    def _fetch(self, key: Hashable, fn: Callable[[], Any], fut: Future) -> Any:
+        try:
+            val = fn()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            self._d[key] = (time.monotonic(), val)
+            self._d.move_to_end(key)
+            while len(self._d) > self.max_entries:
+                self._d.popitem(last=False)
+            self._inflight.pop(key, None)
+        fut.set_result(val)
+        return val
+
+    def _refresh(self, key: Hashable, fn: Callable[[], Any], fut: Future) -> None:
+        try:
+            self._fetch(key, fn, fut)
+        except Exception:
+            self.stats["refresh_errors"] += 1   # keep serving the stale value
+
+    def get(self, key: Hashable, fn: Callable[[], Any], ttl_s: float = CACHE_TTL_S,
+            stale_s: float = CACHE_STALE_S) -> Any:
+        with self._lock:
+            ent = self._d.get(key)
+            age = time.monotonic() - ent[0] if ent else math.inf
+            fut = self._inflight.get(key)
+            if age < ttl_s + stale_s:
+                self._d.move_to_end(key)
+                if age < ttl_s:
+                    self.stats["hits"] += 1
+                    return ent[1]
+                self.stats["stale"] += 1
+                if fut is None:
+                    fut = self._inflight[key] = Future()
+                    _http()
+                    _POOL.submit(self._refresh, key, fn, fut)
+                return ent[1]
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if leader:
+            return self._fetch(key, fn, fut)
+        return fut.result()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._d.clear()
+
+CACHE = _TTLCache()
+
+def _identity(token: Optional[str]) -> str:
+    """Who the backend answers for: a digest of the bearer token (never the token itself) and the user."""
+    return hashlib.blake2b(f"{token or ''}\0{_USER_EMAIL}".encode(), digest_size=16).hexdigest()
+
+def _key(kind: str, token: Optional[str], *parts: Any) -> Tuple[Any, ...]:
+    """
+    Cache key scoped to the backend, tenant and caller: (kind, base, tenant, identity, arena, symbol, ...).
+    Entries (fresh or stale) are only ever served to the identity that fetched them.
+    """
+    return (kind, _API_BASE, _TENANT_ID, _identity(token), *parts)
 
 def set_api_base(base: str) -> None:
     global _API_BASE
@@ -22,61 +149,98 @@ def _hdr(token: Optional[str] = None) -> Dict[str, str]:
 def ping() -> bool:
     if not _API_BASE:
         return False
-    try:
-        r = requests.get(f"{_API_BASE}/healthz", timeout=(2, 5))
-        return r.status_code == 200
-    except Exception:
-        return False
+    def call() -> bool:
+        try:
+            return _http().get(f"{_API_BASE}/healthz", timeout=(2, 5)).status_code == 200
+        except Exception:
+            return False
+    return CACHE.get(_key("ping", None), call, ttl_s=PING_TTL_S, stale_s=0.0)
 
-def api_lipe_forecast(token: Optional[str], arena: str, symbol: str, horizon: int) -> Dict[str, Any]:
-    """Calls backend if configured; otherwise returns a synthetic forecast so UI works now."""
-    if _API_BASE:
-        r = requests.post(
-            f"{_API_BASE}/v1/forecast",
-            headers=_hdr(token),
-            json={"arena": arena, "symbol": symbol, "horizon": horizon},
-            timeout=TIMEOUT,
-        )
-        r.raise_for_status()
-        return r.json()
-
-    # ---- Fallback: synthetic forecast (so the page is usable without backend) ----
-    now = dt.datetime.utcnow()
-    points: List[Dict[str, Any]] = []
+def _synthetic_forecast(arena: str, symbol: str, horizon: int) -> Dict[str, Any]:
+    now = int(time.time() * 1000)
+    cols: Dict[str, List[float]] = {"ts": [], "yhat": [], "q10": [], "q90": []}
     for i in range(horizon + 30):
-        t = now + dt.timedelta(days=i)
         base = 100 + 5 * math.sin(i / 3.2)
         band = 2.5 + 0.2 * i
-        points.append({"ts": t.isoformat() + "Z", "yhat": base, "q10": base - band, "q90": base + band})
+        cols["ts"].append(now + i * 86_400_000)
+        cols["yhat"].append(base)
+        cols["q10"].append(base - band)
+        cols["q90"].append(base + band)
 
     return {
         "event": {
             "arena": arena,
             "symbol": symbol,
             "horizon": horizon,
-            "forecast": {"points": points},
+            "forecast": cols,
             "metrics": {"entropy": 0.33, "edge": 0.12, "regime": "Compression→Expansion"},
         }
     }
 
+# Results below are cached per (tenant, caller, arena, symbol, horizon/spec) and shared across reruns and
+# that caller's sessions: treat the returned dicts as read-only.
+def api_lipe_forecast(token: Optional[str], arena: str, symbol: str, horizon: int) -> Dict[str, Any]:
+    """Calls backend if configured; otherwise returns a synthetic forecast so UI works now."""
+    def call() -> Dict[str, Any]:
+        if not _API_BASE:
+            # ---- Fallback: synthetic forecast (so the page is usable without backend) ----
+            return _synthetic_forecast(arena, symbol, horizon)
+        r = _post_idempotent(
+            f"{_API_BASE}/v1/forecast",
+            headers=_hdr(token),
+            params=COLUMNAR,
+            json={"arena": arena, "symbol": symbol, "horizon": horizon},
+            timeout=TIMEOUT,
+        )
+        r.raise_for_status()
+        return r.json()
+    return CACHE.get(_key("forecast", token, arena, symbol, int(horizon)), call)
+
+def api_lipe_forecast_batch(token: Optional[str], arena: str, symbols: List[str], horizons: List[int]) -> Dict[str, Any]:
+    """Many symbols × horizons in one call; synthetic per-item fallback when no backend is configured."""
+    def call() -> Dict[str, Any]:
+        if not _API_BASE:
+            items = []
+            for s in symbols:
+                fc = {str(h): api_lipe_forecast(token, arena, s, h)["event"] for h in horizons}
+                items.append({"symbol": s, "forecasts": fc, "error": None})
+            return {"arena": arena, "items": items}
+        r = _post_idempotent(
+            f"{_API_BASE}/v1/forecast/batch",
+            headers=_hdr(token),
+            params=COLUMNAR,
+            json={"arena": arena, "symbols": symbols, "horizons": horizons},
+            timeout=TIMEOUT,
+        )
+        r.raise_for_status()
+        return r.json()
+    return CACHE.get(_key("forecast_batch", token, arena, tuple(symbols), tuple(int(h) for h in horizons)), call)
+
 def api_lipe_strategy_eval(token: Optional[str], arena: str, symbol: str, spec: Dict[str, Any], lookback_days: int = 180) -> Dict[str, Any]:
-    if not _API_BASE:
-        # minimal synthetic response
-        eq = [{"t": i, "equity": 100 + 0.3 * i} for i in range(lookback_days // 3)]
-        return {"metrics": {"roi": 0.07, "hitrate": 0.58, "maxdd": 0.10}, "equity_curve": eq}
-    r = requests.post(
-        f"{_API_BASE}/v1/strategy/eval",
-        headers=_hdr(token),
-        json={"arena": arena, "symbol": symbol, "spec": spec, "lookback_days": lookback_days},
-        timeout=TIMEOUT,
-    )
-    r.raise_for_status()
-    return r.json()
+    """`spec` holds the StrategySpec fields besides arena / symbol / lookback_days (enter, exit, horizon, timeframe)."""
+    def call() -> Dict[str, Any]:
+        if not _API_BASE:
+            # minimal synthetic response
+            now = int(time.time() * 1000)
+            n = lookback_days // 3
+            eq = {"ts": [now - (n - i) * 86_400_000 for i in range(n)], "equity": [100 + 0.3 * i for i in range(n)]}
+            return {"metrics": {"roi": 0.07, "hitrate": 0.58, "maxdd": 0.10}, "equity_curve": eq}
+        r = _post_idempotent(
+            f"{_API_BASE}/v1/strategy/eval",
+            headers=_hdr(token),
+            params=COLUMNAR,
+            json={**spec, "arena": arena, "symbol": symbol, "lookback_days": lookback_days},
+            timeout=TIMEOUT,
+        )
+        r.raise_for_status()
+        return r.json()
+    key = json.dumps(spec, sort_keys=True, default=str)
+    return CACHE.get(_key("strategy_eval", token, arena, symbol, key, int(lookback_days)), call)
 
 def api_checkout(token: Optional[str], arena: str, plan_id: str) -> Dict[str, Any]:
     if not _API_BASE:
         return {"url": "https://example.com/checkout"}
-    r = requests.post(
+    r = _http().post(
         f"{_API_BASE}/v1/billing/checkout",
         headers=_hdr(token),
         json={"arena": arena, "plan_id": plan_id},
@@ -87,5 +251,6 @@ def api_checkout(token: Optional[str], arena: str, plan_id: str) -> Dict[str, An
 
 # Backwards-compatible aliases some pages use:
 forecast = api_lipe_forecast
+forecast_batch = api_lipe_forecast_batch
 strategy_backtest = api_lipe_strategy_eval
 checkout = api_checkout
@@ -0,0 +1,375 @@
+"""
+Walk-forward forecast accuracy.
+
+Every served forecast is appended to a fixed-width record log (one record per forecast
+version: its horizon step's yhat / q10 / q90). A scoring pass takes the records whose target bar
+closed since the last pass, looks up the realized close, and folds MAPE, 80%-band coverage
+and pinball loss into running sums per (arena, symbol, timeframe, model, horizon) in SQLite,
+so /v1/public/accuracy.json only reads the small aggregate table.
+
+    python -m lipe_core.accuracy score
+    python -m lipe_core.accuracy backfill --symbols BTCUSDT,ETHUSDT --days 1095 --horizons 1,5,30
+"""
+from __future__ import annotations
+import argparse, os, sqlite3, sys, tempfile, threading, time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from numpy.lib.recfunctions import repack_fields
+from lipe_core.data import DAY_MS, TIMEFRAMES, fetch_exchange_bars, bars_per_day
+from lipe_core import engine
+
+ACC_LOG = os.getenv("LIPE_ACC_LOG", os.path.join(tempfile.gettempdir(), "lipe_forecasts.rec"))   # "" disables logging
+ACC_DB = os.getenv("LIPE_ACC_DB", os.path.join(tempfile.gettempdir(), "lipe_accuracy.sqlite3"))
+ACC_SCORE_S = float(os.getenv("LIPE_ACC_SCORE_S", "300"))     # background scoring interval per worker
+ACC_LAG_S = float(os.getenv("LIPE_ACC_LAG_S", "120"))         # wait this long after a bar closes before scoring it
+ACC_GIVE_UP_S = float(os.getenv("LIPE_ACC_GIVE_UP_S", str(2*86400)))   # target bar still missing this long after: drop it
+BACKFILL_WORKERS = int(os.getenv("LIPE_ACC_BACKFILL_WORKERS", str(os.cpu_count() or 1)))
+BACKFILL_BLOCK = 2048                                          # history windows scored per engine pass
+MAX_LEAD_MS = 31*DAY_MS                                        # a record is due at most 31 bars (≤ 1d) after it is logged
+
+RECORD = np.dtype([
+    ("logged_ms", "<i8"), ("issued_ms", "<i8"), ("due_ms", "<i8"),   # due: close time of the target bar
+    ("arena", "S8"), ("symbol", "S16"), ("timeframe", "S4"), ("model", "S24"), ("horizon", "<i2"),
+    ("target_ms", "<i8"), ("yhat", "<f8"), ("q10", "<f8"), ("q90", "<f8"),
+])
+_KEY = ("arena", "symbol", "timeframe", "model", "horizon")
+
+# ---------- forecast log ----------
+class ForecastLog:
+    """
+    Append-only file of RECORD rows. Every worker appends with O_APPEND and one write() per
+    batch, which keeps records whole without a lock; readers take whole records only.
+    """
+    def __init__(self, path: str = ACC_LOG):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._pid = 0
+        self._lock = threading.Lock()
+
+    def append(self, recs: np.ndarray) -> None:
+        if not self.path or not len(recs):
+            return
+        with self._lock:
+            if self._pid != os.getpid():   # not inherited across fork
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            os.write(self._fd, recs.astype(RECORD, copy=False).tobytes())
+
+    def __len__(self) -> int:
+        try:
+            return os.path.getsize(self.path) // RECORD.itemsize
+        except OSError:
+            return 0
+
+    def read(self, start: int = 0) -> np.ndarray:
+        n = len(self) - start
+        if n <= 0:
+            return np.empty(0, RECORD)
+        return np.fromfile(self.path, dtype=RECORD, count=n, offset=start*RECORD.itemsize)
+
+LOG = ForecastLog()
+
+def _loggable(symbol: str) -> bool:
+    """Symbols longer than the record's field are not logged (rather than truncated into another symbol)."""
+    return len(symbol.encode()) <= RECORD["symbol"].itemsize
+
+def record(arena: str, symbol: str, timeframe: str, model: str, horizon: int, issued_ms: int,
+           yhat: float, q10: float, q90: float) -> None:
+    """Log one issued forecast (its horizon step). Never raises: accuracy must not break serving."""
+    if not _loggable(symbol):
+        return
+    step = TIMEFRAMES[timeframe]
+    target = issued_ms + horizon*step
+    rec = np.array([(int(time.time()*1000), issued_ms, target + step, arena, symbol, timeframe, model, horizon,
+                     target, yhat, q10, q90)], dtype=RECORD)
+    try:
+        LOG.append(rec)
+    except OSError:
+        pass
+
+# ---------- scoring ----------
+def _errors(y: np.ndarray, yhat: np.ndarray, q10: np.ndarray, q90: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Per-forecast absolute % error, band hit (0/1) and mean q10/q90 pinball loss relative to |y|."""
+    ay = np.abs(y)
+    ape = np.abs(y - yhat) / ay
+    cover = ((y >= q10) & (y <= q90)).astype(float)
+    def pinball(q, tau):
+        d = y - q
+        return np.maximum(tau*d, (tau - 1.0)*d)
+    return ape, cover, (pinball(q10, 0.1) + pinball(q90, 0.9)) / 2.0 / ay
+
+def _realized(recs: np.ndarray) -> np.ndarray:
+    """
+    Exchange close of each record's target bar; NaN when the exchange cannot be reached or does
+    not have the bar (never synthetic bars: those would score forecasts against made-up prices).
+    """
+    y = np.full(len(recs), np.nan)
+    for sym, tf in {(r["symbol"], r["timeframe"]) for r in recs[["symbol", "timeframe"]]}:
+        m = (recs["symbol"] == sym) & (recs["timeframe"] == tf)
+        tgt = recs["target_ms"][m]
+        span = (int(time.time()*1000) - int(tgt.min())) // TIMEFRAMES[tf.decode()] + 2
+        try:
+            bars = fetch_exchange_bars(sym.decode(), limit=int(span), timeframe=tf.decode())
+        except Exception:
+            continue
+        ts = bars["ts"]
+        if not len(ts):
+            continue
+        i = np.minimum(np.searchsorted(ts, tgt), len(ts) - 1)
+        y[m] = np.where(ts[i] == tgt, bars["close"][i], np.nan)
+    return y
+
+def _latest(recs: np.ndarray) -> np.ndarray:
+    """One record per (key, issued bar): the last one logged (the open bar re-forecasts as its close moves)."""
+    if not len(recs):
+        return recs
+    _, last = np.unique(repack_fields(recs[[*_KEY, "issued_ms"]])[::-1], return_index=True)
+    return recs[::-1][np.sort(last)][::-1]
+
+def _sums(recs: np.ndarray, y: np.ndarray) -> List[tuple]:
+    """Aggregate rows (key..., n, ape, cover, pinball, last_ms) for scored records."""
+    ok = np.isfinite(y) & (y != 0)
+    recs, y = recs[ok], y[ok]
+    if not len(recs):
+        return []
+    ape, cover, pb = _errors(y, recs["yhat"], recs["q10"], recs["q90"])
+    keys, inv = np.unique(repack_fields(recs[list(_KEY)]), return_inverse=True)
+    k = len(keys)
+    n = np.bincount(inv, minlength=k)
+    sums = [np.bincount(inv, weights=v, minlength=k) for v in (ape, cover, pb)]
+    last = np.zeros(k, np.int64)
+    np.maximum.at(last, inv, recs["target_ms"])
+    return [(*(x.decode() if isinstance(x, bytes) else int(x) for x in keys[j].tolist()), int(n[j]),
+             float(sums[0][j]), float(sums[1][j]), float(sums[2][j]), int(last[j])) for j in range(k)]
+
+_SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS acc(
+    arena TEXT NOT NULL, symbol TEXT NOT NULL, timeframe TEXT NOT NULL, model TEXT NOT NULL,
+    horizon INTEGER NOT NULL, source TEXT NOT NULL,
+    n INTEGER NOT NULL, ape REAL NOT NULL, cover REAL NOT NULL, pinball REAL NOT NULL, last_ms INTEGER NOT NULL,
+    PRIMARY KEY(arena, symbol, timeframe, model, horizon, source));
+CREATE TABLE IF NOT EXISTS acc_state(watermark INTEGER NOT NULL, cursor INTEGER NOT NULL);
+INSERT INTO acc_state SELECT 0, 0 WHERE NOT EXISTS (SELECT 1 FROM acc_state);
+COMMIT;
+"""
+
+class AccuracyStore:
+    """
+    Running sums in SQLite (WAL), shared by every worker. A scoring pass claims the interval
+    (watermark, now - lag] of target-bar close times and commits its sums and the new
+    watermark in one transaction, so each forecast is counted once however many workers score.
+    The watermark stops short of the first record whose target bar could not be read, so that
+    record is retried next pass (until ACC_GIVE_UP_S after it came due).
+    """
+    def __init__(self, path: str = ACC_DB, log: ForecastLog = LOG):
+        self.path = path
+        self.log = log
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def score(self, now_ms: Optional[int] = None) -> int:
+        """Score every record that came due since the last pass; returns how many were counted."""
+        now_ms = int(time.time()*1000) if now_ms is None else now_ms
+        upto = now_ms - int(ACC_LAG_S*1000)
+        db = self._conn()
+        wm, cur = db.execute("SELECT watermark, cursor FROM acc_state").fetchone()
+        if upto <= wm:
+            return 0
+        recs = self.log.read(cur)
+        due = _latest(recs[(recs["due_ms"] > wm) & (recs["due_ms"] <= upto)])
+        y = _realized(due) if len(due) else np.empty(0)
+        missing = ~np.isfinite(y) & (due["due_ms"] > upto - int(ACC_GIVE_UP_S*1000))
+        if missing.any():
+            upto = int(due["due_ms"][missing].min()) - 1
+            if upto <= wm:
+                return 0
+        ok = due["due_ms"] <= upto
+        rows = _sums(due[ok], y[ok]) if ok.any() else []
+        # records logged more than MAX_LEAD_MS before `upto` are all due by now: skip them next time
+        old = recs["logged_ms"] < upto - MAX_LEAD_MS
+        adv = int(np.argmin(old)) if not old.all() else len(recs)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT watermark FROM acc_state").fetchone()[0] != wm:
+                db.execute("ROLLBACK")   # a sibling worker scored this interval meanwhile
+                return 0
+            self._add(db, rows, "live")
+            db.execute("UPDATE acc_state SET watermark=?, cursor=?", (upto, cur + adv))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return sum(r[5] for r in rows)
+
+    def _add(self, db: sqlite3.Connection, rows: List[tuple], source: str, replace: bool = False) -> None:
+        upd = ("n=excluded.n, ape=excluded.ape, cover=excluded.cover, pinball=excluded.pinball, last_ms=excluded.last_ms"
+               if replace else
+               "n=n+excluded.n, ape=ape+excluded.ape, cover=cover+excluded.cover, pinball=pinball+excluded.pinball, "
+               "last_ms=MAX(last_ms, excluded.last_ms)")
+        db.executemany("INSERT INTO acc VALUES (?,?,?,?,?,?,?,?,?,?,?) "
+                       f"ON CONFLICT(arena, symbol, timeframe, model, horizon, source) DO UPDATE SET {upd}",
+                       [(*r[:5], source, *r[5:]) for r in rows])
+
+    def put_backfill(self, rows: List[tuple]) -> None:
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._add(db, rows, "backfill", replace=True)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def summary(self) -> Dict[str, Any]:
+        """accuracy.json: per-arena rollups (`arenas`, what the Status page shows) and per-series rows."""
+        db = self._conn()
+        cols = "SUM(n), SUM(ape)/SUM(n), SUM(cover)/SUM(n), SUM(pinball)/SUM(n), MAX(last_ms)"
+        def rows(sql: str, names: Sequence[str]) -> List[Dict[str, Any]]:
+            out = []
+            for r in db.execute(sql):
+                d = dict(zip(names, r[:-5]))
+                n, ape, cov, pb, last = r[-5:]
+                d.update({"n": n, "mape": round(ape, 6), "coverage_80": round(cov, 4), "pinball": round(pb, 6),
+                          "last_target": _iso(last)})
+                out.append(d)
+            return out
+        wm = db.execute("SELECT watermark FROM acc_state").fetchone()[0]
+        return {
+            "generated_at": _iso(int(time.time()*1000)),
+            "scored_through": _iso(wm) if wm else None,
+            "arenas": rows(f"SELECT arena, source, {cols} FROM acc WHERE n>0 GROUP BY arena, source ORDER BY arena, source",
+                           ("arena", "source")),
+            "series": rows(f"SELECT arena, symbol, timeframe, model, horizon, source, {cols} FROM acc WHERE n>0 "
+                           "GROUP BY arena, symbol, timeframe, model, horizon, source "
+                           "ORDER BY arena, symbol, timeframe, model, horizon, source",
+                           ("arena", "symbol", "timeframe", "model", "horizon", "source")),
+        }
+
+def _iso(ms: Optional[int]) -> Optional[str]:
+    return datetime.fromtimestamp(ms/1000, tz=timezone.utc).isoformat() if ms else None
+
+_STORE: Optional[AccuracyStore] = None
+_STORE_LOCK = threading.Lock()
+
+def store() -> AccuracyStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = AccuracyStore()
+        return _STORE
+
+_SCORER_PID = 0
+
+def start() -> None:
+    """Background scoring thread for this process (idempotent, fork-aware)."""
+    global _SCORER_PID
+    with _STORE_LOCK:
+        if _SCORER_PID == os.getpid() or not ACC_LOG:
+            return
+        _SCORER_PID = os.getpid()
+    def loop():
+        while True:
+            time.sleep(ACC_SCORE_S)
+            try:
+                store().score()
+            except Exception:
+                pass
+    threading.Thread(target=loop, name="lipe-accuracy", daemon=True).start()
+
+# ---------- backfill ----------
+def _backfill_series(arena: str, symbol: str, timeframe: str, days: int, horizons: Sequence[int],
+                     history: int) -> List[tuple]:
+    """
+    Runs in a pool process. Walk-forward replay of naive_ewma over `days` of history: every
+    bar's trailing `history` closes form one row of a stacked matrix, so engine.score_batch
+    (the kernel behind run_forecast) scores BACKFILL_BLOCK issue times per pass.
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+    from lipe_core.predict import MODEL_ID
+    H = np.asarray(sorted(set(horizons)), dtype=int)
+    if not _loggable(symbol):
+        return []
+    bars = fetch_exchange_bars(symbol, limit=days*bars_per_day(timeframe) + history, timeframe=timeframe)
+    ts, c = np.array(bars["ts"]), np.array(bars["close"], dtype=float)
+    T = len(c)
+    if T and int(ts[-1]) + TIMEFRAMES[timeframe] > time.time()*1000:
+        T -= 1                                        # the open bar is neither a window end nor a target
+    issue = np.arange(history - 1, T - 1)            # last bar of each window; at least one bar after it
+    if not len(issue):
+        return []
+    win = sliding_window_view(c, history)
+    recs = []
+    for lo in range(0, len(issue), BACKFILL_BLOCK):
+        idx = issue[lo:lo + BACKFILL_BLOCK]
+        b = engine.score_batch(win[idx - history + 1], np.repeat(np.arange(len(idx)), len(H)), np.tile(H, len(idx)))
+        tgt = np.repeat(idx, len(H)) + np.tile(H, len(idx))
+        ok = tgt < T
+        pair = np.flatnonzero(ok)
+        step = np.tile(H, len(idx))[ok] - 1
+        blk = np.zeros(len(pair), RECORD)
+        blk["arena"], blk["symbol"], blk["timeframe"], blk["model"] = arena, symbol, timeframe, MODEL_ID
+        blk["horizon"] = step + 1
+        blk["target_ms"] = ts[tgt[ok]]
+        blk["yhat"], blk["q10"], blk["q90"] = b.yhat[pair, step], b.q10[pair, step], b.q90[pair, step]
+        recs.append((blk, c[tgt[ok]]))
+    blk = np.concatenate([r[0] for r in recs])
+    return _sums(blk, np.concatenate([r[1] for r in recs]))
+
+def backfill(symbols: Sequence[str], days: int = 365, timeframe: str = "1d", horizons: Sequence[int] = (1, 5, 10, 30),
+             arena: str = "crypto", workers: int = BACKFILL_WORKERS) -> Tuple[List[tuple], Dict[str, str]]:
+    """
+    Replay exchange history for `symbols` across a process pool; replaces their `backfill` aggregates.
+    Returns (rows, {symbol: error}) — a symbol whose history cannot be fetched is skipped.
+    """
+    from lipe_core.predict import HISTORY_BARS
+    syms = list(dict.fromkeys(symbols))
+    rows: List[tuple] = []
+    failed: Dict[str, str] = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(syms))), mp_context=mp.get_context("spawn")) as pool:
+        futs = {s: pool.submit(_backfill_series, arena, s, timeframe, days, horizons, HISTORY_BARS) for s in syms}
+        for s, f in futs.items():
+            try:
+                rows += f.result()
+            except Exception as e:
+                failed[s] = str(e) or e.__class__.__name__
+    store().put_backfill(rows)
+    return rows, failed
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("score")
+    bf = sub.add_parser("backfill")
+    bf.add_argument("--symbols", default="BTCUSDT,ETHUSDT")
+    bf.add_argument("--days", type=int, default=365)
+    bf.add_argument("--timeframe", default="1d", choices=sorted(TIMEFRAMES))
+    bf.add_argument("--horizons", default="1,5,10,30")
+    bf.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    a = ap.parse_args(argv)
+    if a.cmd == "score":
+        print(f"scored {store().score()} forecasts")
+    else:
+        t0 = time.perf_counter()
+        rows, failed = backfill(a.symbols.split(","), a.days, a.timeframe, [int(h) for h in a.horizons.split(",")],
+                                workers=a.workers)
+        print(f"backfilled {sum(r[5] for r in rows)} forecasts over {len(rows)} series in {time.perf_counter() - t0:.2f}s")
+        for sym, err in failed.items():
+            print(f"skipped {sym}: {err}", file=sys.stderr)
+        return 1 if failed else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
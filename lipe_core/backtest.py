@@ -0,0 +1,170 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from lipe_core.models import Rule
+from lipe_core import engine
+
+# Loop-free backtest over one series (1-D) or a stack of aligned series (2-D, one row per
+# symbol); everything works along the last axis.
+
+@dataclass
+class Backtest:
+    position: np.ndarray   # bool, held over the *next* bar's return
+    equity: np.ndarray     # starts at 1.0 on the first traded bar
+    hit_rate: np.ndarray
+    roi: np.ndarray
+    max_dd: np.ndarray
+    trades: np.ndarray
+
+FEATURES = ("entropy", "edge", "drawdown")   # the fields rules can test
+
+def features(closes: np.ndarray) -> Dict[str, np.ndarray]:
+    ent, edg, dd = engine.rolling_signals(closes)
+    return {"entropy": ent, "edge": edg, "drawdown": dd}
+
+def rule_mask(feats: Dict[str, np.ndarray], rules: Sequence[Rule], how: str = "all") -> np.ndarray:
+    """Boolean mask of bars where all (or any) rules hold; empty rule sets follow Python all()/any()."""
+    shape = feats["edge"].shape
+    if not rules:
+        return np.full(shape, how == "all")
+    hits = [feats[r.field] >= r.value if r.op == ">=" else feats[r.field] <= r.value for r in rules]
+    return np.logical_and.reduce(hits) if how == "all" else np.logical_or.reduce(hits)
+
+def positions(enter: np.ndarray, exit: np.ndarray) -> np.ndarray:
+    """
+    Vectorized form of the enter/exit state machine:
+      flat & enter → long, long & exit → flat, otherwise hold.
+    A bar with only one signal sets the state outright; a bar with both toggles it.
+    So the state is the last single-signal value XOR the parity of "both" bars since.
+    """
+    single = enter ^ exit
+    both = (enter & exit).astype(np.int64)
+    idx = np.broadcast_to(np.arange(enter.shape[-1]), enter.shape)
+    last = np.maximum.accumulate(np.where(single, idx, -1), axis=-1)
+    safe = np.maximum(last, 0)
+    base = np.where(last >= 0, np.take_along_axis(enter, safe, axis=-1), False)
+    cb = np.cumsum(both, axis=-1)
+    since = cb - np.where(last >= 0, np.take_along_axis(cb, safe, axis=-1), 0)
+    return base ^ (since % 2 == 1)
+
+def run(closes: np.ndarray, enter: Sequence[Rule], exit: Sequence[Rule], start: int = 0,
+        feats: Optional[Dict[str, np.ndarray]] = None) -> Backtest:
+    """
+    Backtest rule sets on daily closes. Signals at bar i use data through bar i and the
+    resulting position earns bar i+1's return (no look-ahead). Trading starts at `start`
+    (earlier bars only warm the rolling signals). Pass `feats` to reuse features(closes)
+    across many rule sets on the same series, or the stored ones from lipe_core.features.
+    """
+    c = np.asarray(closes, dtype=float)
+    feats = features(c) if feats is None else feats
+    live = np.arange(c.shape[-1]) >= start
+    pos = positions(rule_mask(feats, enter, "all") & live, rule_mask(feats, exit, "any") & live) & live
+    held = np.concatenate([np.zeros(pos.shape[:-1] + (1,), bool), pos[..., :-1]], axis=-1)
+    r = np.nan_to_num(engine.returns(c))
+    r = np.concatenate([np.zeros(r.shape[:-1] + (1,)), r], axis=-1)
+    equity = np.cumprod(np.where(held, 1.0 + r, 1.0)[..., start:], axis=-1)
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=-1)
+    max_dd = np.max(1.0 - equity / peak, axis=-1, initial=0.0)
+
+    prev = np.concatenate([np.zeros(pos.shape[:-1] + (1,), bool), pos[..., :-1]], axis=-1)
+    opened, closed = pos & ~prev, ~pos & prev
+    trades = opened.sum(axis=-1)
+    # pair each close with the entry before it: entry price carried forward to the exit bar
+    idx = np.broadcast_to(np.arange(c.shape[-1]), c.shape)
+    entry_at = np.maximum.accumulate(np.where(opened, idx, 0), axis=-1)
+    wins = (closed & (c > np.take_along_axis(c, entry_at, axis=-1))).sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit = np.where(trades > 0, wins / np.maximum(trades, 1), 0.0)
+    roi = (equity[..., -1] if equity.shape[-1] else np.ones(c.shape[:-1])) - 1.0
+    return Backtest(position=pos, equity=equity, hit_rate=hit, roi=roi, max_dd=max_dd, trades=trades)
+
+# ---------- portfolio ----------
+# Many symbols on one (symbol × time) grid: per-asset rule positions from run(), then weights
+# across the held assets, rebalanced on signal changes and optionally on a fixed bar cadence.
+
+WEIGHTINGS = ("equal", "inverse_vol")
+
+@dataclass
+class Portfolio:
+    equity: np.ndarray     # (T - start,) portfolio value, 1.0 on the first traded bar
+    weights: np.ndarray    # (N, T) target weights decided at each bar (held over the next), 0 = cash
+    assets: Backtest       # every symbol traded alone on the same grid
+    roi: float
+    max_dd: float
+    turnover: float        # sum of |Δweight| over all rebalances
+    exposure: float        # mean invested fraction
+
+def align(series: Sequence[Dict[str, np.ndarray]], fields: Sequence[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Put bar series on one time grid, the union of their timestamps: (ts, {field: (N, T)}).
+    A symbol's missing bars are NaN in every field but close, which carries the last close
+    forward (no return over the gap; the move lands on the bar where data resumes).
+    Bars before a symbol's first bar are NaN throughout.
+    """
+    ts = np.unique(np.concatenate([np.asarray(s["ts"], dtype=np.int64) for s in series]))
+    out = {f: np.full((len(series), len(ts)), np.nan) for f in fields}
+    have = np.zeros((len(series), len(ts)), bool)
+    for i, s in enumerate(series):
+        at = np.searchsorted(ts, np.asarray(s["ts"], dtype=np.int64))
+        have[i, at] = True
+        for f in fields:
+            out[f][i, at] = s[f]
+    if "close" in out:
+        last = np.maximum.accumulate(np.where(have, np.arange(len(ts)), 0), axis=-1)
+        out["close"] = np.where(np.maximum.accumulate(have, axis=-1), np.take_along_axis(out["close"], last, axis=-1), np.nan)
+    return ts, out
+
+def portfolio(closes: np.ndarray, enter: Sequence[Rule], exit: Sequence[Rule], start: int,
+              feats: Dict[str, np.ndarray], weighting: str = "equal", rebalance_every: int = 0,
+              fee: float = 0.0) -> Portfolio:
+    """
+    Rule-driven portfolio over aligned (N, T) closes (see align()). Each bar the assets whose
+    enter/exit state is long share the book: equally, or by inverse volatility (needs
+    feats["var"]); nothing held = cash. Weights are reset whenever the held set changes and,
+    with `rebalance_every` = k > 0, every k bars; in between they drift with prices. `fee` is
+    charged per unit of turnover at each reset. Same timing as run(): decided at bar i, earned on i+1.
+    """
+    c = np.asarray(closes, dtype=float)
+    bt = run(c, enter, exit, start=start, feats=feats)
+    pos = bt.position
+    if weighting == "inverse_vol":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sd = np.sqrt(feats["var"])
+            score = np.where(pos & (sd > 0), 1.0 / sd, 0.0)
+    else:
+        score = pos.astype(float)
+    tot = score.sum(axis=0)
+    w = score / np.where(tot > 0, tot, 1.0)
+
+    T = c.shape[-1]
+    idx = np.arange(T)
+    changed = np.concatenate([[True], np.any(pos[:, 1:] != pos[:, :-1], axis=0)])
+    due = changed | (idx == start)
+    if rebalance_every > 0:
+        due |= (idx - start) % rebalance_every == 0
+    dix = np.flatnonzero(due & (idx >= start) & (idx < T - 1))   # decision bars (a decision on the last bar earns nothing)
+    r = np.nan_to_num(engine.returns(c))
+    lg = np.cumsum(np.concatenate([np.zeros((c.shape[0], 1)), np.log1p(r)], axis=-1), axis=-1)
+    if not len(dix):
+        return Portfolio(equity=np.ones(T - start), weights=w, assets=bt, roi=0.0, max_dd=0.0, turnover=0.0, exposure=0.0)
+
+    # bar t > start is earned on the weights of the last decision d < t: value(t) = value(d) * f(t),
+    # f(t) = cash(d) + Σ_i w_i(d) · close_i(t) / close_i(d)
+    tt = np.arange(start + 1, T)
+    k = np.searchsorted(dix, tt, "left") - 1
+    W = w[:, dix]
+    grow = np.exp(lg[:, tt] - lg[:, dix[k]])
+    held = W[:, k] * grow
+    f = (1.0 - W.sum(axis=0))[k] + held.sum(axis=0)
+    # at each later decision: the drifted weights it replaces, the turnover and the fee
+    at = dix[1:] - start - 1
+    drift = held[:, at] / f[at]
+    turn = np.concatenate([[np.abs(W[:, 0]).sum()], np.abs(W[:, 1:] - drift).sum(axis=0)])
+    cost = 1.0 - fee * turn
+    vd = np.cumprod(np.concatenate([[cost[0]], f[at] * cost[1:]]))
+    equity = np.concatenate([[1.0], vd[k] * f])
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0))
+    return Portfolio(equity=equity, weights=w, assets=bt, roi=float(equity[-1] - 1.0),
+                     max_dd=float(np.max(1.0 - equity / peak, initial=0.0)), turnover=float(turn.sum()),
+                     exposure=float(W.sum(axis=0)[k].mean()))
@@ -0,0 +1,181 @@
+from __future__ import annotations
+import mmap, os, struct, tempfile, threading
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # non-POSIX: appends are still atomic per process, just not cross-process locked
+    fcntl = None
+
+BARS_DIR = os.getenv("LIPE_BARS_DIR", os.path.join(tempfile.gettempdir(), "lipe_bars"))
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("ts", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"), ("volume", "<f8"),
+)
+_HEAD = struct.Struct("<qq")   # committed rows, generation (bumped whenever the column files are replaced)
+
+class BarFile:
+    """
+    Columnar OHLCV history for one (source, symbol, timeframe) on local disk.
+
+    Layout: a directory with one little-endian column file per field
+    (`ts.i8`, `open.f8`, ...) and a `HEAD` file holding the committed row count.
+    Readers mmap the columns read-only, so every worker shares the same page cache
+    and `read()` returns zero-copy numpy views. Writers take an flock, write the
+    column tails, then publish the new count by atomically replacing `HEAD`;
+    rows past the committed count are never visible to readers. Committed rows are
+    never written in place: a rewrite that starts below the count (the open bar, a
+    backfill) writes fresh column files and renames them over the old ones, so views
+    handed out earlier keep the old inode and never tear.
+    `columns` defaults to OHLCV; other per-bar tables (lipe_core.features) reuse the layout.
+    """
+    def __init__(self, path: str, columns: Tuple[Tuple[str, str], ...] = COLUMNS):
+        self.path = path
+        self.columns = columns
+        os.makedirs(path, exist_ok=True)
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._gen = 0
+        self._lock = threading.Lock()
+
+    # ---------- reading ----------
+    def _head(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.path, "HEAD"), "rb") as f:
+                raw = f.read(_HEAD.size)
+            return _HEAD.unpack(raw) if len(raw) == _HEAD.size else (struct.unpack("<q", raw)[0], 0)
+        except (FileNotFoundError, struct.error):
+            return 0, 0
+
+    def __len__(self) -> int:
+        return self._head()[0]
+
+    def _view(self, name: str, dtype: str, n: int) -> np.ndarray:
+        mm = self._maps.get(name)
+        if mm is None or len(mm) < n*8:
+            # the old map (if any) is left to GC: arrays handed out earlier may still view it
+            with open(os.path.join(self.path, f"{name}.{dtype[1:]}"), "rb") as f:
+                mm = self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # HEAD may be a generation behind the files (read between a writer's rename and its HEAD)
+        return np.frombuffer(mm, dtype=dtype, count=min(n, len(mm) // 8))
+
+    def read(self, limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Last `limit` committed bars as {column: read-only array}."""
+        n, gen = self._head()
+        with self._lock:
+            if n == 0:
+                return {c: np.empty(0, dtype=d) for c, d in self.columns}
+            if gen != self._gen:
+                self._maps.clear()   # files were replaced; old maps stay alive under earlier views
+                self._gen = gen
+            cols = {c: self._view(c, d, n) for c, d in self.columns}
+            n = min(len(v) for v in cols.values())
+            lo = 0 if limit is None else max(0, n - limit)
+            return {c: v[lo:n] for c, v in cols.items()}
+
+    def last_ts(self) -> Optional[int]:
+        n = len(self)
+        return int(self.read(1)["ts"][0]) if n else None
+
+    # ---------- writing ----------
+    def append(self, rows: Sequence[Sequence[float]]) -> int:
+        """
+        Commit ccxt-style rows `[ms, o, h, l, c, v]` (ascending). Bars at or after the
+        first new timestamp are replaced, so re-sending the open bar updates it.
+        Returns the committed row count.
+        """
+        if len(rows) == 0:
+            return len(self)
+        arr = np.asarray(rows, dtype="<f8").reshape(-1, len(self.columns))
+        with open(os.path.join(self.path, "LOCK"), "a+b") as lk:
+            if fcntl:
+                fcntl.flock(lk, fcntl.LOCK_EX)
+            n, gen = self._head()
+            cut = n
+            if n:
+                cur = self.read()
+                cut = int(np.searchsorted(cur["ts"], int(arr[0, 0]), side="left"))
+                keep = int(np.searchsorted(cur["ts"], int(arr[-1, 0]), side="right"))
+                if keep < n:  # backfill of older bars: carry the newer tail along
+                    tail = np.column_stack([cur[c].astype("<f8") for c, _ in self.columns])[keep:]
+                    arr = np.vstack([arr, tail])
+            if cut < n:   # committed rows change: new files, renamed over the old ones
+                gen += 1
+                for j, (c, d) in enumerate(self.columns):
+                    fn = os.path.join(self.path, f"{c}.{d[1:]}")
+                    tmp = f"{fn}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(cur[c][:cut].tobytes())
+                        f.write(arr[:, j].astype(d).tobytes())
+                    os.replace(tmp, fn)
+            else:         # pure append past the committed count: readers never look there
+                for j, (c, d) in enumerate(self.columns):
+                    col = arr[:, j].astype(d).tobytes()
+                    fd = os.open(os.path.join(self.path, f"{c}.{d[1:]}"), os.O_WRONLY | os.O_CREAT, 0o644)
+                    try:
+                        os.pwrite(fd, col, cut*8)
+                    finally:
+                        os.close(fd)
+            total = cut + len(arr)
+            tmp = os.path.join(self.path, f"HEAD.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(_HEAD.pack(total, gen))
+            os.replace(tmp, os.path.join(self.path, "HEAD"))
+            return total
+
+    def close(self) -> None:
+        with self._lock:
+            for mm in self._maps.values():
+                try:
+                    mm.close()
+                except BufferError:  # still viewed by a live array
+                    pass
+            self._maps.clear()
+
+def bars_path(source: str, symbol: str, timeframe: str, root: Optional[str] = None) -> str:
+    """Series directory under `root`; ValueError for names that would resolve outside it."""
+    parts = (source, *symbol.upper().split("/"), timeframe)
+    base = os.path.realpath(root or BARS_DIR)
+    path = os.path.realpath(os.path.join(base, *parts))
+    if any(p in ("", ".", "..") or os.sep in p for p in parts) or os.path.commonpath((base, path)) != base:
+        raise ValueError(f"bar path outside the store: {source}/{symbol}/{timeframe}")
+    return path
+
+def open_bars(source: str, symbol: str, timeframe: str, root: Optional[str] = None) -> BarFile:
+    return BarFile(bars_path(source, symbol, timeframe, root))
+
+# ---------- resampling ----------
+def resample(b: Dict[str, np.ndarray], step_ms: int) -> np.ndarray:
+    """
+    OHLCV columns aggregated into `step_ms` buckets aligned to the epoch (so 4h buckets
+    start at 00/04/08.. UTC, like exchange candles). Returns ccxt-style rows; the last
+    bucket is partial while its period is still open.
+    """
+    ts = b["ts"]
+    if not len(ts):
+        return np.empty((0, len(COLUMNS)))
+    bucket = ts - ts % step_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return np.column_stack([bucket[starts].astype("<f8"), b["open"][starts],
+                            np.maximum.reduceat(b["high"], starts), np.minimum.reduceat(b["low"], starts),
+                            b["close"][ends], np.add.reduceat(b["volume"], starts)])
+
+def resample_into(src: BarFile, dst: BarFile, step_ms: int) -> int:
+    """
+    Bring the coarser `dst` up to date from `src`. Only source bars from dst's last bucket
+    (the partial one) onward are re-aggregated; dst is rebuilt only when src gained older
+    history. A leading bucket that src covers only partly is left out.
+    """
+    b = src.read()
+    ts = b["ts"]
+    if not len(ts):
+        return len(dst)
+    first = int(ts[0])
+    have = dst.read()["ts"]
+    if len(have) and first <= int(have[0]):
+        lo = int(np.searchsorted(ts, int(have[-1]), side="left"))
+    else:
+        lo = int(np.searchsorted(ts, first if first % step_ms == 0 else first - first % step_ms + step_ms))
+    if lo >= len(ts):
+        return len(dst)
+    return dst.append(resample({c: v[lo:] for c, v in b.items()}, step_ms))
@@ -0,0 +1,82 @@
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+class ResultCache:
+    """
+    LRU + max-age cache with single-flight: concurrent misses on the same key run `fn`
+    once and every caller gets that result (or its exception).
+    """
+    def __init__(self, max_entries: int = 4096, max_age_s: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_age_s = max_age_s
+        self._d: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._lookup(key, default)
+
+    def _lookup(self, key: Hashable, default: Any) -> Any:
+        ent = self._d.get(key)
+        if ent is None:
+            return default
+        if time.monotonic() - ent[0] > self.max_age_s:
+            del self._d[key]
+            self.stats["expired"] += 1
+            return default
+        self._d.move_to_end(key)
+        return ent[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._d[key] = (time.monotonic(), value)
+            self._d.move_to_end(key)
+            while len(self._d) > self.max_entries:
+                self._d.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        miss = object()
+        with self._lock:
+            val = self._lookup(key, miss)
+            if val is not miss:
+                self.stats["hits"] += 1
+                return val
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return fut.result()
+        try:
+            val = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            self.put(key, val)
+            fut.set_result(val)
+            return val
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._d.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.stats)
+            s["size"] = len(self._d)
+        looked = s["hits"] + s["misses"] + s["coalesced"]
+        s["hit_ratio"] = (s["hits"] + s["coalesced"]) / looked if looked else 0.0
+        return s
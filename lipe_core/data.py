@@ -1,37 +1,412 @@
 from __future__ import annotations
-import math, time
-from datetime import datetime, timezone, timedelta
-from typing import List, Tuple
+import asyncio, time, threading, zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 import os
+import numpy as np
+from lipe_core.bars import BarFile, open_bars, resample_into
+from lipe_core import features
+from lipe_core.ratelimit import GATE
 
-try:
-    import ccxt  # type: ignore
-except Exception:
-    ccxt = None
+# ccxt is imported on first exchange use (see _ccxt): it is the slowest import of a worker and
+# offline / fully cached workers never need it. None = unavailable (tests set it to force synthetic).
+_LAZY: Any = object()
+ccxt: Any = _LAZY
+ccxt_async: Any = _LAZY
+
+DAY_MS = 24*3600*1000
+HOUR_MS = 3600*1000
+TIMEFRAMES: Dict[str, int] = {"1h": HOUR_MS, "4h": 4*HOUR_MS, "1d": DAY_MS}
+# timeframes built by resampling a finer stored series instead of their own exchange traffic.
+# 1d stays native: a multi-year daily backtest would otherwise need 24x the bars / exchange pages.
+DERIVED: Dict[str, str] = {"4h": "1h"}
+SERIES_MAX_SYMBOLS = int(os.getenv("LIPE_SERIES_MAX_SYMBOLS", "256"))
+SERIES_REFRESH_S = float(os.getenv("LIPE_SERIES_REFRESH_S", "60"))
+EXCHANGE_TIMEOUT_S = float(os.getenv("LIPE_EXCHANGE_TIMEOUT_S", "10"))      # per exchange call
+EXCHANGE_CONCURRENCY = int(os.getenv("LIPE_EXCHANGE_CONCURRENCY", "8"))    # in-flight calls per exchange (async)
+EXCHANGE_PAGE = int(os.getenv("LIPE_EXCHANGE_PAGE", "1000"))               # bars asked per fetch_ohlcv call
 
 def _now():
     return datetime.now(timezone.utc)
 
-def fetch_ohlcv_daily(symbol: str, limit: int = 365) -> List[Tuple[int,float]]:
+# ---------- exchange clients ----------
+_EXCHANGES: Dict[str, Any] = {}
+_EX_LOCK = threading.Lock()
+
+def _ccxt(asynchronous: bool = False) -> Any:
+    """The ccxt (or ccxt.async_support) module, imported on first call; None when not installed."""
+    global ccxt, ccxt_async
+    if asynchronous:
+        if ccxt_async is _LAZY:
+            try:
+                import ccxt.async_support as mod  # type: ignore
+            except Exception:
+                mod = None
+            ccxt_async = mod
+        return ccxt_async
+    if ccxt is _LAZY:
+        try:
+            import ccxt as mod  # type: ignore
+        except Exception:
+            mod = None
+        ccxt = mod
+    return ccxt
+
+def _online(name: str, asynchronous: bool = False) -> bool:
+    # "fake" is the in-process exchange from lipe_core.fake_exchange; it needs no ccxt
+    return name == "fake" or _ccxt(asynchronous) is not None
+
+def _new_client(name: str, asynchronous: bool = False):
+    opts = {"enableRateLimit": True, "timeout": int(EXCHANGE_TIMEOUT_S*1000)}
+    if name == "fake":
+        from lipe_core.fake_exchange import FakeExchange, AsyncFakeExchange
+        return (AsyncFakeExchange if asynchronous else FakeExchange)(opts)
+    return getattr(_ccxt(asynchronous), name)(opts)
+
+def _exchange(name: str):
+    """One ccxt client per exchange name, reused across calls (keeps markets + HTTP session)."""
+    ex = _EXCHANGES.get(name)
+    if ex is None:
+        with _EX_LOCK:
+            ex = _EXCHANGES.get(name)
+            if ex is None:
+                ex = _new_client(name)
+                _EXCHANGES[name] = ex
+    return ex
+
+def forget_exchanges() -> None:
+    """Drop the sync clients in a forked child: their HTTP sessions belong to the parent."""
+    with _EX_LOCK:
+        _EXCHANGES.clear()
+
+@dataclass
+class _AsyncClient:
+    loop: asyncio.AbstractEventLoop
+    ex: Any
+    sem: asyncio.Semaphore
+
+_AEXCHANGES: Dict[str, _AsyncClient] = {}
+
+def _aexchange(name: str) -> _AsyncClient:
     """
-    Returns list of (ms, close). Tries ccxt (Binance). Falls back to synthetic.
+    One ccxt.async_support client (one aiohttp connection pool) per exchange and event loop.
+    A client is bound to the loop it was first used on, so a new loop gets a new client.
     """
-    # Try ccxt
-    ex_name = os.getenv("CCXT_EXCHANGE", "binance")
-    if ccxt:
+    loop = asyncio.get_running_loop()
+    c = _AEXCHANGES.get(name)
+    if c is None or c.loop is not loop:
+        c = _AEXCHANGES[name] = _AsyncClient(loop, _new_client(name, asynchronous=True),
+                                             asyncio.Semaphore(EXCHANGE_CONCURRENCY))
+    return c
+
+async def afetch_ohlcv(ex_name: str, symbol: str, timeframe: str = "1d", since: Optional[int] = None,
+                       limit: Optional[int] = None, timeout_s: float = EXCHANGE_TIMEOUT_S) -> List[List[float]]:
+    """fetch_ohlcv on the pooled async client: at most EXCHANGE_CONCURRENCY in flight, hard `timeout_s` each."""
+    c = _aexchange(ex_name)
+    async with c.sem:
+        return await asyncio.wait_for(c.ex.fetch_ohlcv(_market(symbol), timeframe=timeframe, since=since, limit=limit),
+                                      timeout_s)
+
+async def aclose_exchanges() -> None:
+    """Close the async clients owned by the running loop (call on shutdown)."""
+    loop = asyncio.get_running_loop()
+    for name, c in list(_AEXCHANGES.items()):
+        if c.loop is loop:
+            del _AEXCHANGES[name]
+            await c.ex.close()
+
+def _market(symbol: str) -> str:
+    return symbol.replace("USDT","/USDT")
+
+# ---------- pagination ----------
+# Exchanges cap one fetch_ohlcv at ~500-1000 bars (some lower), so history is read in pages:
+# from `since` (cold: the first bar of the requested window) forward until the current bar,
+# an empty page, or a page that does not move forward.
+def _window_start(timeframe: str, limit: int) -> int:
+    step = TIMEFRAMES[timeframe]
+    return _bar_start(step) - (limit - 1)*step
+
+def _next_since(rows: List[List[float]], page: List[List[float]], timeframe: str) -> Optional[int]:
+    """Append `page` to `rows`; the next page's `since`, or None when done."""
+    if not page or (rows and page[-1][0] <= rows[-1][0]):
+        return None
+    lo = rows[-1][0] if rows else None
+    rows.extend(r for r in page if lo is None or r[0] > lo)
+    step = TIMEFRAMES[timeframe]
+    last = int(page[-1][0])
+    return None if last >= _bar_start(step) else last + step
+
+def _fetch_pages(ex_name: str, symbol: str, timeframe: str, kw: Dict[str, int]) -> List[List[float]]:
+    rows: List[List[float]] = []
+    since: Optional[int] = kw["since"]
+    while since is not None:
+        GATE.throttle(ex_name)
+        page = _exchange(ex_name).fetch_ohlcv(_market(symbol), timeframe=timeframe, since=since, limit=EXCHANGE_PAGE)
+        since = _next_since(rows, page, timeframe)
+    return rows
+
+async def _afetch_pages(ex_name: str, symbol: str, timeframe: str, kw: Dict[str, int]) -> List[List[float]]:
+    rows: List[List[float]] = []
+    since: Optional[int] = kw["since"]
+    while since is not None:
+        await GATE.athrottle(ex_name)
+        page = await afetch_ohlcv(ex_name, symbol, timeframe, since=since, limit=EXCHANGE_PAGE)
+        since = _next_since(rows, page, timeframe)
+    return rows
+
+# ---------- series store ----------
+@dataclass
+class _Series:
+    bars: BarFile             # on-disk columns shared by every worker (see lipe_core.bars)
+    depth: int = 0            # largest `limit` the exchange has no more bars for (young listings)
+    checked_at: float = 0.0   # monotonic time of this process' last exchange round trip
+    lock: threading.Lock = field(default_factory=threading.Lock)   # bar/feature writes; never held across I/O
+    alock: asyncio.Lock = field(default_factory=asyncio.Lock)   # serializes async refreshes
+
+class SeriesStore:
+    """
+    Per-symbol OHLCV history, LRU-bounded on open handles.
+    Bars live in mmap'd BarFiles, so a restarted or sibling worker starts warm.
+    A cold symbol is downloaded once; afterwards only bars from the last stored
+    timestamp onward are fetched (the last daily bar is still open, so it is re-read).
+    Within `refresh_s` of the last round trip the stored bars are served as-is; a round trip
+    by any worker counts (it touches CHECKED in the series directory).
+    Round trips go through lipe_core.ratelimit.GATE: one worker per series at a time, within
+    the host-wide request rate; a worker that waited on a sibling's fetch serves what it stored.
+    """
+    def __init__(self, max_symbols: int = SERIES_MAX_SYMBOLS, refresh_s: float = SERIES_REFRESH_S):
+        self.max_symbols = max_symbols
+        self.refresh_s = refresh_s
+        self._series: "OrderedDict[Tuple[str,str,str], _Series]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "evictions": 0, "errors": 0,
+                      "coalesced": 0, "fallbacks": 0}
+
+    def _slot(self, key: Tuple[str,str,str]) -> _Series:
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = _Series(bars=open_bars(*key))
+                while len(self._series) > self.max_symbols:
+                    _, old = self._series.popitem(last=False)
+                    old.bars.close()
+                    self.stats["evictions"] += 1
+            else:
+                self._series.move_to_end(key)
+            return s
+
+    def _fresh(self, s: _Series) -> bool:
+        if time.monotonic() - s.checked_at < self.refresh_s:
+            return True
+        try:
+            return time.time() - os.path.getmtime(os.path.join(s.bars.path, "CHECKED")) < self.refresh_s
+        except OSError:
+            return False
+
+    def _checked(self, s: _Series) -> int:
         try:
-            ex = getattr(ccxt, ex_name)()
-            mkt = symbol.replace("USDT","/USDT")
-            rows = ex.fetch_ohlcv(mkt, timeframe="1d", limit=limit)
-            return [(r[0], float(r[4])) for r in rows]  # (time, close)
+            return os.stat(os.path.join(s.bars.path, "CHECKED")).st_mtime_ns
+        except OSError:
+            return 0
+
+    def _published(self, s: _Series, checked: int, limit: int) -> bool:
+        """True when a sibling completed a round trip for this series since CHECKED read `checked`."""
+        if self._checked(s) == checked or len(s.bars) < limit:
+            return False
+        s.checked_at = time.monotonic()
+        self.stats["coalesced"] += 1
+        return True
+
+    def _due(self, s: _Series, limit: int, fresh: bool = False) -> Optional[Dict[str, int]]:
+        """
+        What to fetch when the exchange has to be asked ({"since": last stored bar} or, cold,
+        {"limit": bars}); None when the stored bars can be served. `fresh` always asks (a bar just closed).
+        """
+        warm = len(s.bars) >= limit or s.depth >= limit
+        if warm and not fresh and self._fresh(s):
+            self.stats["hits"] += 1
+            return None
+        return {"since": s.bars.last_ts()} if warm else {"limit": limit}
+
+    def _store(self, s: _Series, new: List[List[float]], kw: Dict[str, int], limit: int) -> Dict[str, np.ndarray]:
+        with s.lock:
+            if "limit" in kw:
+                # the exchange's history starts inside the window: it has no more bars to give
+                short = not new or int(new[0][0]) > kw["since"]
+                self.stats["misses"] += 1
+            else:
+                self.stats["refreshes"] += 1
+            n = s.bars.append(new)
+            if "limit" in kw:
+                s.depth = limit if short else min(limit, n)
+            s.checked_at = time.monotonic()
+            with open(os.path.join(s.bars.path, "CHECKED"), "a"):
+                os.utime(os.path.join(s.bars.path, "CHECKED"))
+            return features.read(s.bars, limit)
+
+    def _derive(self, ex_name: str, symbol: str, timeframe: str, limit: int) -> Dict[str, np.ndarray]:
+        src = self._slot((ex_name, symbol.upper(), DERIVED[timeframe]))
+        dst = self._slot((ex_name, symbol.upper(), timeframe))
+        with src.lock, dst.lock:   # always base before derived
+            if dst.checked_at != src.checked_at or not len(dst.bars):
+                resample_into(src.bars, dst.bars, TIMEFRAMES[timeframe])
+                dst.checked_at = src.checked_at
+            return features.read(dst.bars, limit)
+
+    def get(self, ex_name: str, symbol: str, timeframe: str, limit: int, fresh: bool = False) -> Dict[str, np.ndarray]:
+        if timeframe in DERIVED:
+            self.get(ex_name, symbol, DERIVED[timeframe], _base_limit(timeframe, limit), fresh)
+            return self._derive(ex_name, symbol, timeframe, limit)
+        s = self._slot((ex_name, symbol.upper(), timeframe))
+        kw = self._due(s, limit, fresh)
+        if kw is None:
+            return features.read(s.bars, limit)
+        checked = self._checked(s)
+        try:
+            # the flock serializes threads of this process too (one open file description each)
+            with GATE.fetching(s.bars.path):
+                if self._published(s, checked, limit):
+                    return features.read(s.bars, limit)
+                if "since" in kw:   # the bars may have grown while we waited
+                    kw = {"since": s.bars.last_ts()}
+                else:
+                    kw = {"limit": limit, "since": _window_start(timeframe, limit)}
+                new = _fetch_pages(ex_name, symbol, timeframe, kw)
+                return self._store(s, new, kw, limit)
         except Exception:
-            pass
+            self.stats["errors"] += 1
+            raise
+
+    async def aget(self, ex_name: str, symbol: str, timeframe: str, limit: int, fresh: bool = False) -> Dict[str, np.ndarray]:
+        """
+        get() for the event loop: the exchange round trip is awaited, never run on a worker thread;
+        storing (under the series' thread lock) is.
+        """
+        if timeframe in DERIVED:
+            await self.aget(ex_name, symbol, DERIVED[timeframe], _base_limit(timeframe, limit), fresh)
+            return await asyncio.to_thread(self._derive, ex_name, symbol, timeframe, limit)
+        s = self._slot((ex_name, symbol.upper(), timeframe))
+        async with s.alock:
+            kw = self._due(s, limit, fresh)
+            if kw is None:
+                return features.read(s.bars, limit)
+            checked = self._checked(s)
+            try:
+                async with GATE.afetching(s.bars.path):
+                    if self._published(s, checked, limit):
+                        return features.read(s.bars, limit)
+                    if "since" in kw:
+                        kw = {"since": s.bars.last_ts()}
+                    else:
+                        kw = {"limit": limit, "since": _window_start(timeframe, limit)}
+                    new = await _afetch_pages(ex_name, symbol, timeframe, kw)
+                    return await asyncio.to_thread(self._store, s, new, kw, limit)
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+
+    def clear(self) -> None:
+        with self._lock:
+            for s in self._series.values():
+                s.bars.close()
+            self._series.clear()
+
+def bars_per_day(timeframe: str) -> int:
+    return max(1, DAY_MS // TIMEFRAMES[timeframe])
+
+def _base_limit(timeframe: str, limit: int) -> int:
+    # one spare bucket: the oldest one may be only partly covered and is dropped
+    return (limit + 1) * (TIMEFRAMES[timeframe] // TIMEFRAMES[DERIVED[timeframe]])
+
+SERIES = SeriesStore()
+
+def series_stats() -> Dict[str, Any]:
+    return {**SERIES.stats, "symbols": len(SERIES._series)}
 
-    # Synthetic fallback
-    out = []
+# ---------- synthetic fallback ----------
+def _bar_start(step_ms: int) -> int:
+    return (int(_now().timestamp()*1000) // step_ms) * step_ms
+
+def _today_ms() -> int:
+    return _bar_start(DAY_MS)
+
+def _synthetic_rows(symbol: str, limit: int, end_ms: Optional[int] = None, step_ms: int = DAY_MS) -> np.ndarray:
+    """
+    Deterministic OHLCV ending at the current (open) bar. A bar's values depend only on its
+    time and the symbol (per-symbol phase), so any length / number of symbols / timeframe can be generated.
+    """
+    end = _bar_start(step_ms) if end_ms is None else end_ms
+    ts = end - step_ms*np.arange(limit-1, -1, -1, dtype=np.int64)
     base = 30000.0 if symbol.upper().startswith("BTC") else 2000.0
-    for i in range(limit):
-        t = _now() - timedelta(days=limit-i)
-        close = base * (1 + 0.12*math.sin(i/14.0) + 0.05*math.sin(i/5.5))
-        out.append((int(t.timestamp()*1000), float(close)))
-    return out
+    k = ts / DAY_MS + zlib.crc32(symbol.upper().encode()) % 997
+    prev = k - step_ms / DAY_MS
+    close = base * (1 + 0.12*np.sin(k/14.0) + 0.05*np.sin(k/5.5))
+    opn = base * (1 + 0.12*np.sin(prev/14.0) + 0.05*np.sin(prev/5.5))
+    high = np.maximum(opn, close) * 1.002
+    low = np.minimum(opn, close) * 0.998
+    return np.column_stack([ts.astype(float), opn, high, low, close, np.full(limit, 1000.0)])
+
+def _synthetic_bars(symbol: str, limit: int, timeframe: str = "1d") -> Dict[str, np.ndarray]:
+    step = TIMEFRAMES[timeframe]
+    bars = open_bars("synthetic", symbol, timeframe)
+    end = _bar_start(step)
+    cur = bars.read(limit)
+    if (len(cur["ts"]) < limit or int(cur["ts"][-1]) != end or int(cur["ts"][0]) != end - (limit-1)*step
+            or float(cur["close"][-1]) != float(_synthetic_rows(symbol, 1, end, step)[0, 4])):
+        bars.append(_synthetic_rows(symbol, limit, end, step))
+    return features.read(bars, limit)
+
+def synthetic_universe(n_symbols: int, length: int, prefix: str = "SYN") -> List[str]:
+    """Materialize `n_symbols` distinct synthetic series of `length` daily bars (offline runs, benchmarks)."""
+    syms = [f"{prefix}{i:05d}USDT" for i in range(n_symbols)]
+    for s in syms:
+        _synthetic_bars(s, length)
+    return syms
+
+def fetch_bars(symbol: str, limit: int = 365, timeframe: str = "1d", fresh: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Last `limit` bars of `timeframe` as read-only columns {ts, open, high, low, close, volume}
+    plus the bar-aligned signal columns of lipe_core.features (entropy, edge, drawdown, ...).
+    Tries ccxt (Binance) through SERIES. Falls back to synthetic bars (stored in the same format)
+    when the exchange fails, times out or its rate-limit queue is too long (counted in series_stats).
+    `fresh` skips the LIPE_SERIES_REFRESH_S window and asks the exchange for new bars.
+    """
+    ex_name = os.getenv("CCXT_EXCHANGE", "binance")
+    if _online(ex_name):
+        try:
+            return SERIES.get(ex_name, symbol, timeframe, limit, fresh)
+        except Exception:
+            SERIES.stats["fallbacks"] += 1
+    return _synthetic_bars(symbol, limit, timeframe)
+
+def fetch_exchange_bars(symbol: str, limit: int = 365, timeframe: str = "1d", fresh: bool = False) -> Dict[str, np.ndarray]:
+    """fetch_bars without the synthetic fallback: raises when the exchange is unavailable or fails."""
+    ex_name = os.getenv("CCXT_EXCHANGE", "binance")
+    if not _online(ex_name):
+        raise RuntimeError(f"exchange {ex_name} unavailable (ccxt not installed)")
+    return SERIES.get(ex_name, symbol, timeframe, limit, fresh)
+
+async def afetch_bars(symbol: str, limit: int = 365, timeframe: str = "1d") -> Dict[str, np.ndarray]:
+    """fetch_bars over ccxt.async_support; a timeout or exchange error falls back to synthetic bars."""
+    ex_name = os.getenv("CCXT_EXCHANGE", "binance")
+    if _online(ex_name, asynchronous=True):
+        try:
+            return await SERIES.aget(ex_name, symbol, timeframe, limit)
+        except Exception:
+            SERIES.stats["fallbacks"] += 1
+    return _synthetic_bars(symbol, limit, timeframe)
+
+async def afetch_many(symbols: List[str], limit: int = 365, timeframe: str = "1d") -> Dict[str, Dict[str, np.ndarray]]:
+    """afetch_bars for every symbol concurrently (bounded per exchange by EXCHANGE_CONCURRENCY)."""
+    syms = list(dict.fromkeys(symbols))
+    got = await asyncio.gather(*(afetch_bars(sym, limit, timeframe) for sym in syms))
+    return dict(zip(syms, got))
+
+def fetch_ohlcv_daily(symbol: str, limit: int = 365) -> List[Tuple[int,float]]:
+    """
+    Returns list of (ms, close). Tries ccxt (Binance). Falls back to synthetic.
+    """
+    b = fetch_bars(symbol, limit, "1d")
+    return list(zip(b["ts"].tolist(), b["close"].tolist()))
@@ -0,0 +1,140 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence, Tuple
+import warnings
+import numpy as np
+
+# Array forms of the naive_ewma.v1 model in lipe_core.predict.
+# Every function accepts a single series (1-D) or a stack of series (2-D, one row per
+# symbol, left-padded with NaN when histories differ in length) and works on the last axis.
+
+SIGNAL_WINDOW = 90   # entropy / edge
+DRIFT_WINDOW = 60    # mu / vol when enough history, else DRIFT_SHORT
+DRIFT_SHORT = 20
+BAND_Z = 1.28        # ~80% band
+
+def returns(closes: np.ndarray) -> np.ndarray:
+    c = np.asarray(closes, dtype=float)
+    return c[..., 1:] / c[..., :-1] - 1.0
+
+def _tail_stats(rets: np.ndarray, w: int):
+    """Population mean/std of the last `w` (non-NaN) returns of each row."""
+    tail = rets[..., -w:]
+    with warnings.catch_warnings():  # all-NaN rows (no history) are handled by the callers
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(tail, axis=-1), np.nanstd(tail, axis=-1)
+
+def entropy(rets: np.ndarray) -> np.ndarray:
+    _, sd = _tail_stats(rets, SIGNAL_WINDOW)
+    sd = np.where(sd > 0, sd, 1e-9)
+    out = np.clip(sd / 0.05, 0.0, 1.0)
+    return np.where(_count(rets) > 0, out, 1.0)
+
+def edge(rets: np.ndarray) -> np.ndarray:
+    mu, sd = _tail_stats(rets, SIGNAL_WINDOW)
+    out = mu / np.where(sd > 0, sd, 1e-9)
+    return np.where(_count(rets) > 0, out, 0.0)
+
+def drift(rets: np.ndarray):
+    """(mu, vol) per row: last 60 returns when more than 60 exist, else last 20 (vol 0 → 0.02)."""
+    n = _count(rets)
+    mu_l, vol_l = _tail_stats(rets, DRIFT_WINDOW)
+    mu_s, vol_s = _tail_stats(rets, DRIFT_SHORT)
+    mu = np.where(n > DRIFT_WINDOW, mu_l, mu_s)
+    vol = np.where(n > DRIFT_WINDOW, vol_l, np.where(vol_s > 0, vol_s, 0.02))
+    return np.nan_to_num(mu), np.nan_to_num(vol, nan=0.02)
+
+def _count(rets: np.ndarray) -> np.ndarray:
+    return np.sum(~np.isnan(rets), axis=-1)
+
+@dataclass
+class Bands:
+    """Forecast band matrix: row i is pair i, column d-1 is step d (NaN past that pair's horizon)."""
+    yhat: np.ndarray
+    q10: np.ndarray
+    q90: np.ndarray
+    entropy: np.ndarray
+    edge: np.ndarray
+    q: Dict[int, np.ndarray] = field(default_factory=dict)   # extra percentiles requested, same layout
+
+def bands(last: np.ndarray, mu: np.ndarray, vol: np.ndarray, horizons: np.ndarray):
+    """(yhat, q10, q90) matrices for a Gaussian walk from `last` with per-row drift/vol."""
+    horizons = np.asarray(horizons, dtype=int)
+    steps = np.arange(1, int(horizons.max(initial=0)) + 1)
+    # same sequential product as `price *= (1 + mu)`, so results match the scalar loop bit for bit
+    walk = np.concatenate([last[:, None], np.repeat((1.0 + mu)[:, None], len(steps), axis=1)], axis=1)
+    yhat = np.cumprod(walk, axis=1)[:, 1:]
+    band = BAND_Z * vol[:, None] * np.sqrt(steps)[None, :]
+    live = steps[None, :] <= horizons[:, None]
+    yhat = np.where(live, yhat, np.nan)
+    return yhat, yhat * (1 - band), yhat * (1 + band)
+
+def stack(series: Sequence[np.ndarray]) -> np.ndarray:
+    """Right-align 1-D close arrays into a (n, T) matrix, NaN-padding shorter histories."""
+    width = max((len(s) for s in series), default=0)
+    out = np.full((len(series), width), np.nan)
+    for i, s in enumerate(series):
+        if len(s):
+            out[i, width - len(s):] = s
+    return out
+
+def score_batch(closes: np.ndarray, rows: np.ndarray, horizons: np.ndarray,
+                sig: Optional[Tuple[np.ndarray, np.ndarray]] = None, pcts: Sequence[int] = ()) -> Bands:
+    """
+    Score many (symbol, horizon) pairs in one pass.
+    `closes` is the stacked (symbols, T) close matrix; pair i uses row `rows[i]`
+    with horizon `horizons[i]`. Signals are computed once per symbol row, or taken
+    from `sig` = (entropy, edge) per row when they are already known (lipe_core.features).
+    `pcts` adds Gaussian percentiles of the same walk (q10/q90 keep the BAND_Z band).
+    """
+    closes = np.atleast_2d(np.asarray(closes, dtype=float))
+    rets = returns(closes)
+    if sig is None:
+        ent, edg = entropy(rets), edge(rets)
+    else:
+        ent, edg = (np.asarray(a, dtype=float).reshape(-1) for a in sig)
+    mu, vol = drift(rets)
+    rows = np.asarray(rows, dtype=int)
+    yhat, q10, q90 = bands(closes[rows, -1], mu[rows], vol[rows], horizons)
+    spread = vol[rows, None] * np.sqrt(np.arange(1, yhat.shape[1] + 1))[None, :]
+    q = {p: yhat * (1 + NormalDist().inv_cdf(p / 100) * spread) for p in pcts}
+    return Bands(yhat=yhat, q10=q10, q90=q90, entropy=ent[rows], edge=edg[rows], q=q)
+
+# ---------- per-bar (rolling) signals ----------
+def rolling_stats(rets: np.ndarray, w: int):
+    """
+    Trailing mean/population-std of up to `w` returns ending at each position (NaN-aware,
+    expanding until `w` are available). O(T) via cumulative sums; returns (mean, std, count).
+    """
+    x = np.asarray(rets, dtype=float)
+    ok = ~np.isnan(x)
+    x0 = np.where(ok, x, 0.0)
+    def trailing(a):
+        c = np.cumsum(a, axis=-1)
+        out = c.copy()
+        out[..., w:] -= c[..., :-w]
+        return out
+    n = trailing(ok.astype(float))
+    s1, s2 = trailing(x0), trailing(x0*x0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu = s1 / n
+        var = np.maximum(s2 / n - mu*mu, 0.0)
+    return mu, np.sqrt(var), n
+
+def signals(mu: np.ndarray, sd: np.ndarray, n: np.ndarray):
+    """(entropy, edge) from a window's mean / population std / count (same rules as entropy() / edge())."""
+    sd = np.where(sd > 0, sd, 1e-9)
+    return np.where(n > 0, np.clip(sd / 0.05, 0.0, 1.0), 1.0), np.where(n > 0, mu / sd, 0.0)
+
+def rolling_signals(closes: np.ndarray, w: int = SIGNAL_WINDOW):
+    """
+    Bar-aligned (same length as `closes`) entropy, edge and drawdown, each using only data up
+    to and including that bar. Drawdown is 1 - close / running peak close (0..1).
+    """
+    c = np.asarray(closes, dtype=float)
+    ent, edg = signals(*rolling_stats(returns(c), w))
+    pad = np.ones(c.shape[:-1] + (1,))
+    peak = np.fmax.accumulate(c, axis=-1)
+    dd = np.nan_to_num(1.0 - c / peak)
+    return (np.concatenate([pad, ent], axis=-1), np.concatenate([pad*0.0, edg], axis=-1), dd)
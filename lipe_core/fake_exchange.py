@@ -0,0 +1,53 @@
+from __future__ import annotations
+import asyncio, os, random, time
+from typing import Any, Dict, List, Optional
+
+FAKE_LATENCY_S = float(os.getenv("LIPE_FAKE_LATENCY_S", "0"))
+FAKE_FAIL_RATE = float(os.getenv("LIPE_FAKE_FAIL_RATE", "0"))
+FAKE_MAX_BARS = int(os.getenv("LIPE_FAKE_MAX_BARS", "1000"))   # per call, like a real exchange's cap
+
+class FakeExchange:
+    """
+    Local stand-in for a ccxt exchange (CCXT_EXCHANGE=fake): serves the deterministic synthetic
+    candles with configurable latency and failure rate, so the exchange code paths (pooling,
+    timeouts, incremental refresh, fallback) run offline and under load without hitting Binance.
+    """
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 latency_s: float = FAKE_LATENCY_S, fail_rate: float = FAKE_FAIL_RATE):
+        self.config = config or {}
+        self.latency_s = latency_s
+        self.fail_rate = fail_rate
+        self.calls = 0
+
+    def _rows(self, symbol: str, timeframe: str, since: Optional[int], limit: Optional[int]) -> List[List[float]]:
+        from lipe_core.data import TIMEFRAMES, _synthetic_rows, _bar_start
+        self.calls += 1
+        if timeframe not in TIMEFRAMES:
+            raise ValueError(f"fake exchange has no {timeframe} candles")
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise ConnectionError("fake exchange: injected failure")
+        step = TIMEFRAMES[timeframe]
+        n, end = min(limit or 500, FAKE_MAX_BARS), _bar_start(step)
+        if since is not None:   # the first n bars from `since`
+            since = -(-int(since) // step) * step
+            n = max(0, min(n, (end - since) // step + 1))
+            end = since + (n - 1)*step
+        rows = _synthetic_rows(symbol.replace("/", ""), n, end_ms=end, step_ms=step)
+        return [[int(r[0]), *r[1:]] for r in rows.tolist()]
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = "1d", since: Optional[int] = None,
+                    limit: Optional[int] = None, params: Optional[Dict[str, Any]] = None) -> List[List[float]]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self._rows(symbol, timeframe, since, limit)
+
+class AsyncFakeExchange(FakeExchange):
+    """ccxt.async_support flavour of FakeExchange."""
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = "1d", since: Optional[int] = None,
+                          limit: Optional[int] = None, params: Optional[Dict[str, Any]] = None) -> List[List[float]]:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return self._rows(symbol, timeframe, since, limit)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import os, threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+from lipe_core.bars import BarFile
+from lipe_core import engine
+
+# Materialized per-bar signals stored next to each BarFile (<bars>/features_w90/), so forecasts
+# and backtests read entropy / edge / drawdown instead of recomputing rolling windows per request.
+# Row i describes the returns window ending at bar i, exactly as engine.rolling_signals would.
+
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("ts", "<i8"), ("close", "<f8"),                   # the bar the row was computed from
+    ("mean", "<f8"), ("var", "<f8"), ("n", "<f8"),     # trailing returns window (population variance)
+    ("peak", "<f8"), ("entropy", "<f8"), ("edge", "<f8"), ("drawdown", "<f8"),
+)
+FEATURES = ("mean", "var", "peak", "entropy", "edge", "drawdown")
+STREAM_MAX = int(os.getenv("LIPE_FEATURES_STREAM_MAX", "256"))   # stale rows updated one by one; more → vectorized rebuild
+MAX_OPEN = int(os.getenv("LIPE_FEATURES_MAX_OPEN", "256"))
+
+def frame(closes: np.ndarray, w: int = engine.SIGNAL_WINDOW) -> Dict[str, np.ndarray]:
+    """Every feature column for a whole close series (vectorized; also the cold-build path)."""
+    c = np.asarray(closes, dtype=float)
+    mu, sd, n = engine.rolling_stats(engine.returns(c), w)
+    mean, var, n = (np.concatenate([[0.0], a]) for a in (mu, sd*sd, n))
+    peak = np.fmax.accumulate(c)
+    return _finish(c, mean, var, n, peak)
+
+def _finish(c, mean, var, n, peak) -> Dict[str, np.ndarray]:
+    ent, edg = engine.signals(mean, np.sqrt(var), n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dd = np.nan_to_num(1.0 - c / peak)
+    return {"mean": mean, "var": var, "n": n, "peak": peak, "entropy": ent, "edge": edg, "drawdown": dd}
+
+def _stream(c: np.ndarray, prev: Dict[str, float], start: int, w: int) -> Dict[str, np.ndarray]:
+    """
+    Rows start.. from the row before `start`, O(1) per bar: a sliding-window Welford update
+    (add the bar's return, drop the one leaving the window) plus the running peak.
+    """
+    n, mean, peak = int(prev["n"]), float(prev["mean"]), float(prev["peak"])
+    m2 = float(prev["var"]) * n
+    k = len(c) - start
+    out = np.empty((4, k))
+    for j, i in enumerate(range(start, len(c))):
+        r = c[i] / c[i-1] - 1.0
+        if n < w:
+            n += 1
+            d = r - mean
+            mean += d / n
+            m2 += d * (r - mean)
+        else:   # window full: r replaces the return of bar i-w
+            old = c[i-w] / c[i-w-1] - 1.0
+            mu0 = mean
+            mean += (r - old) / n
+            m2 += (r - old) * (r - mean + old - mu0)
+        m2 = max(m2, 0.0)
+        if c[i] > peak or peak != peak:   # fmax: NaN never wins over a number
+            peak = c[i]
+        out[:, j] = (mean, m2 / n, n, peak)
+    return _finish(c[start:], *out)
+
+class FeatureIndex:
+    """
+    The feature table of one bar series, kept in its own BarFile inside the series directory.
+    sync() brings it level with the bars: untouched rows are kept, the re-sent open bar and new
+    bars are streamed from the last good row; new older history (backfill) rebuilds it.
+    """
+    def __init__(self, bars_path: str, w: int = engine.SIGNAL_WINDOW):
+        self.w = w
+        self.file = BarFile(os.path.join(bars_path, f"features_w{w}"), COLUMNS)
+        self._lock = threading.Lock()
+
+    def _start(self, ts: np.ndarray, c: np.ndarray, f: Dict[str, np.ndarray]) -> int:
+        """First bar whose row is missing or stale."""
+        k = min(len(f["ts"]), len(ts))
+        if k == 0 or f["ts"][0] != ts[0] or f["ts"][k-1] != ts[k-1]:
+            return 0
+        return k if f["close"][k-1] == c[k-1] else k - 1
+
+    def sync(self, bars: BarFile) -> int:
+        """Update from `bars`; returns the number of rows written."""
+        with self._lock:
+            b = bars.read()
+            ts, c = b["ts"], b["close"]
+            f = self.file.read()
+            start = self._start(ts, c, f)
+            if start >= len(ts):
+                return 0
+            if start == 0 or len(ts) - start > STREAM_MAX:
+                start, cols = 0, frame(c, self.w)
+            else:
+                cols = _stream(c, {k: f[k][start-1] for k in ("mean", "var", "n", "peak")}, start, self.w)
+            self.file.append(np.column_stack([ts[start:].astype("<f8"), c[start:], *(cols[k] for k, _ in COLUMNS[2:])]))
+            return len(ts) - start
+
+    def aligned(self, b: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Feature columns row-aligned with the bar columns `b` (a contiguous slice of the series)."""
+        ts = b["ts"]
+        if not len(ts):
+            return {k: np.empty(0) for k in FEATURES}
+        f = self.file.read()
+        hi = int(np.searchsorted(f["ts"], ts[-1])) + 1
+        lo = hi - len(ts)
+        if lo < 0 or hi > len(f["ts"]) or f["ts"][lo] != ts[0] or f["ts"][hi-1] != ts[-1] \
+                or f["close"][hi-1] != b["close"][-1]:
+            # bars moved on between sync and read (another worker): compute this slice directly
+            cols = frame(b["close"], self.w)
+            return {k: cols[k] for k in FEATURES}
+        return {k: f[k][lo:hi] for k in FEATURES}
+
+    def close(self) -> None:
+        self.file.close()
+
+_INDEXES: "OrderedDict[str, FeatureIndex]" = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+def index_for(bars: BarFile) -> FeatureIndex:
+    """The (LRU-cached) FeatureIndex stored with `bars`."""
+    with _INDEXES_LOCK:
+        ix = _INDEXES.get(bars.path)
+        if ix is None:
+            ix = _INDEXES[bars.path] = FeatureIndex(bars.path)
+            while len(_INDEXES) > MAX_OPEN:
+                _INDEXES.popitem(last=False)[1].close()
+        else:
+            _INDEXES.move_to_end(bars.path)
+        return ix
+
+def read(bars: BarFile, limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """bars.read(limit) plus the FEATURES columns for the same bars, the index synced first."""
+    ix = index_for(bars)
+    ix.sync(bars)
+    b = bars.read(limit)
+    return {**b, **ix.aligned(b)}
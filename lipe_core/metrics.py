@@ -0,0 +1,296 @@
+from __future__ import annotations
+import glob, json, math, os, tempfile, threading, time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+METRICS_DIR = os.getenv("LIPE_METRICS_DIR", os.path.join(tempfile.gettempdir(), "lipe_metrics"))
+FLUSH_S = float(os.getenv("LIPE_METRICS_FLUSH_S", "5"))
+WINDOW_S = float(os.getenv("LIPE_METRICS_WINDOW_S", "3600"))   # slo.json quantiles; dead workers' files age out after it
+UPTIME_WINDOW_MIN = 30*24*60
+_SLOTS = 12                      # the window slides in WINDOW_S/_SLOTS steps
+_SLOT_S = WINDOW_S / _SLOTS
+
+# Log-linear buckets (HDR style): 8 sub-buckets per power of two from 10µs to ~3 min,
+# so any quantile is within ~9% and histograms from different workers merge by addition.
+_MIN_S = 1e-5
+_SUB = 8
+_NB = _SUB*24 + 2
+BOUNDS = [_MIN_S * 2**(i/_SUB) for i in range(_NB - 1)]   # upper bound of bucket i; last bucket is +Inf
+
+def _bucket(v: float) -> int:
+    if v <= _MIN_S:
+        return 0
+    return min(_NB - 1, int(math.ceil(math.log2(v/_MIN_S)*_SUB)))
+
+class Histogram:
+    __slots__ = ("counts", "sum", "n")
+
+    def __init__(self):
+        self.counts = [0]*_NB
+        self.sum = 0.0
+        self.n = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[_bucket(v)] += 1
+        self.sum += v
+        self.n += 1
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.n += other.n
+
+    def quantile(self, q: float) -> float:
+        if not self.n:
+            return 0.0
+        rank, seen = q*self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return BOUNDS[min(i, len(BOUNDS) - 1)]
+        return BOUNDS[-1]
+
+    def dump(self) -> Dict[str, Any]:
+        return {"c": {i: c for i, c in enumerate(self.counts) if c}, "s": self.sum, "n": self.n}
+
+    @classmethod
+    def load(cls, d: Dict[str, Any]) -> "Histogram":
+        h = cls()
+        for i, c in d["c"].items():
+            h.counts[int(i)] = c
+        h.sum, h.n = d["s"], d["n"]
+        return h
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]   # (metric name, sorted labels)
+
+class Registry:
+    """
+    Per-process histograms, flushed every FLUSH_S to METRICS_DIR/w<pid>.json (atomic replace).
+    Readers merge every worker's file, so /metrics and slo.json cover the whole gunicorn fleet.
+    Each series is kept twice: cumulative (Prometheus counters) and in _SLOTS time slots covering
+    the last WINDOW_S (slo.json quantiles). Files not rewritten within WINDOW_S (dead workers) are
+    deleted. The flush also stamps the current minute into a shared ring used for uptime.
+    """
+    def __init__(self, root: str = METRICS_DIR):
+        self.root = root
+        self._h: Dict[Key, Histogram] = {}
+        self._w: Dict[Key, Dict[int, Histogram]] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._pid = 0
+        self.autostart = True   # False in a preforking master: observe() must not start the flusher thread
+        self.gauges: List[Callable[[], Dict[str, float]]] = []
+
+    def observe(self, name: str, v: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        slot = int(time.time() // _SLOT_S)
+        with self._lock:
+            h = self._h.get(key)
+            if h is None:
+                h = self._h[key] = Histogram()
+            h.observe(v)
+            ring = self._w.setdefault(key, {})
+            h = ring.get(slot)
+            if h is None:
+                h = ring[slot] = Histogram()
+            h.observe(v)
+        if self._pid != os.getpid() and self.autostart:
+            self.start()
+
+    def reset(self) -> None:
+        """Drop every sample of this process (a forked worker discarding the master's)."""
+        with self._lock:
+            self._h.clear()
+            self._w.clear()
+
+    def start(self) -> None:
+        """Begin flushing/heartbeating from this process (idempotent, fork-aware)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid:       # forked child: the parent's samples are not ours to report
+                self._h.clear()
+                self._w.clear()
+            self._pid = os.getpid()
+            os.makedirs(self.root, exist_ok=True)
+            self._flusher = threading.Thread(target=self._loop, name="lipe-metrics", daemon=True)
+            self._flusher.start()
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(FLUSH_S)
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def flush(self) -> None:
+        if not self._pid:
+            return
+        oldest = int(time.time() // _SLOT_S) - _SLOTS + 1
+        with self._lock:
+            for ring in self._w.values():
+                for slot in [t for t in ring if t < oldest]:
+                    del ring[slot]
+            body = [{"name": k[0], "labels": dict(k[1]), **h.dump(),
+                     "w": {t: w.dump() for t, w in self._w.get(k, {}).items()}} for k, h in self._h.items()]
+        path = os.path.join(self.root, f"w{self._pid}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"pid": self._pid, "at": time.time(), "series": body}, f)
+        os.replace(path + ".tmp", path)
+        self._beat()
+
+    def _beat(self) -> None:
+        m = int(time.time() // 60)
+        fd = os.open(os.path.join(self.root, "uptime.i8"), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, np.int64(m).tobytes(), (m % UPTIME_WINDOW_MIN)*8)
+        finally:
+            os.close(fd)
+
+    def merged(self, window: bool = False) -> Dict[Key, Histogram]:
+        """Every worker's histograms added up: cumulative, or (window=True) over the last WINDOW_S only."""
+        self.flush()
+        out: Dict[Key, Histogram] = {}
+        stale = time.time() - WINDOW_S
+        oldest = int(time.time() // _SLOT_S) - _SLOTS + 1
+        for path in glob.glob(os.path.join(self.root, "w*.json")):
+            try:
+                if os.path.getmtime(path) < stale:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for s in snap["series"]:
+                key = (s["name"], tuple(sorted(s["labels"].items())))
+                if window:
+                    h = Histogram()
+                    for t, w in s.get("w", {}).items():
+                        if int(t) >= oldest:
+                            h.merge(Histogram.load(w))
+                    if not h.n:
+                        continue
+                else:
+                    h = Histogram.load(s)
+                if key in out:
+                    out[key].merge(h)
+                else:
+                    out[key] = h
+        return out
+
+    def uptime(self) -> float:
+        """Fraction of minutes in the last 30 days (or since first start) with a live worker."""
+        try:
+            ring = np.fromfile(os.path.join(self.root, "uptime.i8"), dtype=np.int64)
+        except OSError:
+            return 1.0
+        now = int(time.time() // 60)
+        live = ring[(ring > now - UPTIME_WINDOW_MIN) & (ring <= now)]
+        if not len(live):
+            return 1.0
+        return float(min(1.0, len(live) / (now - int(live.min()) + 1)))
+
+REGISTRY = Registry()
+
+def observe(name: str, v: float, **labels: str) -> None:
+    REGISTRY.observe(name, v, **labels)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into lipe_stage_seconds{stage=name}."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("lipe_stage_seconds", time.perf_counter() - t0, stage=name)
+
+# ---------- exports ----------
+def _fmt_labels(labels: Dict[str, str], **extra: str) -> str:
+    kv = {**labels, **extra}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in kv.items()) + "}" if kv else ""
+
+def prometheus() -> str:
+    """Prometheus text exposition; buckets are reported at powers of two to keep the page small."""
+    lines: List[str] = []
+    typed = set()
+    for (name, lbl), h in sorted(REGISTRY.merged().items()):
+        labels = dict(lbl)
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cum = 0
+        for i, c in enumerate(h.counts[:-1]):
+            cum += c
+            if i % _SUB == 0:
+                lines.append(f"{name}_bucket{_fmt_labels(labels, le=f'{BOUNDS[i]:.6g}')} {cum}")
+        lines.append(f"{name}_bucket{_fmt_labels(labels, le='+Inf')} {h.n}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {h.sum:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {h.n}")
+    for fn in REGISTRY.gauges:
+        for k, v in fn().items():
+            lines.append(f"# TYPE {k} gauge")
+            lines.append(f"{k} {float(v)}")
+    lines.append("# TYPE lipe_uptime_ratio gauge")
+    lines.append(f"lipe_uptime_ratio {REGISTRY.uptime():.6f}")
+    return "\n".join(lines) + "\n"
+
+def slo(skip_routes: Tuple[str, ...] = ("/metrics", "/healthz")) -> Dict[str, Any]:
+    """Latency quantiles, error rate and stage p95 over the last WINDOW_S; uptime over 30 days."""
+    merged = REGISTRY.merged(window=True)
+    req, err = Histogram(), 0
+    stages: Dict[str, float] = {}
+    for (name, lbl), h in merged.items():
+        labels = dict(lbl)
+        if name == "lipe_http_request_seconds" and labels.get("route") not in skip_routes:
+            req.merge(h)
+            if labels.get("status", "").startswith("5"):
+                err += h.n
+        elif name == "lipe_stage_seconds":
+            stages[labels["stage"]] = round(h.quantile(0.95)*1000, 2)
+    return {
+        "latency_p50_ms": round(req.quantile(0.50)*1000, 2),
+        "latency_p95_ms": round(req.quantile(0.95)*1000, 2),
+        "latency_p99_ms": round(req.quantile(0.99)*1000, 2),
+        "requests": req.n,
+        "window_s": WINDOW_S,
+        "error_rate": round(err / req.n, 6) if req.n else 0.0,
+        "uptime_30d": round(REGISTRY.uptime(), 6),
+        "stage_p95_ms": stages,
+    }
+
+class LatencyMiddleware:
+    """
+    ASGI middleware: time to response start per (method, route template, status class)
+    into lipe_http_request_seconds. Streaming endpoints therefore report time-to-first-byte.
+    An exception escaping the app before a response started counts as a 5xx.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        started = False
+
+        def record(status: int) -> None:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REGISTRY.observe("lipe_http_request_seconds", time.perf_counter() - t0,
+                             method=scope["method"], route=route, status=f"{status // 100}xx")
+
+        async def timed_send(msg):
+            nonlocal started
+            if msg["type"] == "http.response.start":
+                started = True
+                record(msg["status"])
+            await send(msg)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except Exception:
+            if not started:
+                record(500)
+            raise
@@ -1,13 +1,26 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
-from typing import List, Literal, Optional, Dict, Any
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+from typing import Annotated, List, Literal, Optional, Dict, Any
+
+Timeframe = Literal["1h", "4h", "1d"]
+ModelId = Literal["lipe.naive_ewma.v1", "lipe.mc_bootstrap.v1", "lipe.mc_garch.v1"]
+Pct = Annotated[int, Field(ge=1, le=99)]
+# exchange symbol, upper-cased: BTCUSDT or BTC/USDT (also names the bar store directory)
+Symbol = Annotated[str, BeforeValidator(lambda v: v.strip().upper() if isinstance(v, str) else v),
+                   Field(pattern=r"^[A-Z0-9]{2,20}(/[A-Z0-9]{2,10})?$")]
 
 class ForecastReq(BaseModel):
     arena: Literal["crypto"]
-    symbol: str = Field(..., description="BTCUSDT / ETHUSDT etc.")
-    horizon: int = Field(ge=1, le=30, default=5)
+    symbol: Symbol = Field(..., description="BTCUSDT / ETHUSDT etc.")
+    horizon: int = Field(ge=1, le=30, default=5, description="bars of `timeframe` ahead")
+    timeframe: Timeframe = "1d"
+    model: ModelId = "lipe.naive_ewma.v1"
+    quantiles: List[Pct] = Field(default=[], max_length=19, description="extra percentiles, e.g. [5, 50, 95] → q05, q50, q95")
+    paths: int = Field(ge=100, le=100_000, default=10_000, description="simulated paths (mc_* models)")
+    seed: Optional[int] = Field(default=None, description="mc_* models: RNG seed; default derives one from the data version")
 
 class FcPoint(BaseModel):
+    model_config = ConfigDict(extra="allow")   # q05, q95, ... when quantiles are requested
     ts: str
     yhat: float
     q10: float
@@ -19,16 +32,37 @@ class ForecastResp(BaseModel):
     forecast: Dict[str, List[FcPoint]]
     series_tail: List[Dict[str, Any]]
 
+class ForecastBatchReq(BaseModel):
+    arena: Literal["crypto"]
+    symbols: List[Symbol] = Field(..., min_length=1, max_length=200)
+    horizons: List[Annotated[int, Field(ge=1, le=30)]] = Field(default=[5], min_length=1, max_length=30)
+    timeframe: Timeframe = "1d"
+    model: ModelId = "lipe.naive_ewma.v1"
+    quantiles: List[Pct] = Field(default=[], max_length=19)
+    paths: int = Field(ge=100, le=100_000, default=10_000)
+    seed: Optional[int] = None
+
+class ForecastBatchItem(BaseModel):
+    symbol: str
+    forecasts: Dict[int, ForecastResp] = {}   # horizon -> forecast
+    error: Optional[str] = None
+
+class ForecastBatchResp(BaseModel):
+    arena: str
+    items: List[ForecastBatchItem]
+
 class Rule(BaseModel):
+    # evaluated per bar; drawdown = 1 - close / running peak close (0..1)
     field: Literal["edge","entropy","drawdown"]
     op: Literal[">=", "<="]
     value: float
 
 class StrategySpec(BaseModel):
     arena: Literal["crypto"]
-    symbol: str
+    symbol: Symbol
     horizon: int = 5
-    lookback_days: int = 180
+    lookback_days: int = Field(ge=1, le=3650, default=180)   # history span; bars = lookback_days * bars per day of `timeframe`
+    timeframe: Timeframe = "1d"
     enter: List[Rule] = []
     exit: List[Rule] = []
 
@@ -40,8 +74,62 @@ class StrategyResp(BaseModel):
     metrics: Dict[str, float]
     equity_curve: List[EqPoint]
 
+class PortfolioSpec(BaseModel):
+    arena: Literal["crypto"]
+    symbols: List[Symbol] = Field(min_length=1, max_length=1000)
+    lookback_days: int = Field(ge=1, le=3650, default=365)
+    timeframe: Timeframe = "1d"
+    enter: List[Rule] = []
+    exit: List[Rule] = []
+    weighting: Literal["equal","inverse_vol"] = "equal"          # across the assets held
+    rebalance: Literal["signal","bar","weekly","monthly"] = "signal"   # signal: only when the held set changes
+    fee_bps: float = Field(ge=0, le=1000, default=0.0)           # per unit of turnover
+
+class PortfolioAsset(BaseModel):
+    symbol: str
+    metrics: Dict[str, float]
+    equity_curve: List[EqPoint]
+
+class PortfolioResp(BaseModel):
+    metrics: Dict[str, float]
+    equity_curve: List[EqPoint]
+    assets: List[PortfolioAsset]
+
+class RuleRange(BaseModel):
+    side: Literal["enter","exit"]
+    index: int = Field(ge=0, description="position of the rule in base.enter / base.exit")
+    values: List[float] = []          # explicit thresholds, or lo/hi/steps below
+    lo: Optional[float] = None
+    hi: Optional[float] = None
+    steps: int = Field(ge=1, le=1000, default=10)
+
+class SweepReq(BaseModel):
+    base: StrategySpec
+    symbols: List[Symbol] = []        # default: [base.symbol]
+    lookbacks: List[Annotated[int, Field(ge=1, le=3650)]] = []   # default: [base.lookback_days]
+    ranges: List[RuleRange] = []
+    mode: Literal["grid","random"] = "grid"
+    samples: int = Field(ge=1, le=100_000, default=500)
+    seed: Optional[int] = None
+    rank_by: Literal["ROI","HitRate","MaxDD","Trades"] = "ROI"
+    top: int = Field(ge=1, le=1000, default=50)
+
+class SweepRow(BaseModel):
+    symbol: str
+    lookback_days: int
+    enter: List[Rule]
+    exit: List[Rule]
+    metrics: Dict[str, float]
+
+class SweepResp(BaseModel):
+    job_id: str
+    state: Literal["running","done","cancelled","error"]
+    done: int
+    total: int
+    rows: List[SweepRow]
+
 class ShareCreateReq(BaseModel):
     arena: str
-    symbol: str
+    symbol: Symbol
     horizon: int
     ttl_hours: int = 24
@@ -0,0 +1,176 @@
+"""
+Forecast precompute at bar close.
+
+One process per host (the holder of an flock on LIPE_PRECOMPUTE_LOCK) wakes when a bar of a
+watched timeframe closes and pulls the new bar for every watchlist symbol. The bars and feature
+index it refreshes are on disk and marked fresh. FORECAST_CACHE is per process, so every other
+worker wakes once the leader's pass should be done (LIPE_PRECOMPUTE_FOLLOW_S later) and scores
+horizons 1..30 into its own cache from those stored bars, without an exchange round trip.
+If the leader exits, the OS drops its lock and another worker takes over.
+
+    python -m lipe_core.precompute           # sidecar: run the scheduler in the foreground
+    python -m lipe_core.precompute --once    # one warm-up pass over the watchlist, then exit
+"""
+from __future__ import annotations
+import argparse, os, random, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from lipe_core.data import TIMEFRAMES, fetch_bars
+from lipe_core import predict
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # non-POSIX: every process considers itself leader
+    fcntl = None
+
+def _list(env: str, default: str) -> List[str]:
+    return [x.strip() for x in os.getenv(env, default).split(",") if x.strip()]
+
+def _horizons(spec: str) -> List[int]:
+    out = set()
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        out.update(range(int(lo), int(hi or lo) + 1))
+    return sorted(out)
+
+PRECOMPUTE = os.getenv("LIPE_PRECOMPUTE", "1") == "1"
+WATCHLIST = _list("LIPE_WATCHLIST", "BTCUSDT,ETHUSDT")
+TIMEFRAMES_WATCHED = _list("LIPE_PRECOMPUTE_TIMEFRAMES", "1d")
+HORIZONS = _horizons(os.getenv("LIPE_PRECOMPUTE_HORIZONS", "1-30"))
+CONCURRENCY = int(os.getenv("LIPE_PRECOMPUTE_CONCURRENCY", "4"))
+DELAY_S = float(os.getenv("LIPE_PRECOMPUTE_DELAY_S", "5"))      # after the close, give the exchange time to publish the bar
+JITTER_S = float(os.getenv("LIPE_PRECOMPUTE_JITTER_S", "20"))   # spread symbols over this window
+FOLLOW_S = float(os.getenv("LIPE_PRECOMPUTE_FOLLOW_S", "10"))  # followers start this long after the leader's jitter window
+LOCK_PATH = os.getenv("LIPE_PRECOMPUTE_LOCK", os.path.join(tempfile.gettempdir(), "lipe_precompute.lock"))
+LEADER_RETRY_S = 30.0
+
+def next_close(now: float, timeframes: Sequence[str]) -> Tuple[float, List[str]]:
+    """(epoch seconds of the next bar close, timeframes closing then)."""
+    closes = {tf: (int(now*1000) // TIMEFRAMES[tf] + 1) * TIMEFRAMES[tf] / 1000 for tf in timeframes}
+    t = min(closes.values())
+    return t, [tf for tf, c in closes.items() if c == t]
+
+class Scheduler:
+    def __init__(self, symbols: Sequence[str] = WATCHLIST, timeframes: Sequence[str] = TIMEFRAMES_WATCHED,
+                 horizons: Sequence[int] = HORIZONS, concurrency: int = CONCURRENCY, delay_s: float = DELAY_S,
+                 jitter_s: float = JITTER_S, lock_path: str = LOCK_PATH):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.timeframes = [tf for tf in timeframes if tf in TIMEFRAMES]
+        self.horizons = list(horizons)
+        self.concurrency = max(1, concurrency)
+        self.delay_s = delay_s
+        self.jitter_s = jitter_s
+        self.lock_path = lock_path
+        self._lockf = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {"leader": False, "runs": 0, "jobs": 0, "errors": 0,
+                                      "last_run_at": None, "last_run_s": None, "next_close_at": None}
+
+    # ---------- leadership ----------
+    def _lead(self) -> bool:
+        """Take (or keep) the host-wide leader lock without blocking."""
+        if self._lockf is not None:
+            return True
+        f = open(self.lock_path, "a+b")
+        try:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()).encode())
+        f.flush()
+        self._lockf = f
+        self.stats["leader"] = True
+        return True
+
+    def _resign(self) -> None:
+        if self._lockf is not None:
+            self._lockf.close()   # closing the descriptor releases the flock
+            self._lockf = None
+        self.stats["leader"] = False
+
+    # ---------- work ----------
+    def _job(self, symbol: str, timeframe: str, delay: float, fresh: bool) -> None:
+        if self._stop.wait(delay):
+            return
+        try:
+            bars = fetch_bars(symbol, limit=predict.HISTORY_BARS, timeframe=timeframe, fresh=fresh)
+            predict.warm(symbol, timeframe, self.horizons, bars=bars)
+            self.stats["jobs"] += 1
+        except Exception:
+            self.stats["errors"] += 1
+
+    def run_once(self, timeframes: Optional[Sequence[str]] = None, jitter: bool = True, fresh: bool = True) -> None:
+        """
+        Score every (symbol, timeframe) into this process' cache, at most `concurrency` at a time;
+        `fresh` (the leader) asks the exchange for the new bar first, otherwise stored bars are used.
+        """
+        t0 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="lipe-precompute") as pool:
+            wait([pool.submit(self._job, s, tf, random.uniform(0, self.jitter_s) if jitter else 0.0, fresh)
+                  for tf in (timeframes or self.timeframes) for s in self.symbols])
+        self.stats["runs"] += 1
+        self.stats["last_run_at"] = time.time()
+        self.stats["last_run_s"] = round(time.monotonic() - t0, 3)
+
+    def _wake_at(self, t: float, leader: bool) -> float:
+        return t + self.delay_s + (0.0 if leader else self.jitter_s + FOLLOW_S)
+
+    def loop(self) -> None:
+        warmed = False
+        while not self._stop.is_set():
+            leader = self._lead()
+            if leader and not warmed:   # a new leader (fresh deploy, or the old one died) refreshes right away
+                self.run_once(jitter=False)
+                warmed = True
+            t, tfs = next_close(time.time(), self.timeframes)
+            self.stats["next_close_at"] = t
+            at = self._wake_at(t, leader)
+            while time.time() < at:   # a follower retries the lock every LEADER_RETRY_S meanwhile
+                if self._stop.wait(min(LEADER_RETRY_S, at - time.time())):
+                    break
+                if not leader and self._lead():
+                    leader, at = True, self._wake_at(t, True)
+            if self._stop.is_set():
+                break
+            self.run_once(tfs, jitter=leader, fresh=leader)
+        self._resign()
+
+    def start(self) -> None:
+        """Run the loop on a daemon thread (idempotent)."""
+        if self._thread is None and self.symbols and self.timeframes:
+            self._thread = threading.Thread(target=self.loop, name="lipe-precompute-loop", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+SCHEDULER = Scheduler()
+
+def start() -> None:
+    if PRECOMPUTE:
+        SCHEDULER.start()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--once", action="store_true")
+    a = ap.parse_args(argv)
+    if a.once:
+        SCHEDULER.run_once(jitter=False)
+        print(SCHEDULER.stats)
+        return 0
+    try:
+        SCHEDULER.loop()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,94 +1,292 @@
 from __future__ import annotations
-import statistics, math
-from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any
-from lipe_core.models import ForecastReq, ForecastResp, FcPoint, StrategySpec, StrategyResp, EqPoint
-from lipe_core.data import fetch_ohlcv_daily
+import asyncio, hashlib, os, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Sequence, Tuple
+import numpy as np
+from lipe_core.models import (ForecastReq, ForecastResp, StrategySpec, StrategyResp,
+                              ForecastBatchReq, PortfolioSpec, PortfolioResp)
+from lipe_core.data import fetch_bars, afetch_bars, afetch_many, bars_per_day, TIMEFRAMES
+from lipe_core import accuracy, engine, backtest, montecarlo, wire
+from lipe_core.cache import ResultCache
+from lipe_core.metrics import stage
+
+MODEL_ID = "lipe.naive_ewma.v1"
+MC_MODELS = {"lipe.mc_bootstrap.v1": "bootstrap", "lipe.mc_garch.v1": "garch"}
+HISTORY_BARS = 300
+FETCH_WORKERS = int(os.getenv("LIPE_FETCH_WORKERS", "8"))
+_FETCH_POOL = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="lipe-fetch")
 
 def _ts_iso(ms:int)->str:
     return datetime.fromtimestamp(ms/1000, tz=timezone.utc).isoformat()
 
-def _entropy(returns: List[float]) -> float:
-    if not returns: return 1.0
-    vol = statistics.pstdev(returns) or 1e-9
-    # squash to 0..1-ish
-    return max(0.0, min(1.0, vol / 0.05))
+def _entropy(returns: Sequence[float]) -> float:
+    return float(engine.entropy(np.asarray(returns, dtype=float)))
 
-def _edge(returns: List[float]) -> float:
-    if not returns: return 0.0
-    mu = statistics.mean(returns)
-    vol = statistics.pstdev(returns) or 1e-9
-    return float(mu / vol)  # Sharpe-ish
+def _edge(returns: Sequence[float]) -> float:
+    return float(engine.edge(np.asarray(returns, dtype=float)))  # Sharpe-ish
 
-def run_forecast(req: ForecastReq) -> ForecastResp:
-    rows = fetch_ohlcv_daily(req.symbol, limit=300)
-    closes = [c for _,c in rows]
-    rets = [ (closes[i]/closes[i-1]-1.0) for i in range(1,len(closes)) ]
-    ent = _entropy(rets[-90:])
-    edg = _edge(rets[-90:])
-    regime = "Compression→Expansion" if ent < 0.35 else "Chop"
+def _signals(series: Sequence[Dict[str, np.ndarray]]) -> Tuple[List[float], List[float]]:
+    """Latest (entropy, edge) per series, read from the materialized feature columns."""
+    return [float(b["entropy"][-1]) for b in series], [float(b["edge"][-1]) for b in series]
 
-    last_ms, last_close = rows[-1]
-    horizon = req.horizon
-    # simple Gaussian walk using mu/vol
-    mu = statistics.mean(rets[-60:]) if len(rets)>60 else statistics.mean(rets[-20:])
-    vol = statistics.pstdev(rets[-60:]) if len(rets)>60 else statistics.pstdev(rets[-20:]) or 0.02
-    pts: List[FcPoint] = []
-    price = last_close
-    for d in range(1, horizon+1):
-        price *= (1 + mu)
-        # 80% band approx
-        band = 1.28 * vol * math.sqrt(d)
-        q10 = price * (1 - band)
-        q90 = price * (1 + band)
-        ts = _ts_iso(last_ms + d*24*3600*1000)
-        pts.append(FcPoint(ts=ts, yhat=float(price), q10=float(q10), q90=float(q90)))
+def _score(req: ForecastReq, bars: Dict[str, np.ndarray], horizons: Sequence[int]) -> Tuple[engine.Bands, List[int]]:
+    """Bands for one symbol under req.model, plus the band row to use for each of `horizons`."""
+    if req.model == MODEL_ID:
+        return engine.score_batch(bars["close"], [0]*len(horizons), list(horizons), _signals([bars]),
+                                  req.quantiles), list(range(len(horizons)))
+    # one simulation at the longest horizon; shorter horizons read its leading steps. The default
+    # seed ignores the horizon, so every horizon of a symbol shares the same paths on every worker.
+    seed = req.seed if req.seed is not None else int.from_bytes(hashlib.blake2b(repr(
+        forecast_key(req.model_copy(update={"horizon": 0}), bars)).encode(), digest_size=8).digest(), "little")
+    b = montecarlo.bands(bars["close"], max(horizons), req.quantiles, MC_MODELS[req.model], req.paths, seed,
+                         _signals([bars]))
+    return b, [0]*len(horizons)
 
+def _forecast_frame(req: ForecastReq, bars: Dict[str, np.ndarray], b: engine.Bands, i: int) -> wire.ForecastFrame:
+    ts, closes = bars["ts"], bars["close"]
+    last_ms, h, step = int(ts[-1]), req.horizon, TIMEFRAMES[req.timeframe]
+    ent, edg = float(b.entropy[i]), float(b.edge[i])
+    regime = "Compression→Expansion" if ent < 0.35 else "Chop"
     meta = {
         "arena": req.arena,
         "symbol": req.symbol,
-        "model": "lipe.naive_ewma.v1",
+        "timeframe": req.timeframe,
+        "model": req.model,
         "data_source": "ccxt/binance_or_synthetic",
         "generated_at": _ts_iso(last_ms),
         "regime": regime,
     }
-    metrics = {"entropy": float(ent), "edge": float(edg)}
-    series_tail = [{"ts": _ts_iso(t), "close": c} for t,c in rows[-60:]]
-    return ForecastResp(meta=meta, metrics=metrics, forecast={"points": pts}, series_tail=series_tail)
+    metrics = {"entropy": ent, "edge": edg}
+    return wire.ForecastFrame(meta=meta, metrics=metrics, ts=last_ms + step*np.arange(1, h+1, dtype=np.int64),
+                              yhat=b.yhat[i, :h], q10=b.q10[i, :h], q90=b.q90[i, :h],
+                              tail_ts=np.array(ts[-60:]), tail_close=np.array(closes[-60:]),
+                              quantiles={f"q{p:02d}": b.q[p][i, :h] for p in req.quantiles if p not in (10, 90)})
+
+def _forecast_resp(req: ForecastReq, bars: Dict[str, np.ndarray], b: engine.Bands, i: int) -> ForecastResp:
+    return ForecastResp.model_validate(wire.forecast_body(_served(_forecast_frame(req, bars, b, i))))
+
+# Forecasts are logged for accuracy scoring when a client is served one, not when one is computed
+# (warm-up and precompute fill the cache with forecasts nobody asked for); once per version per process.
+_SERVED: "OrderedDict[tuple, None]" = OrderedDict()
+_SERVED_LOCK = threading.Lock()
+
+def _served(frame: wire.ForecastFrame) -> wire.ForecastFrame:
+    m = frame.meta
+    key = (m["arena"], m["symbol"], m["timeframe"], m["model"], len(frame.yhat), int(frame.tail_ts[-1]),
+           float(frame.tail_close[-1]))
+    with _SERVED_LOCK:
+        if key in _SERVED:
+            return frame
+        _SERVED[key] = None
+        while len(_SERVED) > 8192:
+            _SERVED.popitem(last=False)
+    accuracy.record(*key[:6], float(frame.yhat[-1]), float(frame.q10[-1]), float(frame.q90[-1]))
+    return frame
+
+def run_forecast_many(reqs: Sequence[ForecastReq]) -> List[ForecastResp]:
+    """
+    Batched run_forecast: history is loaded once per symbol and every naive_ewma
+    (symbol, horizon) pair is scored in a single engine.score_batch pass; simulated
+    (mc_*) requests are scored one by one.
+    """
+    series = list(dict.fromkeys((r.symbol, r.timeframe) for r in reqs))
+    with stage("forecast.fetch"):
+        bars = {k: fetch_bars(k[0], limit=HISTORY_BARS, timeframe=k[1]) for k in series}
+    row = {k: i for i, k in enumerate(series)}
+    naive = [r for r in reqs if r.model == MODEL_ID]
+    with stage("forecast.compute"):
+        b = engine.score_batch(engine.stack([bars[k]["close"] for k in series]),
+                               [row[(r.symbol, r.timeframe)] for r in naive], [r.horizon for r in naive],
+                               _signals([bars[k] for k in series]), sorted({p for r in naive for p in r.quantiles}))
+        scored, j = [], 0
+        for r in reqs:
+            if r.model == MODEL_ID:
+                scored.append((b, j))
+                j += 1
+            else:
+                scored.append((_score(r, bars[(r.symbol, r.timeframe)], [r.horizon])[0], 0))
+    with stage("forecast.serialize"):
+        return [_forecast_resp(r, bars[(r.symbol, r.timeframe)], bi, i) for r, (bi, i) in zip(reqs, scored)]
+
+def run_forecast(req: ForecastReq) -> ForecastResp:
+    return run_forecast_many([req])[0]
+
+FORECAST_CACHE = ResultCache(max_entries=int(os.getenv("LIPE_FC_CACHE_MAX", "4096")),
+                             max_age_s=float(os.getenv("LIPE_FC_CACHE_AGE_S", "3600")))
+
+def forecast_key(req: ForecastReq, bars: Dict[str, np.ndarray]) -> tuple:
+    # the open daily bar's close moves intraday, so it versions the result along with its timestamp
+    key = (req.arena, req.symbol, req.timeframe, req.horizon, req.model, int(bars["ts"][-1]), float(bars["close"][-1]))
+    if req.quantiles:
+        key += (tuple(req.quantiles),)
+    if req.model in MC_MODELS:
+        key += (req.paths, req.seed)
+    return key
+
+def forecast_etag(key: tuple) -> str:
+    return '"' + hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest() + '"'
+
+def run_forecast_cached(req: ForecastReq, if_none_match: Optional[str] = None, variant: str = "",
+                        bars: Optional[Dict[str, np.ndarray]] = None) -> Tuple[Optional[wire.ForecastFrame], str]:
+    """
+    The forecast as a ForecastFrame behind FORECAST_CACHE (single-flight per key). Returns
+    (frame, etag), or (None, etag) when `if_none_match` already names the current version.
+    `variant` (wire.Fmt.tag) gives each response representation its own ETag.
+    """
+    if bars is None:
+        with stage("forecast.fetch"):
+            bars = fetch_bars(req.symbol, limit=HISTORY_BARS, timeframe=req.timeframe)
+    key = forecast_key(req, bars)
+    etag = forecast_etag(key + (variant,) if variant else key)
+    if if_none_match and etag in if_none_match:
+        return None, etag
+    def compute() -> wire.ForecastFrame:
+        with stage("forecast.compute"):
+            b, rows = _score(req, bars, [req.horizon])
+            return _forecast_frame(req, bars, b, rows[0])
+    return _served(FORECAST_CACHE.get_or_compute(key, compute)), etag
+
+async def arun_forecast_cached(req: ForecastReq, if_none_match: Optional[str] = None,
+                               variant: str = "") -> Tuple[Optional[wire.ForecastFrame], str]:
+    """run_forecast_cached for the event loop: history is awaited, scoring runs on a worker thread."""
+    with stage("forecast.fetch"):
+        bars = await afetch_bars(req.symbol, limit=HISTORY_BARS, timeframe=req.timeframe)
+    return await asyncio.to_thread(run_forecast_cached, req, if_none_match, variant, bars)
 
-def _rule_hit(val: float, op: str, thresh: float)->bool:
-    return (op == ">=" and val >= thresh) or (op == "<=" and val <= thresh)
+def _forecast_symbol(req: ForecastBatchReq, symbol: str, horizons: Sequence[int],
+                     bars: Optional[Dict[str, np.ndarray]] = None) -> Dict[int, wire.ForecastFrame]:
+    """All horizons of one symbol from a single history load and a single scoring pass."""
+    if bars is None:
+        bars = fetch_bars(symbol, limit=HISTORY_BARS, timeframe=req.timeframe)
+    one = ForecastReq(arena=req.arena, symbol=symbol, horizon=max(horizons), timeframe=req.timeframe, model=req.model,
+                      quantiles=req.quantiles, paths=req.paths, seed=req.seed)
+    b, rows = _score(one, bars, horizons)
+    return {h: _forecast_frame(one.model_copy(update={"horizon": h}), bars, b, i) for i, h in zip(rows, horizons)}
+
+def warm(symbol: str, timeframe: str = "1d", horizons: Sequence[int] = range(1, 31), arena: str = "crypto",
+         bars: Optional[Dict[str, np.ndarray]] = None) -> int:
+    """
+    Put the default-model forecast of every horizon into FORECAST_CACHE from one scoring pass,
+    under the keys run_forecast_cached looks up (lipe_core.precompute calls this at bar close).
+    """
+    if bars is None:
+        bars = fetch_bars(symbol, limit=HISTORY_BARS, timeframe=timeframe)
+    hz = sorted(set(horizons))
+    frames = _forecast_symbol(ForecastBatchReq(arena=arena, symbols=[symbol], horizons=hz, timeframe=timeframe),
+                              symbol, hz, bars)
+    for h, f in frames.items():
+        FORECAST_CACHE.put(forecast_key(ForecastReq(arena=arena, symbol=symbol, horizon=h, timeframe=timeframe), bars), f)
+    return len(frames)
+
+def iter_forecast_batch(req: ForecastBatchReq, fmt: wire.Fmt = wire.Fmt()) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one ForecastBatchItem-shaped dict per symbol as soon as its history is fetched
+    and scored (completion order); forecasts are in `fmt`, ready for wire.encode.
+    """
+    horizons = sorted(set(req.horizons))
+    futs = {_FETCH_POOL.submit(_forecast_symbol, req, s, horizons): s for s in dict.fromkeys(req.symbols)}
+    for fut in as_completed(futs):
+        try:
+            fc = {str(h): wire.forecast_body(_served(f), fmt) for h, f in fut.result().items()}
+            yield {"symbol": futs[fut], "forecasts": fc, "error": None}
+        except Exception as e:
+            yield {"symbol": futs[fut], "forecasts": {}, "error": str(e) or e.__class__.__name__}
+
+def run_forecast_batch(req: ForecastBatchReq, fmt: wire.Fmt = wire.Fmt()) -> Dict[str, Any]:
+    """ForecastBatchResp-shaped dict, items in request order."""
+    done = {it["symbol"]: it for it in iter_forecast_batch(req, fmt)}
+    return {"arena": req.arena, "items": [done[s] for s in dict.fromkeys(req.symbols)]}
+
+async def aiter_forecast_batch(req: ForecastBatchReq, fmt: wire.Fmt = wire.Fmt()) -> AsyncIterator[Dict[str, Any]]:
+    """iter_forecast_batch for the event loop: every symbol's history is fetched concurrently."""
+    horizons = sorted(set(req.horizons))
+
+    def shape(symbol: str, bars: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        frames = _forecast_symbol(req, symbol, horizons, bars)
+        fc = {str(h): wire.forecast_body(_served(f), fmt) for h, f in frames.items()}
+        return {"symbol": symbol, "forecasts": fc, "error": None}
+
+    async def one(symbol: str) -> Dict[str, Any]:
+        try:
+            bars = await afetch_bars(symbol, limit=HISTORY_BARS, timeframe=req.timeframe)
+            return await asyncio.to_thread(shape, symbol, bars)
+        except Exception as e:
+            return {"symbol": symbol, "forecasts": {}, "error": str(e) or e.__class__.__name__}
+
+    for fut in asyncio.as_completed([one(s) for s in dict.fromkeys(req.symbols)]):
+        yield await fut
+
+async def arun_forecast_batch(req: ForecastBatchReq, fmt: wire.Fmt = wire.Fmt()) -> Dict[str, Any]:
+    done = {it["symbol"]: it async for it in aiter_forecast_batch(req, fmt)}
+    return {"arena": req.arena, "items": [done[s] for s in dict.fromkeys(req.symbols)]}
+
+def backtest_frame(spec: StrategySpec, bars: Optional[Dict[str, np.ndarray]] = None) -> wire.EquityFrame:
+    """
+    Rules are evaluated on the per-bar entropy/edge/drawdown columns of the feature index
+    (lipe_core.features); the first SIGNAL_WINDOW bars only warm them up.
+    """
+    lookback = spec.lookback_days * bars_per_day(spec.timeframe)
+    if bars is None:
+        with stage("backtest.fetch"):
+            bars = fetch_bars(spec.symbol, limit=lookback + engine.SIGNAL_WINDOW, timeframe=spec.timeframe)
+    ts, closes = bars["ts"], bars["close"]
+    start = max(1, len(closes) - lookback)
+    with stage("backtest.compute"):
+        bt = backtest.run(closes, spec.enter, spec.exit, start=start, feats={k: bars[k] for k in backtest.FEATURES})
+    metrics = {"HitRate": float(bt.hit_rate), "ROI": float(bt.roi), "MaxDD": float(bt.max_dd), "Trades": int(bt.trades)}
+    return wire.EquityFrame(metrics=metrics, ts=np.array(ts[start:]), equity=bt.equity)
+
+async def abacktest_frame(spec: StrategySpec) -> wire.EquityFrame:
+    with stage("backtest.fetch"):
+        bars = await afetch_bars(spec.symbol, limit=spec.lookback_days * bars_per_day(spec.timeframe) + engine.SIGNAL_WINDOW,
+                                 timeframe=spec.timeframe)
+    return await asyncio.to_thread(backtest_frame, spec, bars)
 
 def backtest_strategy(spec: StrategySpec) -> StrategyResp:
-    rows = fetch_ohlcv_daily(spec.symbol, limit=spec.lookback_days+30)
-    closes = [c for _,c in rows]
-    rets = [ (closes[i]/closes[i-1]-1.0) for i in range(1,len(closes)) ]
-    ent = _entropy(rets[-90:])
-    edg = _edge(rets[-90:])
-
-    # naive backtest: daily step with same signals (for demo)
-    equity = 1.0
-    peak = 1.0
-    in_pos = False
-    curve: List[EqPoint] = []
-    wins = 0; trades = 0
-    for i in range(1, len(closes)):
-        # evaluate signals using current ent/edge (demo)
-        enter_ok = all(_rule_hit(edg if r.field=="edge" else ent, r.op, r.value) for r in spec.enter)
-        exit_ok  = any(_rule_hit(edg if r.field=="edge" else ent, r.op, r.value) for r in spec.exit) if spec.exit else False
-        if not in_pos and enter_ok:
-            in_pos = True; trades += 1
-            entry = closes[i]
-        elif in_pos and exit_ok:
-            in_pos = False
-            if closes[i] > entry: wins += 1
-
-        if in_pos:
-            equity *= (closes[i]/closes[i-1])
-        peak = max(peak, equity)
-        curve.append(EqPoint(ts=_ts_iso(rows[i][0]), equity=float(equity)))
-
-    hit = (wins/trades) if trades else 0.0
-    maxdd = float(1.0 - min(p.equity for p in curve)/max(peak,1e-9)) if curve else 0.0
-    roi = float(curve[-1].equity-1.0) if curve else 0.0
-    return StrategyResp(metrics={"HitRate": hit, "ROI": roi, "MaxDD": maxdd, "Trades": trades}, equity_curve=curve)
+    f = backtest_frame(spec)
+    with stage("backtest.serialize"):
+        return StrategyResp.model_validate(wire.strategy_body(f))
+
+# ---------- portfolio ----------
+REBALANCE_DAYS = {"signal": 0, "weekly": 7, "monthly": 30}   # "bar": every bar
+
+def _portfolio_limit(spec: PortfolioSpec) -> int:
+    return spec.lookback_days * bars_per_day(spec.timeframe) + engine.SIGNAL_WINDOW
+
+def portfolio_frame(spec: PortfolioSpec, series: Optional[Dict[str, Dict[str, np.ndarray]]] = None) -> wire.PortfolioFrame:
+    """
+    spec.symbols on one time grid (backtest.align), rules evaluated as (symbol × bar) masks on
+    their stored features, one vectorized pass for the portfolio and every asset.
+    """
+    symbols = list(dict.fromkeys(spec.symbols))
+    if series is None:
+        with stage("backtest.fetch"):
+            got = _FETCH_POOL.map(lambda s: fetch_bars(s, limit=_portfolio_limit(spec), timeframe=spec.timeframe), symbols)
+            series = dict(zip(symbols, got))
+    with stage("backtest.compute"):
+        ts, cols = backtest.align([series[s] for s in symbols], ("close", "var", *backtest.FEATURES))
+        lookback = spec.lookback_days * bars_per_day(spec.timeframe)
+        start = max(1, len(ts) - lookback)
+        every = 1 if spec.rebalance == "bar" else REBALANCE_DAYS[spec.rebalance] * bars_per_day(spec.timeframe)
+        pf = backtest.portfolio(cols["close"], spec.enter, spec.exit, start, {k: v for k, v in cols.items() if k != "close"},
+                                spec.weighting, every, spec.fee_bps / 1e4)
+    a = pf.assets
+    metrics = {"ROI": pf.roi, "MaxDD": pf.max_dd, "Turnover": pf.turnover, "Exposure": pf.exposure,
+               "Trades": int(a.trades.sum()),
+               "HitRate": float((a.hit_rate * a.trades).sum() / a.trades.sum()) if a.trades.sum() else 0.0}
+    per = [{"HitRate": float(h), "ROI": float(r), "MaxDD": float(d), "Trades": int(n)}
+           for h, r, d, n in zip(a.hit_rate, a.roi, a.max_dd, a.trades)]
+    return wire.PortfolioFrame(metrics=metrics, ts=ts[start:], equity=pf.equity, symbols=symbols,
+                               asset_metrics=per, asset_equity=a.equity)
+
+async def aportfolio_frame(spec: PortfolioSpec) -> wire.PortfolioFrame:
+    with stage("backtest.fetch"):
+        series = await afetch_many(spec.symbols, limit=_portfolio_limit(spec), timeframe=spec.timeframe)
+    return await asyncio.to_thread(portfolio_frame, spec, series)
+
+def backtest_portfolio(spec: PortfolioSpec) -> PortfolioResp:
+    f = portfolio_frame(spec)
+    with stage("backtest.serialize"):
+        return PortfolioResp.model_validate(wire.portfolio_body(f))
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio, os, struct, tempfile, threading, time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # non-POSIX: the limits and fetch locks only hold within one process
+    fcntl = None
+
+# Host-wide exchange traffic control. Every worker process draws from one token bucket per
+# exchange (a 16-byte file updated under flock), so WEB_CONCURRENCY workers together stay
+# under the exchange's rate limit; and a series is fetched by one worker at a time
+# (flock on <series>/FETCH.lock), so siblings that wanted the same bars wait and read what it stored.
+
+RATE = float(os.getenv("LIPE_EXCHANGE_RATE", "10"))           # requests per second per exchange, all workers (0 = off)
+BURST = float(os.getenv("LIPE_EXCHANGE_BURST", "20"))
+MAX_WAIT_S = float(os.getenv("LIPE_EXCHANGE_MAX_WAIT_S", "5"))  # longer queue → give up (the caller falls back)
+LOCK_WAIT_S = float(os.getenv("LIPE_EXCHANGE_LOCK_WAIT_S", "15"))
+STATE_DIR = os.getenv("LIPE_EXCHANGE_STATE_DIR", os.path.join(tempfile.gettempdir(), "lipe_exchange"))
+POLL_S = 0.02
+_STATE = struct.Struct("<dd")   # tokens (negative = reserved by waiting callers), wall time of the last update
+
+class Throttled(Exception):
+    """The exchange's bucket is booked further ahead than the caller may wait."""
+
+class TokenBucket:
+    """
+    `rate` tokens per second up to `burst`, shared by every process that opens `path`.
+    reserve() takes a token now and says how long to wait before using it.
+    """
+    def __init__(self, path: str, rate: float = RATE, burst: float = BURST):
+        self.path = path
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._lock = threading.Lock()   # flock does not exclude threads sharing the descriptor
+        self._fd = -1
+        self._pid = 0
+
+    def _open(self) -> int:
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd, self._pid = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), os.getpid()
+        return self._fd
+
+    def reserve(self, max_wait_s: float = MAX_WAIT_S) -> Optional[float]:
+        """Seconds until the reserved token is usable (0 = now); None, reserving nothing, if over `max_wait_s`."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            fd = self._open()
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                raw = os.pread(fd, _STATE.size, 0)
+                tokens, t = _STATE.unpack(raw) if len(raw) == _STATE.size else (self.burst, now)
+                tokens = min(self.burst, tokens + max(0.0, now - t) * self.rate)
+                wait = max(0.0, (1.0 - tokens) / self.rate)
+                if wait > max_wait_s:
+                    return None
+                os.pwrite(fd, _STATE.pack(tokens - 1.0, now), 0)
+                return wait
+            finally:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+
+class ExchangeGate:
+    """Per-exchange token buckets plus per-series fetch locks; stats are this process' counts."""
+    def __init__(self, root: str = STATE_DIR, rate: float = RATE, burst: float = BURST,
+                 max_wait_s: float = MAX_WAIT_S, lock_wait_s: float = LOCK_WAIT_S):
+        self.root = root
+        self.rate = rate
+        self.burst = burst
+        self.max_wait_s = max_wait_s
+        self.lock_wait_s = lock_wait_s
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "throttled": 0, "throttle_wait_s": 0.0, "rejected": 0, "lock_waits": 0}
+
+    def _bucket(self, ex_name: str) -> TokenBucket:
+        b = self._buckets.get(ex_name)
+        if b is None:
+            with self._lock:
+                b = self._buckets.setdefault(ex_name, TokenBucket(os.path.join(self.root, f"{ex_name}.bucket"),
+                                                                  self.rate, self.burst))
+        return b
+
+    def _reserve(self, ex_name: str) -> float:
+        wait = self._bucket(ex_name).reserve(self.max_wait_s)
+        if wait is None:
+            self.stats["rejected"] += 1
+            raise Throttled(f"{ex_name}: rate limit queue longer than {self.max_wait_s}s")
+        self.stats["calls"] += 1
+        if wait > 0:
+            self.stats["throttled"] += 1
+            self.stats["throttle_wait_s"] += wait
+        return wait
+
+    def throttle(self, ex_name: str) -> None:
+        """Block until this process may send one request to `ex_name`; raises Throttled instead of queueing too long."""
+        wait = self._reserve(ex_name)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def athrottle(self, ex_name: str) -> None:
+        wait = self._reserve(ex_name)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _try_lock(self, fd: int) -> bool:
+        if not fcntl:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    @contextmanager
+    def fetching(self, series_path: str) -> Iterator[None]:
+        """Hold the series' fetch lock (waiting up to lock_wait_s for a sibling's fetch to finish)."""
+        fd = os.open(os.path.join(series_path, "FETCH.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            deadline = time.monotonic() + self.lock_wait_s
+            if not self._try_lock(fd):
+                self.stats["lock_waits"] += 1
+                while not self._try_lock(fd):
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"fetch lock busy: {series_path}")
+                    time.sleep(POLL_S)
+            yield
+        finally:
+            os.close(fd)   # releases the flock
+
+    @asynccontextmanager
+    async def afetching(self, series_path: str) -> AsyncIterator[None]:
+        """fetching() for the event loop: polls the lock instead of blocking the loop."""
+        fd = os.open(os.path.join(series_path, "FETCH.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            deadline = time.monotonic() + self.lock_wait_s
+            if not self._try_lock(fd):
+                self.stats["lock_waits"] += 1
+                while not self._try_lock(fd):
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"fetch lock busy: {series_path}")
+                    await asyncio.sleep(POLL_S)
+            yield
+        finally:
+            os.close(fd)
+
+GATE = ExchangeGate()
+
+def stats() -> Dict[str, float]:
+    return dict(GATE.stats)
@@ -1,25 +1,110 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from datetime import datetime, timezone, timedelta
+import hashlib, json, os, sqlite3, tempfile, threading, time
 from typing import Dict, Any, Optional
 from uuid import uuid4
 
-@dataclass
-class _ShareItem:
-    payload: Dict[str, Any]
-    expire_at: datetime
+SHARE_DB = os.getenv("LIPE_SHARE_DB", os.path.join(tempfile.gettempdir(), "lipe_share.sqlite3"))
+SHARE_MAX_ENTRIES = int(os.getenv("LIPE_SHARE_MAX_ENTRIES", "100000"))
+SHARE_DEDUP_S = float(os.getenv("LIPE_SHARE_DEDUP_S", "3600"))   # reuse a token for identical payloads
+SWEEP_BATCH = 256
 
-_STORE: Dict[str, _ShareItem] = {}
+_SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS share(
+    token TEXT PRIMARY KEY, dedup TEXT NOT NULL, payload TEXT NOT NULL,
+    created_at REAL NOT NULL, expire_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS share_expire ON share(expire_at);
+CREATE INDEX IF NOT EXISTS share_dedup ON share(dedup, created_at);
+CREATE TABLE IF NOT EXISTS share_count(n INTEGER NOT NULL);
+INSERT INTO share_count SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM share_count);
+CREATE TRIGGER IF NOT EXISTS share_ins AFTER INSERT ON share BEGIN UPDATE share_count SET n = n + 1; END;
+CREATE TRIGGER IF NOT EXISTS share_del AFTER DELETE ON share BEGIN UPDATE share_count SET n = n - 1; END;
+COMMIT;
+"""
+
+class ShareStore:
+    """
+    Share links in one SQLite file (WAL), so every gunicorn worker sees every token.
+    The expire_at index acts as the expiry heap: each create pops at most SWEEP_BATCH
+    expired rows off its front (O(log n) per row), and when the row count
+    (kept by triggers) exceeds max_entries the soonest-to-expire rows are evicted.
+    Identical payloads created within dedup_s return the existing token, with its
+    expiry raised to cover the requested ttl.
+    """
+    def __init__(self, path: str = SHARE_DB, max_entries: int = SHARE_MAX_ENTRIES, dedup_s: float = SHARE_DEDUP_S):
+        self.path = path
+        self.max_entries = max_entries
+        self.dedup_s = dedup_s
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def create(self, payload: Dict[str, Any], ttl_s: float) -> Dict[str, Any]:
+        now = time.time()
+        blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        dedup = hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._sweep(db, now)
+            row = db.execute("SELECT token, expire_at FROM share WHERE dedup=? AND created_at>=? AND expire_at>? "
+                             "ORDER BY created_at DESC LIMIT 1", (dedup, now - self.dedup_s, now)).fetchone()
+            if row:
+                expire_at = max(row[1], now + ttl_s)
+                if expire_at > row[1]:
+                    db.execute("UPDATE share SET expire_at=? WHERE token=?", (expire_at, row[0]))
+                db.execute("COMMIT")
+                return {"token": row[0], "expire_at": expire_at, "deduped": True}
+            token = uuid4().hex
+            db.execute("INSERT INTO share VALUES (?,?,?,?,?)", (token, dedup, blob, now, now + ttl_s))
+            over = db.execute("SELECT n FROM share_count").fetchone()[0] - self.max_entries
+            if over > 0:
+                db.execute("DELETE FROM share WHERE token IN "
+                           "(SELECT token FROM share ORDER BY expire_at LIMIT ?)", (over,))
+            db.execute("COMMIT")
+            return {"token": token, "expire_at": now + ttl_s, "deduped": False}
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT payload, expire_at FROM share WHERE token=?", (token,)).fetchone()
+        if not row or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def _sweep(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("DELETE FROM share WHERE token IN "
+                   "(SELECT token FROM share WHERE expire_at<? ORDER BY expire_at LIMIT ?)", (now, SWEEP_BATCH))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": self._conn().execute("SELECT n FROM share_count").fetchone()[0],
+                "max_entries": self.max_entries}
+
+_STORE: Optional[ShareStore] = None
+_STORE_LOCK = threading.Lock()
+
+def _store() -> ShareStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ShareStore()
+        return _STORE
 
 def share_create(body):
-    token = uuid4().hex
     ttl = getattr(body, "ttl_hours", 24) or 24
-    _STORE[token] = _ShareItem(payload=body.dict(), expire_at=datetime.now(timezone.utc)+timedelta(hours=ttl))
-    return {"token": token, "url": f"/v1/share/{token}", "expires_in_hours": ttl}
+    item = _store().create(body.model_dump(), ttl_s=ttl*3600)
+    token = item["token"]
+    left = max(0, round((item["expire_at"] - time.time()) / 3600))
+    return {"token": token, "url": f"/v1/share/{token}", "expires_in_hours": left}
 
 def share_get(token: str) -> Optional[Dict[str, Any]]:
-    item = _STORE.get(token)
-    if not item: return None
-    if item.expire_at < datetime.now(timezone.utc):
-        _STORE.pop(token, None); return None
-    return item.payload
+    return _store().get(token)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+import asyncio, os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+from lipe_core.models import ForecastReq
+from lipe_core.predict import arun_forecast_cached
+from lipe_core import wire
+
+STREAM_POLL_S = float(os.getenv("LIPE_STREAM_POLL_S", "30"))
+HEARTBEAT_S = 15.0
+
+Update = Tuple[str, str]   # (etag, JSON body of /v1/forecast)
+
+@dataclass
+class _Topic:
+    subs: Set[asyncio.Queue] = field(default_factory=set)
+    task: Optional[asyncio.Task] = None
+    last: Optional[Update] = None
+
+def _offer(q: asyncio.Queue, item: Update) -> None:
+    # subscribers only need the latest version: replace anything not yet consumed
+    while not q.empty():
+        q.get_nowait()
+    q.put_nowait(item)
+
+class ForecastHub:
+    """
+    Fan-out of forecast updates to SSE subscribers in this worker.
+    Each (arena, symbol, timeframe, horizon, shape) has one poller while anyone listens, no matter how many
+    tabs are open; it goes through arun_forecast_cached (a cache hit unless the series moved)
+    and publishes only when the forecast ETag changes.
+    """
+    def __init__(self, poll_s: float = STREAM_POLL_S):
+        self.poll_s = poll_s
+        self._topics: Dict[tuple, _Topic] = {}
+
+    async def _poll(self, req: ForecastReq, fmt: wire.Fmt, t: _Topic) -> None:
+        while True:
+            try:
+                frame, etag = await arun_forecast_cached(req, None, fmt.tag)
+                if t.last is None or t.last[0] != etag:
+                    t.last = (etag, wire.dumps({"event": wire.forecast_body(frame, fmt)}).decode())
+                    for q in t.subs:
+                        _offer(q, t.last)
+            except Exception:
+                pass  # keep the stream; the next tick retries
+            await asyncio.sleep(self.poll_s)
+
+    async def subscribe(self, req: ForecastReq, last_etag: Optional[str] = None,
+                        heartbeat_s: float = HEARTBEAT_S, fmt: wire.Fmt = wire.Fmt()) -> AsyncIterator[Optional[Update]]:
+        """Yields updates as they happen and None every `heartbeat_s` of silence."""
+        key = (req.arena, req.symbol, req.timeframe, req.horizon, fmt)
+        t = self._topics.setdefault(key, _Topic())
+        q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        t.subs.add(q)
+        if t.task is None:
+            t.task = asyncio.create_task(self._poll(req, fmt, t))
+        elif t.last:
+            _offer(q, t.last)
+        sent = last_etag
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(q.get(), heartbeat_s)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if item[0] != sent:
+                    sent = item[0]
+                    yield item
+        finally:
+            t.subs.discard(q)
+            if not t.subs and self._topics.get(key) is t:
+                t.task.cancel()
+                del self._topics[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"topics": len(self._topics), "subscribers": sum(len(t.subs) for t in self._topics.values())}
+
+HUB = ForecastHub()
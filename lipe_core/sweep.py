@@ -0,0 +1,223 @@
+from __future__ import annotations
+import heapq, itertools, math, os, shutil, tempfile, threading
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+import numpy as np
+from lipe_core.models import Rule, SweepReq, SweepResp, SweepRow
+from lipe_core.data import fetch_bars, bars_per_day
+from lipe_core import backtest, engine
+
+# LIPE_SWEEP_WORKERS is the host's budget; every server worker process runs its share of it
+SWEEP_WORKERS = max(1, int(os.getenv("LIPE_SWEEP_WORKERS", str(os.cpu_count() or 1)))
+                    // max(1, int(os.getenv("WEB_CONCURRENCY", "1"))))
+SWEEP_CHUNK = int(os.getenv("LIPE_SWEEP_CHUNK", "64"))        # variants per pool task
+SWEEP_MAX_VARIANTS = int(os.getenv("LIPE_SWEEP_MAX_VARIANTS", "200000"))
+SWEEP_MAX_JOBS = 32                                            # jobs kept (running + finished, for polling)
+SERIES_CACHE = 8                                               # series files a pool process keeps mapped
+
+Variant = Tuple[str, int, Tuple[float, ...]]   # (symbol, lookback_days, threshold per range)
+
+class SweepBusy(Exception):
+    """Every job slot holds a running sweep."""
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def _pool() -> ProcessPoolExecutor:
+    # spawn, not fork: the parent is a threaded ASGI worker
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=SWEEP_WORKERS, mp_context=mp.get_context("spawn"))
+        return _POOL
+
+# ---------- variant generation ----------
+def _axes(req: SweepReq) -> List[List[float]]:
+    base = {"enter": req.base.enter, "exit": req.base.exit}
+    out = []
+    for rg in req.ranges:
+        rules = base[rg.side]
+        if rg.index >= len(rules):
+            raise ValueError(f"{rg.side}[{rg.index}] does not exist in base spec")
+        if rg.values:
+            out.append(list(rg.values))
+        elif rg.lo is not None and rg.hi is not None:
+            out.append(np.linspace(rg.lo, rg.hi, rg.steps).tolist())
+        else:
+            out.append([rules[rg.index].value])
+    return out
+
+def variants(req: SweepReq) -> Tuple[int, Iterator[Variant]]:
+    """(total, lazy iterator) over the grid or a seeded random sample of it."""
+    syms = req.symbols or [req.base.symbol]
+    lbs = req.lookbacks or [req.base.lookback_days]
+    axes = _axes(req)
+    if req.mode == "random":
+        rng = np.random.default_rng(req.seed)
+        def sample() -> Iterator[Variant]:
+            for _ in range(req.samples):
+                thr = []
+                for rg, ax in zip(req.ranges, axes):
+                    lo_hi = rg.lo is not None and rg.hi is not None and not rg.values
+                    thr.append(float(rng.uniform(rg.lo, rg.hi)) if lo_hi else float(ax[rng.integers(len(ax))]))
+                yield (syms[rng.integers(len(syms))], int(lbs[rng.integers(len(lbs))]), tuple(thr))
+        return req.samples, sample()
+    total = len(syms) * len(lbs) * math.prod(len(a) for a in axes)
+    if total > SWEEP_MAX_VARIANTS:
+        raise ValueError(f"grid has {total} variants (max {SWEEP_MAX_VARIANTS}); use mode='random'")
+    return total, ((s, lb, tuple(thr)) for s in syms for lb in lbs for thr in itertools.product(*axes))
+
+def _rules(base: Dict[str, List[dict]], ranges: List[Tuple[str, int]], thr: Tuple[float, ...]):
+    sides = {k: [dict(r) for r in v] for k, v in base.items()}
+    for (side, i), v in zip(ranges, thr):
+        sides[side][i]["value"] = v
+    return [Rule(**r) for r in sides["enter"]], [Rule(**r) for r in sides["exit"]]
+
+# ---------- pool task ----------
+# A job writes each symbol's columns once to an .npy file; pool processes map it read-only
+# (shared page cache) and chunks carry only the path.
+FIELDS = ("close", *backtest.FEATURES)
+_SERIES: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+def _series(path: str) -> np.ndarray:
+    m = _SERIES.get(path)
+    if m is None:
+        m = _SERIES[path] = np.load(path, mmap_mode="r")
+        while len(_SERIES) > SERIES_CACHE:
+            _SERIES.popitem(last=False)
+    else:
+        _SERIES.move_to_end(path)
+    return m
+
+def _run_chunk(base: Dict[str, List[dict]], ranges: List[Tuple[str, int]],
+               series: Dict[str, str], items: List[Variant], per_day: int = 1) -> List[tuple]:
+    """Runs in a pool process. `series` maps symbol → .npy of FIELDS rows; variants only slice them."""
+    out = []
+    for sym, lb, thr in items:
+        n = lb * per_day
+        m = _series(series[sym])
+        cols = {k: np.asarray(m[j, -(n + engine.SIGNAL_WINDOW):]) for j, k in enumerate(FIELDS)}
+        c = cols.pop("close")
+        en, ex = _rules(base, ranges, thr)
+        bt = backtest.run(c, en, ex, start=max(1, len(c) - n), feats=cols)
+        out.append((sym, lb, thr, float(bt.hit_rate), float(bt.roi), float(bt.max_dd), int(bt.trades)))
+    return out
+
+# ---------- jobs ----------
+class SweepJob:
+    """One sweep: dispatches chunks to the pool with bounded in-flight work and keeps a top-N heap."""
+    def __init__(self, req: SweepReq):
+        self.id = uuid4().hex
+        self.req = req
+        self.total, self._variants = variants(req)
+        self._base = {"enter": [r.model_dump() for r in req.base.enter],
+                      "exit": [r.model_dump() for r in req.base.exit]}
+        self._ranges = [(rg.side, rg.index) for rg in req.ranges]
+        self.done = 0
+        self.state = "running"
+        self.error: Optional[str] = None
+        self._top: List[tuple] = []
+        self._seq = itertools.count()
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def _score(self, hit: float, roi: float, dd: float, trades: int) -> float:
+        return {"ROI": roi, "HitRate": hit, "MaxDD": -dd, "Trades": float(trades)}[self.req.rank_by]
+
+    def _keep(self, rows: List[tuple]) -> None:
+        with self._lock:
+            for r in rows:
+                item = (self._score(*r[3:]), next(self._seq), r)
+                if len(self._top) < self.req.top:
+                    heapq.heappush(self._top, item)
+                elif item[0] > self._top[0][0]:
+                    heapq.heapreplace(self._top, item)
+            self.done += len(rows)
+
+    def run(self) -> None:
+        tmp = tempfile.mkdtemp(prefix=f"lipe-sweep-{self.id[:8]}-")
+        try:
+            syms = self.req.symbols or [self.req.base.symbol]
+            tf = self.req.base.timeframe
+            per_day = bars_per_day(tf)
+            depth = max(self.req.lookbacks or [self.req.base.lookback_days]) * per_day + engine.SIGNAL_WINDOW
+            series = {}
+            for i, s in enumerate(dict.fromkeys(syms)):
+                b = fetch_bars(s, limit=depth, timeframe=tf)
+                series[s] = os.path.join(tmp, f"{i}.npy")
+                np.save(series[s], np.vstack([np.asarray(b[k], dtype=float) for k in FIELDS]))
+            pool, pending = _pool(), set()
+            chunks = iter(lambda: list(itertools.islice(self._variants, SWEEP_CHUNK)), [])
+            for chunk in chunks:
+                if self._cancel.is_set():
+                    break
+                need = {s for s, _, _ in chunk}
+                pending.add(pool.submit(_run_chunk, self._base, self._ranges, {s: series[s] for s in need}, chunk, per_day))
+                if len(pending) >= 2 * SWEEP_WORKERS:   # bound queued results / pickled inputs
+                    fin, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in fin:
+                        self._keep(f.result())
+            for f in pending:
+                if self._cancel.is_set():
+                    f.cancel()
+            for f in pending:
+                if not f.cancelled():
+                    self._keep(f.result())
+            self.state = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            self.state, self.error = "error", str(e) or e.__class__.__name__
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)   # pool processes keep their open maps
+            self._finished.set()
+
+    def snapshot(self) -> SweepResp:
+        with self._lock:
+            ranked = sorted(self._top, key=lambda t: (-t[0], t[1]))
+        rows = []
+        for _, _, (sym, lb, thr, hit, roi, dd, trades) in ranked:
+            en, ex = _rules(self._base, self._ranges, thr)
+            rows.append(SweepRow(symbol=sym, lookback_days=lb, enter=en, exit=ex,
+                                 metrics={"HitRate": hit, "ROI": roi, "MaxDD": dd, "Trades": trades}))
+        return SweepResp(job_id=self.id, state=self.state, done=self.done, total=self.total, rows=rows)
+
+_JOBS: "OrderedDict[str, SweepJob]" = OrderedDict()
+_JOBS_LOCK = threading.Lock()
+
+def start_sweep(req: SweepReq) -> SweepJob:
+    """Start `req` in a background thread; only finished jobs make room, SweepBusy if none has."""
+    job = SweepJob(req)
+    with _JOBS_LOCK:
+        while len(_JOBS) >= SWEEP_MAX_JOBS:
+            old = next((k for k, j in _JOBS.items() if j.finished), None)
+            if old is None:
+                raise SweepBusy(f"{SWEEP_MAX_JOBS} sweeps running; retry later")
+            del _JOBS[old]
+        _JOBS[job.id] = job
+    threading.Thread(target=job.run, name=f"lipe-sweep-{job.id[:8]}", daemon=True).start()
+    return job
+
+def get_sweep(job_id: str) -> Optional[SweepJob]:
+    return _JOBS.get(job_id)
+
+def iter_progress(job: SweepJob, every_s: float = 0.5) -> Iterator[SweepResp]:
+    """Snapshots every `every_s` until the job finishes; cancels the job if the consumer goes away."""
+    try:
+        while not job.wait(every_s):
+            yield job.snapshot()
+        yield job.snapshot()
+    finally:
+        job.cancel()
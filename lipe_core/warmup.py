@@ -0,0 +1,161 @@
+"""
+Worker warm-up and boot timing.
+
+Under gunicorn with preload_app (gunicorn_conf.py) the master imports the app, then preload()
+loads the watchlist history, scores every horizon into FORECAST_CACHE and pushes one response
+through each encoder, all before forking: workers start with those pages, caches and imports
+shared copy-on-write. The master does this on its own thread and starts nothing (no pools, no
+metrics flusher); every thread a worker needs is started after the fork (post_fork / startup).
+Without preload (plain uvicorn) each worker runs the same warm-up in its startup hook, before it
+accepts traffic. BOOT records how long every phase took.
+"""
+from __future__ import annotations
+import logging, os, time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional, Sequence, Tuple
+from lipe_core import data, metrics, montecarlo, predict, wire
+from lipe_core.models import ForecastReq, ForecastResp
+from lipe_core.precompute import _horizons, _list, WATCHLIST, TIMEFRAMES_WATCHED
+
+WARMUP = os.getenv("LIPE_WARMUP", "1") == "1"
+SYMBOLS = _list("LIPE_WARMUP_SYMBOLS", ",".join(WATCHLIST))
+TIMEFRAMES = _list("LIPE_WARMUP_TIMEFRAMES", ",".join(TIMEFRAMES_WATCHED))
+HORIZONS = _horizons(os.getenv("LIPE_WARMUP_HORIZONS", "1-30"))
+CONCURRENCY = int(os.getenv("LIPE_WARMUP_CONCURRENCY", "4"))
+TIMEOUT_S = float(os.getenv("LIPE_WARMUP_TIMEOUT_S", "30"))   # a worker stops waiting for history after this
+
+log = logging.getLogger(__name__)
+
+class Boot:
+    """Startup phases of this process; a forked worker inherits the master's (import, warm-up) phases."""
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self.warm: Dict[str, int] = {"series": 0, "forecasts": 0, "errors": 0}
+        self.warmed = False
+        self.preloaded = False
+        self.forked_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+
+    def phase(self, name: str, t0: float, t1: Optional[float] = None) -> float:
+        """Record phase `name` as running from t0 to t1 (default: now); returns t1."""
+        t1 = time.perf_counter() if t1 is None else t1
+        if self.started is None:
+            self.started = t0
+        self.phases[name] = round(t1 - t0, 4)
+        return t1
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"pid": os.getpid(), "preloaded": self.preloaded, "ready": self.ready_at is not None,
+                               "phases": dict(self.phases), "warm": dict(self.warm)}
+        if self.ready_at is not None and self.started is not None:
+            out["ready_s"] = round(self.ready_at - self.started, 4)   # first import → serving
+            if self.forked_at is not None:
+                out["worker_ready_s"] = round(self.ready_at - self.forked_at, 4)
+        return out
+
+BOOT = Boot()
+
+def _history(pair: Tuple[str, str]) -> Tuple[str, str, Dict[str, Any]]:
+    return (*pair, data.fetch_bars(pair[0], limit=predict.HISTORY_BARS, timeframe=pair[1]))
+
+def run(symbols: Sequence[str] = SYMBOLS, timeframes: Sequence[str] = TIMEFRAMES,
+        horizons: Sequence[int] = HORIZONS, timeout_s: Optional[float] = None, threads: bool = True) -> None:
+    """
+    Import ccxt, load every (symbol, timeframe) history, score `horizons` into FORECAST_CACHE and
+    encode one response per wire format. Never raises. `timeout_s` bounds the history phase: a
+    threaded run stops waiting, `threads=False` (one by one on the calling thread) stops starting
+    new fetches; whatever is not loaded by then is left cold.
+    """
+    if BOOT.warmed:
+        return
+    BOOT.warmed = True
+    if not WARMUP:
+        return
+    t = time.perf_counter()
+    data._ccxt()
+    data._ccxt(asynchronous=True)
+    t = BOOT.phase("import.ccxt", t)
+
+    pairs = [(s, tf) for tf in timeframes if tf in data.TIMEFRAMES for s in dict.fromkeys(symbols)]
+    loaded = []
+    if threads:
+        pool = ThreadPoolExecutor(max_workers=max(1, CONCURRENCY), thread_name_prefix="lipe-warmup")
+        futs = [pool.submit(_history, p) for p in pairs]
+        done, pending = wait(futs, timeout=timeout_s)
+        pool.shutdown(wait=False, cancel_futures=True)
+        for f in futs:
+            if f in done and f.exception() is None:
+                loaded.append(f.result())
+            else:
+                BOOT.warm["errors"] += 1
+        if pending:
+            log.warning("warm-up history timed out after %ss; %d of %d series left cold",
+                        timeout_s, len(pending), len(pairs))
+    else:
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        for i, p in enumerate(pairs):
+            if deadline is not None and time.monotonic() >= deadline:
+                BOOT.warm["errors"] += len(pairs) - i
+                log.warning("warm-up history timed out after %ss; %d of %d series left cold",
+                            timeout_s, len(pairs) - i, len(pairs))
+                break
+            try:
+                loaded.append(_history(p))
+            except Exception:
+                BOOT.warm["errors"] += 1
+    BOOT.warm["series"] = len(loaded)
+    t = BOOT.phase("warmup.history", t)
+
+    for symbol, tf, bars in loaded:
+        try:
+            BOOT.warm["forecasts"] += predict.warm(symbol, tf, horizons, bars=bars)
+        except Exception:
+            BOOT.warm["errors"] += 1
+    t = BOOT.phase("warmup.forecast", t)
+
+    # first calls through the per-request code: pydantic / orjson / msgpack / gzip / Monte Carlo
+    if loaded and horizons:
+        symbol, tf, bars = loaded[0]
+        try:
+            frame = predict.FORECAST_CACHE.get(predict.forecast_key(
+                ForecastReq(arena="crypto", symbol=symbol, horizon=max(horizons), timeframe=tf), bars))
+            if frame is not None:
+                ForecastResp.model_validate(wire.forecast_body(frame))
+                for fmt in (wire.Fmt(), wire.Fmt(columnar=True, epoch_ms=True)):
+                    wire.encode(wire.forecast_body(frame, fmt), wire.JSON, "gzip")
+                    wire.encode(wire.forecast_body(frame, fmt), wire.MSGPACK)
+            montecarlo.bands(bars["close"], 5, (5, 95), "garch", 256, seed=0)
+        except Exception:
+            BOOT.warm["errors"] += 1
+    BOOT.phase("warmup.jit", t)
+
+def preload() -> None:
+    """
+    gunicorn when_ready, in the master before any fork: the data warm-up only, starting no thread.
+    The history phase gets TIMEOUT_S in all; an exchange that is slow or down leaves workers cold.
+    """
+    metrics.REGISTRY.autostart = False
+    run(timeout_s=TIMEOUT_S, threads=False)
+
+def post_fork() -> None:
+    """
+    gunicorn post_fork: the child inherits the warm caches but not the parent's exchange sessions
+    or its metrics samples; from here on threads may start (the startup hook starts them).
+    """
+    data.forget_exchanges()
+    metrics.REGISTRY.reset()
+    metrics.REGISTRY.autostart = True
+    BOOT.preloaded = True
+    BOOT.forked_at = time.perf_counter()
+
+def ready() -> None:
+    """App startup: warm up unless the preloading master already did, then mark this worker as serving."""
+    t = time.perf_counter()
+    if not BOOT.warmed:
+        run(timeout_s=TIMEOUT_S)
+    BOOT.phase("startup", t)
+    BOOT.ready_at = time.perf_counter()
+    s = BOOT.snapshot()
+    log.info("worker %s ready in %ss (preloaded=%s) phases=%s warm=%s", s["pid"],
+             s.get("worker_ready_s", s.get("ready_s")), s["preloaded"], s["phases"], s["warm"])
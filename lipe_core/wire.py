@@ -0,0 +1,139 @@
+from __future__ import annotations
+import gzip, os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+import orjson
+try:
+    import msgpack
+except ImportError:   # optional: without it every client gets JSON
+    msgpack = None
+from lipe_core.cache import ResultCache
+from lipe_core.downsample import downsample
+
+GZIP_MIN_BYTES = int(os.getenv("LIPE_GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("LIPE_GZIP_LEVEL", "5"))
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+@dataclass(frozen=True)
+class Fmt:
+    """
+    Response shape. rows: lists of {ts, ...} objects (the original API);
+    columnar: one array per field. ts is ISO-8601 strings or epoch-ms ints.
+    max_points caps history series (series_tail, equity_curve) by LTTB downsampling.
+    """
+    columnar: bool = False
+    epoch_ms: bool = False
+    max_points: Optional[int] = None
+
+    @classmethod
+    def parse(cls, shape: str = "rows", ts: str = "iso", max_points: Optional[int] = None) -> "Fmt":
+        return cls(columnar=shape == "columnar", epoch_ms=ts == "ms", max_points=max_points)
+
+    @property
+    def tag(self) -> str:
+        # distinguishes representations in ETags; "" for the default so existing tags stay valid
+        return ("c" if self.columnar else "") + ("m" if self.epoch_ms else "") + \
+               (f"p{self.max_points}" if self.max_points else "")
+
+@dataclass(frozen=True)
+class ForecastFrame:
+    meta: Dict[str, Any]
+    metrics: Dict[str, float]
+    ts: np.ndarray          # int64 epoch ms, one per horizon step
+    yhat: np.ndarray
+    q10: np.ndarray
+    q90: np.ndarray
+    tail_ts: np.ndarray
+    tail_close: np.ndarray
+    quantiles: Dict[str, np.ndarray] = field(default_factory=dict)   # "q05" → per-step values
+
+@dataclass(frozen=True)
+class EquityFrame:
+    metrics: Dict[str, float]
+    ts: np.ndarray
+    equity: np.ndarray
+
+@dataclass(frozen=True)
+class PortfolioFrame:
+    metrics: Dict[str, float]
+    ts: np.ndarray
+    equity: np.ndarray
+    symbols: List[str]
+    asset_metrics: List[Dict[str, float]]
+    asset_equity: np.ndarray   # (len(symbols), len(ts))
+
+def _ts(ms: np.ndarray, fmt: Fmt) -> Any:
+    if fmt.epoch_ms:
+        return ms
+    # same text as datetime.fromtimestamp(s, tz=utc).isoformat() for whole-second bars
+    return [s + "+00:00" for s in np.datetime_as_string(ms.astype("datetime64[ms]"), unit="s").tolist()]
+
+def _rows(ts: Any, **cols: np.ndarray) -> List[Dict[str, Any]]:
+    ts = ts.tolist() if isinstance(ts, np.ndarray) else ts
+    names = list(cols)
+    return [dict(zip(("ts", *names), vals)) for vals in zip(ts, *(c.tolist() for c in cols.values()))]
+
+def _thin(ms: np.ndarray, y: np.ndarray, fmt: Fmt) -> Tuple[np.ndarray, np.ndarray]:
+    keep = downsample(ms, y, fmt.max_points)
+    return (ms, y) if keep is None else (ms[keep], y[keep])
+
+def forecast_body(f: ForecastFrame, fmt: Fmt = Fmt()) -> Dict[str, Any]:
+    """ForecastResp-shaped dict (rows) or its columnar twin; numpy arrays are left for the encoder."""
+    tail_ms, tail_close = _thin(f.tail_ts, f.tail_close, fmt)
+    ts, tail_ts = _ts(f.ts, fmt), _ts(tail_ms, fmt)
+    if fmt.columnar:
+        fc = {"ts": ts, "yhat": f.yhat, "q10": f.q10, "q90": f.q90, **f.quantiles}
+        tail = {"ts": tail_ts, "close": tail_close}
+    else:
+        fc = {"points": _rows(ts, yhat=f.yhat, q10=f.q10, q90=f.q90, **f.quantiles)}
+        tail = _rows(tail_ts, close=tail_close)
+    return {"meta": f.meta, "metrics": f.metrics, "forecast": fc, "series_tail": tail}
+
+def strategy_body(f: EquityFrame, fmt: Fmt = Fmt()) -> Dict[str, Any]:
+    ms, equity = _thin(f.ts, f.equity, fmt)
+    ts = _ts(ms, fmt)
+    curve = {"ts": ts, "equity": equity} if fmt.columnar else _rows(ts, equity=equity)
+    return {"metrics": f.metrics, "equity_curve": curve}
+
+def portfolio_body(f: PortfolioFrame, fmt: Fmt = Fmt()) -> Dict[str, Any]:
+    """PortfolioResp-shaped: the portfolio curve plus one strategy body per asset, all in `fmt`."""
+    assets = [{"symbol": s, **strategy_body(EquityFrame(m, f.ts, eq), fmt)}
+              for s, m, eq in zip(f.symbols, f.asset_metrics, f.asset_equity)]
+    return {**strategy_body(EquityFrame(f.metrics, f.ts, f.equity), fmt), "assets": assets}
+
+# ---------- encoding ----------
+def _np_default(o: Any) -> Any:
+    if isinstance(o, (np.ndarray, np.generic)):
+        return o.tolist()
+    raise TypeError(f"cannot serialize {type(o).__name__}")
+
+def dumps(body: Any) -> bytes:
+    """orjson with native numpy arrays: no per-point Python objects or pydantic validation."""
+    return orjson.dumps(body, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def codec(accept: str) -> str:
+    return MSGPACK if msgpack is not None and ("msgpack" in (accept or "")) else JSON
+
+def encode(body: Any, accept: str = "", accept_encoding: str = "") -> Tuple[bytes, Dict[str, str]]:
+    """(payload, headers) honouring Accept (JSON / msgpack) and Accept-Encoding (gzip above GZIP_MIN_BYTES)."""
+    ctype = codec(accept)
+    data = msgpack.packb(body, default=_np_default) if ctype == MSGPACK else dumps(body)
+    headers = {"Content-Type": ctype, "Vary": "Accept, Accept-Encoding"}
+    if len(data) >= GZIP_MIN_BYTES and "gzip" in (accept_encoding or ""):
+        data = gzip.compress(data, GZIP_LEVEL, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    return data, headers
+
+# encoded bodies of versioned results (ETag known), so a cache hit skips serialization too
+BODY_CACHE = ResultCache(max_entries=int(os.getenv("LIPE_BODY_CACHE_MAX", "2048")),
+                         max_age_s=float(os.getenv("LIPE_FC_CACHE_AGE_S", "3600")))
+
+def encode_cached(key: Optional[Hashable], make: Callable[[], Any], accept: str = "",
+                  accept_encoding: str = "") -> Tuple[bytes, Dict[str, str]]:
+    if key is None:
+        return encode(make(), accept, accept_encoding)
+    gz = "gzip" in (accept_encoding or "")
+    return BODY_CACHE.get_or_compute((key, codec(accept), gz),
+                                     lambda: encode(make(), accept, accept_encoding))
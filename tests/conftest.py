@@ -0,0 +1,20 @@
+"""
+Test environment: the fake exchange (CCXT_EXCHANGE=fake) and every on-disk store in a fresh
+temp directory. lipe_core reads its configuration at import, so this runs before any test module.
+"""
+from __future__ import annotations
+import os, sys, tempfile
+
+_TMP = tempfile.mkdtemp(prefix="lipe-tests-")
+os.environ.update({
+    "CCXT_EXCHANGE": "fake",
+    "LIPE_BARS_DIR": os.path.join(_TMP, "bars"),
+    "LIPE_EXCHANGE_STATE_DIR": os.path.join(_TMP, "exchange"),
+    "LIPE_EXCHANGE_RATE": "0",   # the shared GATE does not throttle; rate tests build their own buckets
+    "LIPE_ACC_LOG": os.path.join(_TMP, "forecasts.rec"),
+    "LIPE_ACC_DB": os.path.join(_TMP, "accuracy.sqlite3"),
+    "LIPE_SHARE_DB": os.path.join(_TMP, "share.sqlite3"),
+    "LIPE_METRICS_DIR": os.path.join(_TMP, "metrics"),
+    "LIPE_WARMUP": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
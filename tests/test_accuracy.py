@@ -0,0 +1,79 @@
+from __future__ import annotations
+import threading, time
+import numpy as np
+import pytest
+from lipe_core import accuracy
+from lipe_core.accuracy import RECORD, AccuracyStore, ForecastLog
+from lipe_core.data import DAY_MS, _synthetic_rows, _today_ms
+
+def _close(symbol: str, ts: int) -> float:
+    return float(_synthetic_rows(symbol, 1, end_ms=ts)[0, 4])
+
+def _rec(symbol: str, target: int, yhat: float, horizon: int = 1):
+    now = int(time.time()*1000)
+    return (now, target - horizon*DAY_MS, target + DAY_MS, "crypto", symbol, "1d", "naive_ewma", horizon,
+            target, yhat, yhat*0.95, yhat*1.05)
+
+@pytest.fixture
+def log(tmp_path):
+    return ForecastLog(str(tmp_path / "forecasts.rec"))
+
+def _stores(tmp_path, log, n=2):
+    return [AccuracyStore(str(tmp_path / "acc.sqlite3"), log) for _ in range(n)]
+
+def test_workers_score_each_forecast_once(tmp_path, log):
+    day = _today_ms()
+    targets = [day - k*DAY_MS for k in range(3, 9)]
+    log.append(np.array([_rec("BTCUSDT", t, _close("BTCUSDT", t)) for t in targets], dtype=RECORD))
+    stores = _stores(tmp_path, log)
+    go = threading.Barrier(2)
+    got = []
+    def score(s):
+        go.wait()
+        got.append(s.score())
+    ts = [threading.Thread(target=score, args=(s,)) for s in stores]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert sorted(got) == [0, 6]
+    assert stores[0].score() == 0 and stores[1].score() == 0
+    (row,) = stores[1].summary()["series"]
+    assert (row["symbol"], row["n"], row["mape"], row["coverage_80"]) == ("BTCUSDT", 6, 0.0, 1.0)
+
+def test_reforecasts_of_one_bar_count_once(tmp_path, log):
+    t = _today_ms() - 4*DAY_MS
+    y = _close("ETHUSDT", t)
+    log.append(np.array([_rec("ETHUSDT", t, y*2), _rec("ETHUSDT", t, y)], dtype=RECORD))   # last one wins
+    (s,) = _stores(tmp_path, log, 1)
+    assert s.score() == 1
+    assert s.summary()["series"][0]["mape"] == 0.0
+
+def test_missing_bar_holds_the_watermark(tmp_path, log, monkeypatch):
+    day = _today_ms()
+    a, m, b = day - 6*DAY_MS, day - 5*DAY_MS + 1, day - 4*DAY_MS   # m matches no exchange bar
+    log.append(np.array([_rec("SOLUSDT", a, _close("SOLUSDT", a)), _rec("SOLUSDT", m, 1.0),
+                         _rec("SOLUSDT", b, _close("SOLUSDT", b))], dtype=RECORD))
+    monkeypatch.setattr(accuracy, "ACC_GIVE_UP_S", 30*86400.0)
+    (s,) = _stores(tmp_path, log, 1)
+    assert s.score() == 1
+    wm = s._conn().execute("SELECT watermark FROM acc_state").fetchone()[0]
+    assert wm == m + DAY_MS - 1   # just before the missing record came due
+    assert s.score() == 0         # retried, still missing
+    monkeypatch.setattr(accuracy, "ACC_GIVE_UP_S", 0.0)
+    assert s.score() == 1         # given up on: the rest is scored
+    assert s.summary()["series"][0]["n"] == 2
+
+def test_backfill_rows_replace_and_sit_beside_live(tmp_path, log):
+    (s,) = _stores(tmp_path, log, 1)
+    row = ("crypto", "BTCUSDT", "1d", "naive_ewma", 5, 10, 0.5, 8.0, 0.1, DAY_MS)
+    s.put_backfill([row])
+    s.put_backfill([row])
+    (got,) = s.summary()["series"]
+    assert (got["source"], got["n"], got["mape"], got["coverage_80"]) == ("backfill", 10, 0.05, 0.8)
+
+def test_long_symbols_are_not_logged(log, monkeypatch):
+    monkeypatch.setattr(accuracy, "LOG", log)
+    accuracy.record("crypto", "X"*17 + "USDT", "1d", "m", 1, 0, 1.0, 0.9, 1.1)
+    accuracy.record("crypto", "BTCUSDT", "1d", "m", 1, 0, 1.0, 0.9, 1.1)
+    assert len(log) == 1 and log.read()[0]["symbol"] == b"BTCUSDT"
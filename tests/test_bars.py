@@ -0,0 +1,87 @@
+from __future__ import annotations
+import os, struct
+import numpy as np
+import pytest
+from lipe_core.bars import BarFile, bars_path, resample
+
+DAY = 86_400_000
+
+def _rows(start: int, n: int, close: float = 100.0, step: int = DAY):
+    return [[start + i*step, close, close + 1, close - 1, close + i, 10.0] for i in range(n)]
+
+def test_append_and_read_roundtrip(tmp_path):
+    bf = BarFile(str(tmp_path / "s"))
+    assert len(bf) == 0 and len(bf.read()["ts"]) == 0
+    assert bf.append(_rows(0, 5)) == 5
+    assert bf.append(_rows(5*DAY, 3)) == 8
+    b = bf.read()
+    assert b["ts"].tolist() == [i*DAY for i in range(8)]
+    assert b["close"].dtype == np.float64 and not b["close"].flags.writeable
+    assert bf.read(3)["ts"].tolist() == [5*DAY, 6*DAY, 7*DAY]
+    assert bf.last_ts() == 7*DAY
+    assert bf._head() == (8, 0)   # pure appends never replace the column files
+
+def test_rewrite_under_reader_keeps_old_view(tmp_path):
+    writer = BarFile(str(tmp_path / "s"))
+    reader = BarFile(str(tmp_path / "s"))   # another worker on the same series
+    writer.append(_rows(0, 10))
+    before = reader.read()
+    old_close = before["close"].copy()
+
+    # re-sending the last two bars (the open bar, a correction) rewrites committed rows
+    assert writer.append(_rows(8*DAY, 2, close=500.0)) == 10
+    n, gen = reader._head()
+    assert (n, gen) == (10, 1)
+    np.testing.assert_array_equal(before["close"], old_close)   # the earlier view never tears
+    after = reader.read()
+    assert after["close"][-2:].tolist() == [500.0, 501.0]
+    np.testing.assert_array_equal(after["close"][:8], old_close[:8])
+
+    writer.append(_rows(9*DAY, 1, close=7.0))
+    assert reader._head() == (10, 2)
+    assert reader.read()["close"][-1] == 7.0
+
+def test_backfill_carries_newer_tail(tmp_path):
+    bf = BarFile(str(tmp_path / "s"))
+    bf.append(_rows(10*DAY, 5))
+    bf.append(_rows(5*DAY, 5, close=1.0))   # older history arrives later
+    b = bf.read()
+    assert b["ts"].tolist() == [i*DAY for i in range(5, 15)]
+    assert b["close"][:5].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert b["close"][5:].tolist() == [100.0, 101.0, 102.0, 103.0, 104.0]
+
+def test_rows_past_head_are_invisible(tmp_path):
+    bf = BarFile(str(tmp_path / "s"))
+    bf.append(_rows(0, 4))
+    # a writer that died after writing column tails but before publishing HEAD
+    for name, dtype in bf.columns:
+        with open(os.path.join(bf.path, f"{name}.{dtype[1:]}"), "ab") as f:
+            f.write(np.zeros(3, dtype=dtype).tobytes())
+    assert len(bf.read()["ts"]) == 4
+    assert bf.append(_rows(4*DAY, 1)) == 5   # the next append overwrites the orphaned tail
+    assert bf.read()["ts"].tolist() == [i*DAY for i in range(5)]
+
+def test_legacy_head_reads_as_generation_zero(tmp_path):
+    bf = BarFile(str(tmp_path / "s"))
+    bf.append(_rows(0, 3))
+    with open(os.path.join(bf.path, "HEAD"), "wb") as f:
+        f.write(struct.pack("<q", 3))
+    assert bf._head() == (3, 0)
+    assert bf.read()["ts"].tolist() == [0, DAY, 2*DAY]
+
+@pytest.mark.parametrize("symbol", ["..", "BTC/..", "./BTC", ""])
+def test_bars_path_rejects_escapes(tmp_path, symbol):
+    with pytest.raises(ValueError):
+        bars_path("fake", symbol, "1d", root=str(tmp_path))
+
+def test_bars_path_pairs(tmp_path):
+    assert bars_path("fake", "btc/usdt", "1h", root=str(tmp_path)) == os.path.join(
+        os.path.realpath(tmp_path), "fake", "BTC", "USDT", "1h")
+
+def test_resample_aligns_buckets():
+    hour = 3_600_000
+    rows = np.array(_rows(2*hour, 10, step=hour))   # 02:00 .. 11:00
+    b = {c: rows[:, j] for j, c in enumerate(("ts", "open", "high", "low", "close", "volume"))}
+    out = resample(b, 4*hour)
+    assert out[:, 0].tolist() == [0, 4*hour, 8*hour]
+    assert out[1].tolist() == [4*hour, 100.0, 101.0, 99.0, 105.0, 40.0]
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import asyncio, os, threading, time
+import numpy as np
+import pytest
+from lipe_core import bars, data
+from lipe_core.data import DAY_MS, HOUR_MS, _bar_start, _next_since
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A SeriesStore on its own bar directory with a fresh fake exchange client (call counters at 0)."""
+    monkeypatch.setattr(bars, "BARS_DIR", str(tmp_path))
+    monkeypatch.setattr(data, "_EXCHANGES", {})
+    monkeypatch.setattr(data, "_AEXCHANGES", {})
+    monkeypatch.setattr(data, "EXCHANGE_PAGE", 100)
+    return data.SeriesStore(max_symbols=8, refresh_s=60)
+
+def _spy(monkeypatch):
+    """Record (timeframe, since, limit) of every sync fetch_ohlcv call."""
+    ex = data._exchange("fake")
+    calls = []
+    real = ex.fetch_ohlcv
+    def fetch_ohlcv(symbol, timeframe="1d", since=None, limit=None, params=None):
+        calls.append((timeframe, since, limit))
+        return real(symbol, timeframe, since, limit)
+    monkeypatch.setattr(ex, "fetch_ohlcv", fetch_ohlcv)
+    return calls
+
+# ---------- paging ----------
+def test_next_since_stops_on_stale_and_dedupes_overlap():
+    rows = [[0, 1, 1, 1, 1, 1], [DAY_MS, 1, 1, 1, 1, 1]]
+    assert _next_since(rows, [], "1d") is None
+    assert _next_since(rows, [[DAY_MS, 2, 2, 2, 2, 2]], "1d") is None   # did not move forward
+    assert _next_since(rows, [[DAY_MS, 2, 2, 2, 2, 2], [2*DAY_MS, 3, 3, 3, 3, 3]], "1d") == 3*DAY_MS
+    assert [r[0] for r in rows] == [0, DAY_MS, 2*DAY_MS]
+
+def test_cold_load_pages_through_the_window(store, monkeypatch):
+    calls = _spy(monkeypatch)
+    b = store.get("fake", "BTCUSDT", "1d", 350)
+    assert len(calls) == 4   # 100 + 100 + 100 + 50
+    assert [c[2] for c in calls] == [100]*4
+    assert calls[0][1] == data._window_start("1d", 350)
+    assert [c[1] for c in calls[1:]] == [calls[0][1] + k*100*DAY_MS for k in (1, 2, 3)]
+    ts = b["ts"]
+    assert len(ts) == 350 and ts[-1] == _bar_start(DAY_MS) and (np.diff(ts) == DAY_MS).all()
+    np.testing.assert_array_equal(b["close"], data._synthetic_rows("BTCUSDT", 350)[:, 4])
+    assert store.stats["misses"] == 1
+
+def test_refresh_fetches_from_the_last_stored_bar(store, monkeypatch):
+    store.get("fake", "BTCUSDT", "1d", 350)
+    calls = _spy(monkeypatch)
+    b = store.get("fake", "BTCUSDT", "1d", 350, fresh=True)
+    assert calls == [("1d", _bar_start(DAY_MS), 100)]   # only the open bar is re-read
+    assert len(b["ts"]) == 350 and store.stats["refreshes"] == 1
+
+def test_exchange_failure_falls_back_only_in_fetch_bars(store, monkeypatch):
+    monkeypatch.setattr(data, "SERIES", store)
+    monkeypatch.setattr(data._exchange("fake"), "fail_rate", 1.0)
+    with pytest.raises(ConnectionError):
+        data.fetch_exchange_bars("ADAUSDT", 30)
+    b = data.fetch_bars("ADAUSDT", 30)
+    assert len(b["ts"]) == 30 and store.stats["fallbacks"] == 1 and store.stats["errors"] == 2
+
+def test_async_get_pages_like_get(store):
+    async def go():
+        try:
+            return await store.aget("fake", "SOLUSDT", "1d", 250), data._AEXCHANGES["fake"].ex.calls
+        finally:
+            await data.aclose_exchanges()
+    b, calls = asyncio.run(go())
+    assert calls == 3
+    np.testing.assert_array_equal(b["close"], data._synthetic_rows("SOLUSDT", 250)[:, 4])
+
+# ---------- 1h → 4h ----------
+def test_4h_is_resampled_from_stored_1h(store, monkeypatch):
+    calls = _spy(monkeypatch)
+    b4 = store.get("fake", "ETHUSDT", "4h", 50)
+    assert {c[0] for c in calls} == {"1h"}   # no 4h exchange traffic
+    ts = b4["ts"]
+    assert len(ts) == 50 and ts[-1] == _bar_start(4*HOUR_MS)
+    assert (ts % (4*HOUR_MS) == 0).all() and (np.diff(ts) == 4*HOUR_MS).all()
+
+    h = store._slot(("fake", "ETHUSDT", "1h")).bars.read()
+    for i in (0, 25, 48):   # complete buckets
+        m = (h["ts"] >= ts[i]) & (h["ts"] < ts[i] + 4*HOUR_MS)
+        assert m.sum() == 4
+        assert b4["open"][i] == h["open"][m][0] and b4["close"][i] == h["close"][m][-1]
+        assert b4["high"][i] == h["high"][m].max() and b4["low"][i] == h["low"][m].min()
+        assert b4["volume"][i] == h["volume"][m].sum()
+    assert b4["close"][-1] == h["close"][-1]   # the open 4h bar follows the open 1h bar
+
+def test_4h_follows_a_1h_refresh(store, monkeypatch):
+    store.get("fake", "ETHUSDT", "4h", 20)
+    base = store._slot(("fake", "ETHUSDT", "1h"))
+    last = base.bars.last_ts()
+    # the exchange revises the open 1h bar
+    monkeypatch.setattr(data._exchange("fake"), "fetch_ohlcv",
+                        lambda symbol, timeframe="1d", since=None, limit=None, params=None:
+                        [[last, 1.0, 9e9, 0.5, 123.0, 1.0]])
+    b4 = store.get("fake", "ETHUSDT", "4h", 20, fresh=True)
+    assert b4["close"][-1] == 123.0 and b4["high"][-1] == 9e9
+
+# ---------- fetch coalescing ----------
+def test_siblings_coalesce_on_one_fetch(store, monkeypatch):
+    monkeypatch.setattr(data._exchange("fake"), "latency_s", 0.3)
+    sibling = data.SeriesStore(max_symbols=8, refresh_s=60)   # another worker on the same bar directory
+    go = threading.Barrier(2)
+    out = {}
+    def worker(name, s):
+        go.wait()
+        out[name] = s.get("fake", "XRPUSDT", "1d", 80)
+    ts = [threading.Thread(target=worker, args=(n, s)) for n, s in (("a", store), ("b", sibling))]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert data._exchange("fake").calls == 1
+    assert store.stats["coalesced"] + sibling.stats["coalesced"] == 1
+    np.testing.assert_array_equal(out["a"]["close"], out["b"]["close"])
+
+# ---------- series store: LRU and freshness ----------
+def test_lru_evicts_least_recently_used(store):
+    store.max_symbols = 2
+    for sym in ("AAAUSDT", "BBBUSDT", "AAAUSDT", "CCCUSDT"):
+        store.get("fake", sym, "1d", 30)
+    assert list(store._series) == [("fake", "AAAUSDT", "1d"), ("fake", "CCCUSDT", "1d")]
+    assert store.stats["evictions"] == 1
+
+def test_evicted_series_reopens_warm_from_disk(store):
+    store.max_symbols = 1
+    store.get("fake", "AAAUSDT", "1d", 30)
+    store.get("fake", "BBBUSDT", "1d", 30)
+    calls = data._exchange("fake").calls
+    b = store.get("fake", "AAAUSDT", "1d", 30)   # reopened: bars and CHECKED are on disk
+    assert data._exchange("fake").calls == calls and len(b["ts"]) == 30
+    assert store.stats["hits"] == 1 and store.stats["misses"] == 2
+
+def test_freshness_is_shared_through_checked_mtime(store, tmp_path):
+    store.get("fake", "BTCUSDT", "1d", 30)
+    sibling = data.SeriesStore(max_symbols=8, refresh_s=60)   # never did a round trip itself
+    ex = data._exchange("fake")
+    calls = ex.calls
+    sibling.get("fake", "BTCUSDT", "1d", 30)
+    assert ex.calls == calls and sibling.stats["hits"] == 1
+
+    checked = tmp_path / "fake" / "BTCUSDT" / "1d" / "CHECKED"
+    old = time.time() - 61
+    os.utime(checked, (old, old))
+    sibling.get("fake", "BTCUSDT", "1d", 30)
+    assert ex.calls == calls + 1 and sibling.stats["refreshes"] == 1
+    assert checked.stat().st_mtime > old   # the round trip is published to every worker
+
+def test_fresh_always_asks_the_exchange(store):
+    store.get("fake", "BTCUSDT", "1d", 30)
+    ex = data._exchange("fake")
+    calls = ex.calls
+    store.get("fake", "BTCUSDT", "1d", 30, fresh=True)
+    store.get("fake", "BTCUSDT", "1d", 30, fresh=True)
+    assert ex.calls == calls + 2 and store.stats["refreshes"] == 2
+
+def test_young_listing_is_not_refetched_cold(store, monkeypatch):
+    listed = _bar_start(DAY_MS) - 19*DAY_MS   # the exchange only has 20 daily bars
+    ex = data._exchange("fake")
+    real = ex.fetch_ohlcv
+    monkeypatch.setattr(ex, "fetch_ohlcv", lambda symbol, timeframe="1d", since=None, limit=None, params=None:
+                        [r for r in real(symbol, timeframe, since, limit) if r[0] >= listed])
+    b = store.get("fake", "NEWUSDT", "1d", 100)
+    assert len(b["ts"]) == 20 and b["ts"][0] == listed
+    assert store._slot(("fake", "NEWUSDT", "1d")).depth == 100
+    calls = ex.calls
+    store.get("fake", "NEWUSDT", "1d", 100)
+    assert ex.calls == calls and store.stats["hits"] == 1
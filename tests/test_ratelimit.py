@@ -0,0 +1,78 @@
+from __future__ import annotations
+import multiprocessing as mp
+import os, time
+import numpy as np
+import pytest
+from lipe_core.ratelimit import ExchangeGate, Throttled, TokenBucket
+
+def _reserve_many(path: str, rate: float, n: int, out) -> None:
+    b = TokenBucket(path, rate=rate, burst=1)
+    out.put([time.time() + b.reserve(max_wait_s=60) for _ in range(n)])
+
+def _hold_fetch_lock(root: str, series: str, held, release) -> None:
+    with ExchangeGate(root=root).fetching(series):
+        held.set()
+        release.wait(10)
+
+def test_bucket_burst_then_rate(tmp_path):
+    b = TokenBucket(str(tmp_path / "x.bucket"), rate=10, burst=2)
+    assert b.reserve() == 0 and b.reserve() == 0
+    assert b.reserve() == pytest.approx(0.1, abs=0.02)
+    assert b.reserve(max_wait_s=0.05) is None   # too far out: nothing is booked
+    assert b.reserve() == pytest.approx(0.2, abs=0.02)
+
+def test_bucket_off_at_rate_zero(tmp_path):
+    b = TokenBucket(str(tmp_path / "x.bucket"), rate=0, burst=1)
+    assert all(b.reserve(max_wait_s=0) == 0 for _ in range(100))
+
+def test_bucket_is_shared_across_processes(tmp_path):
+    path, rate, n = str(tmp_path / "x.bucket"), 20.0, 5
+    ctx = mp.get_context("fork")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_reserve_many, args=(path, rate, n, out)) for _ in range(2)]
+    for p in procs:
+        p.start()
+    ready = sorted(out.get(timeout=10) + out.get(timeout=10))
+    for p in procs:
+        p.join()
+    # one bucket for both workers: the 2n slots are spaced 1/rate apart, none handed out twice
+    np.testing.assert_allclose(np.diff(ready), 1/rate, atol=0.02)
+
+def test_gate_rejects_long_queues(tmp_path):
+    g = ExchangeGate(root=str(tmp_path), rate=1, burst=1, max_wait_s=0.5)
+    g.throttle("fake")
+    with pytest.raises(Throttled):
+        g.throttle("fake")
+    assert g.stats["calls"] == 1 and g.stats["rejected"] == 1
+
+def test_fetch_lock_times_out(tmp_path):
+    g = ExchangeGate(root=str(tmp_path), lock_wait_s=0.1)
+    with g.fetching(str(tmp_path)):
+        t = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with g.fetching(str(tmp_path)):
+                pass
+        assert time.monotonic() - t >= 0.1
+    assert g.stats["lock_waits"] == 1
+    with g.fetching(str(tmp_path)):   # released on exit
+        pass
+
+def test_fetch_lock_excludes_another_process(tmp_path):
+    ctx = mp.get_context("fork")
+    held, release = ctx.Event(), ctx.Event()
+    p = ctx.Process(target=_hold_fetch_lock, args=(str(tmp_path / "gate"), str(tmp_path), held, release))
+    p.start()
+    try:
+        assert held.wait(10)
+        g = ExchangeGate(root=str(tmp_path / "gate"), lock_wait_s=5)
+        with pytest.raises(TimeoutError):
+            with ExchangeGate(root=str(tmp_path / "gate"), lock_wait_s=0.1).fetching(str(tmp_path)):
+                pass
+        t = time.monotonic()
+        release.set()
+        with g.fetching(str(tmp_path)):   # granted once the sibling is done
+            assert time.monotonic() - t < 5
+    finally:
+        release.set()
+        p.join()
+    assert os.path.exists(tmp_path / "FETCH.lock")
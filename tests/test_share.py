@@ -0,0 +1,57 @@
+from __future__ import annotations
+import threading, time
+import pytest
+from lipe_core.share import ShareStore
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "share.sqlite3")
+
+def test_tokens_are_visible_to_every_worker(path):
+    a, b = ShareStore(path), ShareStore(path)   # one connection each, like two gunicorn workers
+    tok = a.create({"symbol": "BTCUSDT", "horizon": 5}, ttl_s=60)["token"]
+    assert b.get(tok) == {"symbol": "BTCUSDT", "horizon": 5}
+    assert b.get("nope") is None
+    assert a.stats()["entries"] == b.stats()["entries"] == 1
+
+def test_identical_payloads_share_a_token(path):
+    s = ShareStore(path, dedup_s=3600)
+    first = s.create({"symbol": "BTCUSDT"}, ttl_s=60)
+    again = s.create({"symbol": "BTCUSDT"}, ttl_s=3600)
+    assert again["token"] == first["token"] and again["deduped"] and not first["deduped"]
+    assert again["expire_at"] >= first["expire_at"] + 3500   # the longer ttl is honoured
+    assert ShareStore(path).create({"symbol": "BTCUSDT"}, ttl_s=1)["expire_at"] == again["expire_at"]
+    assert s.create({"symbol": "ETHUSDT"}, ttl_s=60)["token"] != first["token"]
+    assert s.stats()["entries"] == 2
+
+def test_dedup_window_zero_always_mints(path):
+    s = ShareStore(path, dedup_s=0)
+    assert s.create({"x": 1}, ttl_s=60)["token"] != s.create({"x": 1}, ttl_s=60)["token"]
+
+def test_expired_links_are_hidden_then_swept(path):
+    s = ShareStore(path, dedup_s=0)
+    gone = s.create({"x": 1}, ttl_s=0.05)["token"]
+    time.sleep(0.1)
+    assert s.get(gone) is None
+    assert s.stats()["entries"] == 1
+    s.create({"x": 2}, ttl_s=60)   # every create pops expired rows off the expire_at index
+    assert s.stats()["entries"] == 1
+
+def test_cap_evicts_soonest_to_expire(path):
+    s = ShareStore(path, max_entries=3, dedup_s=0)
+    toks = [s.create({"i": i}, ttl_s=100 + i)["token"] for i in range(5)]
+    assert s.stats()["entries"] == 3
+    assert [s.get(t) is not None for t in toks] == [False, False, True, True, True]
+
+def test_concurrent_workers_keep_the_count(path):
+    stores = [ShareStore(path, max_entries=50, dedup_s=0) for _ in range(2)]
+    def mint(s, k):
+        for i in range(40):
+            s.create({"w": k, "i": i}, ttl_s=60)
+    ts = [threading.Thread(target=mint, args=(s, k)) for k, s in enumerate(stores)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    n = stores[0]._conn().execute("SELECT COUNT(*) FROM share").fetchone()[0]
+    assert n == stores[1].stats()["entries"] == 50
@@ -0,0 +1,82 @@
+from __future__ import annotations
+import asyncio, json
+import pytest
+from lipe_core import stream
+from lipe_core.models import ForecastReq
+from lipe_core.stream import ForecastHub
+
+REQ = ForecastReq(arena="crypto", symbol="BTCUSDT", horizon=5)
+
+@pytest.fixture
+def version(monkeypatch):
+    """The forecast the pollers see: bump v["n"] to move the series; v["polls"] counts poller calls."""
+    v = {"n": 1, "polls": 0}
+    async def arun_forecast_cached(req, _, tag):
+        v["polls"] += 1
+        return {"symbol": req.symbol, "n": v["n"]}, f'"v{v["n"]}"'
+    monkeypatch.setattr(stream, "arun_forecast_cached", arun_forecast_cached)
+    monkeypatch.setattr(stream.wire, "forecast_body", lambda frame, fmt: frame)
+    return v
+
+async def _next(sub, timeout: float = 2.0):
+    return await asyncio.wait_for(sub.__anext__(), timeout)
+
+def test_one_poller_fans_out_to_every_subscriber(version):
+    async def go():
+        hub = ForecastHub(poll_s=0.05)
+        a, b = hub.subscribe(REQ, heartbeat_s=5), hub.subscribe(REQ, heartbeat_s=5)
+        first = await _next(a), await _next(b)
+        assert first[0] == first[1] and first[0][0] == '"v1"'
+        assert json.loads(first[0][1]) == {"event": {"symbol": "BTCUSDT", "n": 1}}
+        assert hub.stats() == {"topics": 1, "subscribers": 2}
+        await asyncio.sleep(0.2)
+        polls = version["polls"]
+        assert 2 <= polls <= 7   # one poller per topic, not one per subscriber
+
+        version["n"] = 2
+        assert (await _next(a))[0] == (await _next(b))[0] == '"v2"'
+        await a.aclose()
+        assert hub.stats() == {"topics": 1, "subscribers": 1}
+        await b.aclose()
+        assert hub.stats() == {"topics": 0, "subscribers": 0}
+        polls = version["polls"]
+        await asyncio.sleep(0.2)
+        assert version["polls"] == polls   # the last subscriber leaving stops the poller
+    asyncio.run(go())
+
+def test_late_subscriber_gets_the_latest_at_once(version):
+    async def go():
+        hub = ForecastHub(poll_s=60)
+        a = hub.subscribe(REQ, heartbeat_s=5)
+        await _next(a)
+        late = hub.subscribe(REQ, heartbeat_s=5)
+        assert (await _next(late, 0.5))[0] == '"v1"'
+        assert version["polls"] == 1
+        await a.aclose()
+        await late.aclose()
+    asyncio.run(go())
+
+def test_known_etag_is_not_resent_and_silence_pings(version):
+    async def go():
+        hub = ForecastHub(poll_s=0.05)
+        sub = hub.subscribe(REQ, last_etag='"v1"', heartbeat_s=0.1)
+        assert await _next(sub) is None   # nothing new for the client: a heartbeat
+        version["n"] = 3
+        item = await _next(sub)
+        while item is None:
+            item = await _next(sub)
+        assert item[0] == '"v3"'
+        await sub.aclose()
+    asyncio.run(go())
+
+def test_topics_are_per_symbol_and_horizon(version):
+    async def go():
+        hub = ForecastHub(poll_s=60)
+        subs = [hub.subscribe(r, heartbeat_s=5) for r in
+                (REQ, ForecastReq(arena="crypto", symbol="ETHUSDT", horizon=5), REQ.model_copy(update={"horizon": 7}))]
+        got = [await _next(s) for s in subs]
+        assert hub.stats() == {"topics": 3, "subscribers": 3}
+        assert json.loads(got[1][1])["event"]["symbol"] == "ETHUSDT"
+        for s in subs:
+            await s.aclose()
+    asyncio.run(go())